@@ -0,0 +1,90 @@
+import os
+import ast
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# --- MOTEURS D'INFÉRENCE YOLO (CPU) ---
+# "torch" : chemin Ultralytics / PyTorch d'origine, par lots de BATCH_SIZE images
+# "onnx"  : export ONNX unique (mis en cache à côté du .pt) exécuté par ONNX Runtime,
+#           avec un nombre de threads intra-op configurable
+# Les deux renvoient, pour chaque image, l'ensemble des classes détectées au-dessus de CONF.
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))  # 0 = défaut ONNX Runtime
+CONF = float(os.getenv("YOLO_CONF", "0.4"))
+IMG_SIZE = 640
+
+
+def letterbox(frame, size=IMG_SIZE):
+    # Même mise au format que YOLO : redimensionnement sans déformation + bandes grises
+    h, w = frame.shape[:2]
+    if (h, w) == (size, size):
+        return frame
+    scale = size / max(h, w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out[top:top + nh, left:left + nw] = resized
+    return out
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_path):
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+
+    def classes(self, frames):
+        results = self.model.predict(list(frames), save=False, conf=CONF, verbose=False)
+        return [{int(c) for c in r.boxes.cls} for r in results]
+
+
+def export_onnx(model_path):
+    """Exporte le .pt en ONNX (batch dynamique) une seule fois ; réutilise le cache ensuite."""
+    onnx_path = os.path.splitext(model_path)[0] + ".onnx"
+    if os.path.exists(onnx_path) and (
+        not os.path.exists(model_path) or os.path.getmtime(onnx_path) >= os.path.getmtime(model_path)
+    ):
+        return onnx_path
+    print(f"⏳ Export ONNX de {model_path} (une seule fois)...", flush=True)
+    exported = YOLO(model_path).export(format="onnx", dynamic=True, imgsz=IMG_SIZE)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, model_path, threads=ORT_INTRA_OP_THREADS):
+        import onnxruntime as ort
+        onnx_path = export_onnx(model_path)
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # Ultralytics écrit les noms de classes dans les métadonnées du modèle exporté
+        names = self.session.get_modelmeta().custom_metadata_map.get("names", "{}")
+        self.names = ast.literal_eval(names)
+
+    def classes(self, frames):
+        batch = np.stack([letterbox(f) for f in frames])                 # N,H,W,3 BGR uint8
+        blob = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+        blob /= 255.0
+        output = self.session.run(None, {self.input_name: blob})[0]     # N, 4 + classes, ancres
+        scores = output[:, 4:, :].max(axis=2)                            # N, classes
+        # Pas besoin de NMS : seule la présence d'une classe au-dessus du seuil compte
+        return [set(np.nonzero(row >= CONF)[0].tolist()) for row in scores]
+
+
+def make_backend(model_path, backend=INFERENCE_BACKEND):
+    if backend == "onnx":
+        return OnnxBackend(model_path)
+    return TorchBackend(model_path)
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+# --- COMPARAISON DES MOTEURS YOLO SUR UNE MÊME VIDÉO ---
+# Chaque configuration tourne dans son propre processus, pour que le pic de RSS
+# (ru_maxrss) ne mélange pas les moteurs.
+#   python bench_backends.py video.mp4 --backends torch onnx --batch-sizes 1 8 --threads 4
+# Résultat : tableau images/s + pic RSS, et JSON (--output) pour comparer les runs.
+
+LOCAL_MODEL = "/root/.cache/yolo/yolov8n.pt"
+
+
+def run_worker(video, backend, batch_size, threads, max_frames, model_path):
+    os.environ["ORT_INTRA_OP_THREADS"] = str(threads)
+    from backends import make_backend
+    from sampling import iter_video_frames
+
+    # Mêmes images pour tous les moteurs : celles de l'analyse à SCAN_FPS
+    frames = []
+    for frame in iter_video_frames(video):
+        frames.append(frame)
+        if len(frames) >= max_frames: break
+
+    t0 = time.perf_counter()
+    model = make_backend(model_path, backend)
+    load_s = time.perf_counter() - t0
+
+    # Une passe à blanc pour ne pas mesurer l'initialisation paresseuse
+    model.classes(frames[:batch_size])
+    t0 = time.perf_counter()
+    detected = set()
+    for i in range(0, len(frames), batch_size):
+        for classes in model.classes(frames[i:i + batch_size]):
+            detected |= classes
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "backend": backend,
+        "batch_size": batch_size,
+        "threads": threads,
+        "frames": len(frames),
+        "load_s": round(load_s, 3),
+        "fps": round(len(frames) / elapsed, 2) if elapsed else None,
+        # Linux : ru_maxrss est en kilo-octets
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "classes": sorted(model.names[c] for c in detected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-frames", type=int, default=200)
+    parser.add_argument("--model", default=LOCAL_MODEL if os.path.exists(LOCAL_MODEL) else "yolov8n.pt")
+    parser.add_argument("--output")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.video, args.backends[0], args.batch_sizes[0],
+                            args.threads, args.max_frames, args.model)
+        print(json.dumps(result))
+        return
+
+    results = []
+    for backend in args.backends:
+        for batch_size in args.batch_sizes:
+            cmd = [sys.executable, os.path.abspath(__file__), args.video, "--worker",
+                   "--backends", backend, "--batch-sizes", str(batch_size),
+                   "--threads", str(args.threads), "--max-frames", str(args.max_frames),
+                   "--model", args.model]
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'backend':<8} {'batch':>5} {'threads':>7} {'img/s':>8} {'RSS Mo':>8} {'load s':>7}  classes")
+    for r in results:
+        print(f"{r['backend']:<8} {r['batch_size']:>5} {r['threads']:>7} {r['fps']:>8} "
+              f"{r['peak_rss_mb']:>8} {r['load_s']:>7}  {','.join(r['classes'])}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,201 +1,358 @@
-import time
-import os
-import json
-import requests  # Nécessaire pour parler à AWS
-from ultralytics import YOLO
-from watchdog.observers.polling import PollingObserver as Observer
-from watchdog.events import FileSystemEventHandler
-
-# --- CONFIGURATION ---
-INPUT_FOLDER = "/mnt/data/processed"
-META_FOLDER = "/mnt/data/metadata"
-FINAL_FOLDER = "/mnt/data/final"
-LOCAL_MODEL = "/root/.cache/yolo/yolov8n.pt"
-
-# On récupère l'URL AWS depuis le docker-compose
-# Exemple attendu : http://51.20.183.135:8000/upload_result
-BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000/upload_result")
-
-class AnimalHandler(FileSystemEventHandler):
-    def __init__(self):
-        print("⏳ Chargement YOLO...", flush=True)
-        if os.path.exists(LOCAL_MODEL):
-            self.model = YOLO(LOCAL_MODEL)
-            print("✅ Modèle chargé depuis le cache.", flush=True)
-        else:
-            print("⚠️ Cache absent, utilisation défaut.", flush=True)
-            self.model = YOLO("yolov8n.pt")
-
-    def on_created(self, event):
-        if event.is_directory: return
-        filename = os.path.basename(event.src_path)
-        if not filename.endswith("_downscaled.mp4"): return
-
-        print(f"\n[ANIMAL] 🐶 Détecté : {filename}", flush=True)
-        time.sleep(2)
-        self.process_pipeline(event.src_path, filename)
-
-    def process_pipeline(self, file_path, filename):
-        print(f"DEBUG: Entrée fonction process pour {filename}", flush=True)
-        base_name = filename.replace("_downscaled.mp4", "")
-        
-        # 1. Analyse YOLO (Mode Streaming optimisé)
-        print(f"--> 🧠 Lancement YOLO (Mode Stream) sur {filename}...", flush=True)
-        
-        animals_found = set()
-        frame_count = 0
-        
-        try:
-            results_generator = self.model.predict(file_path, save=False, stream=True, conf=0.4, verbose=False)
-            print("    Progression : ", end="", flush=True)
-            
-            for r in results_generator:
-                frame_count += 1
-                if frame_count % 20 == 0:
-                    print(".", end="", flush=True)
-                
-                for c in r.boxes.cls:
-                    class_name = self.model.names[int(c)]
-                    if class_name not in animals_found:
-                        animals_found.add(class_name)
-                        print(f"[{class_name}]", end="", flush=True)
-
-            print(f"\n✅ Terminé ! {frame_count} frames analysées.")
-            animals_list = list(animals_found)
-            print(f"✅ [RESULT] Total animaux : {animals_list}", flush=True)
-            
-        except Exception as e:
-            print(f"\n❌ CRASH YOLO : {e}", flush=True)
-            return
-
-        # 2. Attente des fichiers metadata (Générés par les autres conteneurs)
-        lang_file = os.path.join(META_FOLDER, f"{base_name}_lang.json")
-        subs_file = os.path.join(META_FOLDER, f"{base_name}_subs.srt")
-        
-        print(f"--> ⏳ Vérification metadata...", flush=True)
-        
-        # On attend jusqu'à 2 minutes que les sous-titres et la langue soient prêts
-        for i in range(60): 
-            if os.path.exists(lang_file) and os.path.exists(subs_file):
-                self.finalize(filename, animals_list, lang_file, subs_file)
-                return
-            time.sleep(2)
-            if i % 5 == 0: print("w", end="", flush=True)
-
-        print("\n[TIMEOUT] ❌ Manque Langue ou Sous-titres après 2 minutes.", flush=True)
-
-    def finalize(self, filename, animals, lang_file, subs_file):
-        try:
-            # A. Lecture du fichier langue
-            with open(lang_file, 'r') as f:
-                lang_data = json.load(f)
-
-            # B. Lecture complète des sous-titres
-            try:
-                with open(subs_file, 'r', encoding='utf-8') as f:
-                    subs_content = f.read()
-            except:
-                subs_content = "Erreur lecture sous-titres"
-
-            # C. Sauvegarde Locale (Backup)
-            payload_local = {
-                "video_name": filename,
-                "animals_detected": animals,
-                "audio_language": lang_data.get("language", "unknown"),
-                "subtitles_path": subs_file,
-                "processed_at": time.ctime()
-            }
-            
-            base_name = filename.replace("_downscaled.mp4", "")
-            final_filename = f"{base_name}_final_result.json"
-            final_path = os.path.join(FINAL_FOLDER, final_filename)
-
-            with open(final_path, 'w', encoding='utf-8') as f:
-                json.dump(payload_local, f, indent=4, ensure_ascii=False)
-
-            print("\n------------------------------------------------", flush=True)
-            print(f" ✅ SUCCÈS LOCAL ! Résultat dans : {final_filename}", flush=True)
-
-            # --- D. ENVOI VERS AWS (MÉTADONNÉES) ---
-            print(f" 📡 Envoi des DONNÉES vers : {BACKEND_URL} ...", flush=True)
-            
-            # Payload pour le Cloud
-            aws_payload = {
-                "video_id": base_name,
-                "filename": filename,
-                "original_resolution": "1080p", 
-                "processed_resolution": "720p",
-                "detected_language": lang_data.get("language", "unknown"),
-                "subtitles": subs_content, # Contenu complet des SRT
-                "detected_objects": animals,
-                "s3_url": f"/static/{filename}", # URL relative pour le frontend
-                "timestamp": time.time()
-            }
-
-            try:
-                # 1. Envoi du JSON
-                response = requests.post(BACKEND_URL, json=aws_payload, timeout=50)
-                if response.status_code in [200, 201]:
-                    print(f" ✅ AWS JSON REÇU : {response.json()}")
-                else:
-                    print(f" ⚠️ AWS JSON ERREUR : {response.status_code} - {response.text}")
-                
-                # 2. Envoi de la VIDÉO (Upload physique)
-                video_full_path = os.path.join(INPUT_FOLDER, filename)
-                
-                # On déduit l'URL vidéo : http://.../upload_result -> http://.../upload_video
-                video_url = BACKEND_URL.replace("/upload_result", "/upload_video")
-                
-                print(f" 📡 Envoi du FICHIER VIDÉO vers : {video_url} ...")
-                
-                if os.path.exists(video_full_path):
-                    with open(video_full_path, 'rb') as f_vid:
-                        # 'file' est le nom du champ attendu par FastAPI
-                        files = {'file': (filename, f_vid, 'video/mp4')}
-                        resp_vid = requests.post(video_url, files=files, timeout=1000) # Timeout long pour la vidéo
-                        
-                        if resp_vid.status_code == 200:
-                            print(" 🚀 VIDÉO UPLOADÉE AVEC SUCCÈS SUR LE CLOUD !")
-                        else:
-                            print(f" ❌ ERREUR UPLOAD VIDÉO : {resp_vid.status_code} - {resp_vid.text}")
-                else:
-                    print(" ⚠️ Fichier vidéo introuvable sur le disque local.")
-
-            except Exception as e:
-                print(f" ❌ ERREUR CONNEXION AWS : {e}")
-                print("    (Vérifie que le serveur AWS est lancé et le port 8000 ouvert)")
-
-            print("------------------------------------------------", flush=True)
-            
-        except Exception as e:
-            print(f"[ERROR] Finalisation : {e}", flush=True)
-
-def scan_existing_files(handler):
-    print("🔍 Scan des fichiers...", flush=True)
-    if not os.path.exists(INPUT_FOLDER): return
-    files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith("_downscaled.mp4")]
-    for filename in files:
-        final_check = os.path.join(FINAL_FOLDER, filename.replace("_downscaled.mp4", "_final_result.json"))
-        # On force le retraitement si le fichier final n'existe pas
-        if not os.path.exists(final_check):
-            print(f"   Rattrapage : {filename}", flush=True)
-            handler.process_pipeline(os.path.join(INPUT_FOLDER, filename), filename)
-        else:
-             print(f"   Déjà terminé : {filename}", flush=True)
-
-if __name__ == "__main__":
-    if not os.path.exists(INPUT_FOLDER): os.makedirs(INPUT_FOLDER, exist_ok=True)
-    if not os.path.exists(META_FOLDER): os.makedirs(META_FOLDER, exist_ok=True)
-    if not os.path.exists(FINAL_FOLDER): os.makedirs(FINAL_FOLDER, exist_ok=True)
-
-    handler = AnimalHandler()
-    scan_existing_files(handler)
-
-    observer = Observer()
-    observer.schedule(handler, path=INPUT_FOLDER, recursive=False)
-    observer.start()
-    try:
-        while True: time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
\ No newline at end of file
+import time
+import os
+import json
+import signal
+import threading
+from common.ingest import FileIngestor
+from common.jobs import JobQueue
+from common.ledger import JobLedger
+from common.claims import make_claims
+from common.metrics import YOLO_FPS, start_metrics_server
+from common.join import JoinBarrier
+from sampling import FrameSampler, decode_jpeg_frames, iter_video_frames, SAMPLE_STRIDE, SCENE_THRESHOLD, EARLY_EXIT_PATIENCE
+from backends import make_backend, BATCH_SIZE, INFERENCE_BACKEND, CONF
+from common.artifacts import load_frames, load_manifest, remove_artifacts, hls_paths
+from common.cas import ContentCache, source_hash_of
+from common.tracing import Span, file_size, read_trace, trace_id_of
+from outbox import Outbox, OUTBOX_ROOT
+
+# --- CONFIGURATION ---
+INPUT_FOLDER = "/mnt/data/processed"
+META_FOLDER = "/mnt/data/metadata"
+FINAL_FOLDER = "/mnt/data/final"
+LOCAL_MODEL = "/root/.cache/yolo/yolov8n.pt"
+# État des jointures (détection + langue + sous-titres) en attente, persisté.
+# Avec plusieurs réplicas, chacun a le sien (REPLICA_ID stable, ex. nom du pod StatefulSet)
+REPLICA_ID = os.getenv("REPLICA_ID", "")
+JOIN_STATE_FILE = os.path.join(FINAL_FOLDER, f".join_state{'.' + REPLICA_ID if REPLICA_ID else ''}.json")
+LANG_SUFFIX = "_lang.json"
+SUBS_SUFFIX = "_subs.srt"
+
+# On récupère l'URL AWS depuis le docker-compose
+# Exemple attendu : http://51.20.183.135:8000/upload_result
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000/upload_result")
+# Spans de la vidéo (toutes étapes) envoyés au backend après finalisation
+TRACE_URL = BACKEND_URL.replace("/upload_result", "/api/trace")
+# Version de la détection pour le cache partagé (modèle, seuil, échantillonnage)
+CACHE_VERSION = f"yolov8n-{INFERENCE_BACKEND}-conf{CONF:g}-s{SAMPLE_STRIDE}-sc{SCENE_THRESHOLD:g}-p{EARLY_EXIT_PATIENCE}"
+# Envois au backend en attente (un dossier par réplica, comme l'état de jointure)
+OUTBOX_FOLDER = os.path.join(OUTBOX_ROOT, f"animal-detect{'.' + REPLICA_ID if REPLICA_ID else ''}")
+
+class AnimalHandler:
+    def __init__(self):
+        # Un modèle par worker : le predictor Ultralytics n'est pas thread-safe
+        # (backend "torch" ou "onnx", voir backends.py)
+        self._local = threading.local()
+        # Registre durable : reprise des travaux non terminés, nouveaux essais en cas d'échec
+        self.ledger = JobLedger("animal-detect")
+        # Baux : plusieurs réplicas se partagent les vidéos sans les analyser deux fois
+        self.jobs = JobQueue("animal-detect", self.process_pipeline, initializer=self.load_model,
+                             ledger=self.ledger, claims=make_claims("animal-detect"))
+        # La finalisation (lecture metadata + envoi cloud) ne bloque pas les workers YOLO.
+        # Registre propre (par réplica, comme la jointure) : un échec est retenté avec
+        # backoff, et repris au redémarrage
+        self.finalize_ledger = JobLedger(f"animal-detect-finalize{'.' + REPLICA_ID if REPLICA_ID else ''}")
+        self.finalize_jobs = JobQueue("finalize", self.finalize_join, workers=1, ledger=self.finalize_ledger)
+        # Jointure : finalize dès que les 3 sorties sont là, quel que soit l'ordre d'arrivée
+        self.join = JoinBarrier(JOIN_STATE_FILE, ("detect", "lang", "subs"), self.on_join_complete)
+        self.cache = ContentCache("detect", CACHE_VERSION)
+        # Livraison au backend en arrière-plan : finalize ne dépend plus du réseau
+        self.outbox = Outbox(OUTBOX_FOLDER)
+
+    def load_model(self):
+        print("⏳ Chargement YOLO...", flush=True)
+        if os.path.exists(LOCAL_MODEL):
+            self._local.model = make_backend(LOCAL_MODEL)
+            print(f"✅ Modèle chargé depuis le cache ({self._local.model.name}).", flush=True)
+        else:
+            print("⚠️ Cache absent, utilisation défaut.", flush=True)
+            self._local.model = make_backend("yolov8n.pt")
+        return self._local.model
+
+    @property
+    def model(self):
+        model = getattr(self._local, "model", None)
+        return model if model is not None else self.load_model()
+
+    def accepts(self, filename):
+        return filename.endswith("_downscaled.mp4") and not filename.startswith(".")
+
+    def on_file_ready(self, path):
+        filename = os.path.basename(path)
+        print(f"\n[ANIMAL] 🐶 Détecté : {filename}", flush=True)
+        self.jobs.submit(path, path, filename)
+
+    def accepts_metadata(self, filename):
+        if filename.startswith("."): return False
+        return filename.endswith(LANG_SUFFIX) or filename.endswith(SUBS_SUFFIX)
+
+    def on_metadata_ready(self, path):
+        filename = os.path.basename(path)
+        if filename.endswith(LANG_SUFFIX):
+            base_name, part = filename[:-len(LANG_SUFFIX)], "lang"
+        else:
+            base_name, part = filename[:-len(SUBS_SUFFIX)], "subs"
+        if self.owns(base_name):
+            self.join.arrive(base_name, part, path)
+
+    def owns(self, base_name):
+        # Sans baux (un seul réplica), toutes les metadata nous concernent. Sinon seulement
+        # celles des vidéos que ce réplica analyse ou a analysées ; les autres seront
+        # ramassées par collect_metadata() au moment de la détection.
+        if self.jobs.claims is None:
+            return True
+        video_path = os.path.join(INPUT_FOLDER, f"{base_name}_downscaled.mp4")
+        return self.jobs.claims.holds(video_path) or base_name in self.join.pending()
+
+    def collect_metadata(self, base_name):
+        # Metadata déjà présentes (arrivées avant la détection ou pendant un arrêt)
+        parts = self.join.pending().get(base_name, {})
+        for suffix, part in ((LANG_SUFFIX, "lang"), (SUBS_SUFFIX, "subs")):
+            meta_path = os.path.join(META_FOLDER, f"{base_name}{suffix}")
+            if part not in parts and os.path.exists(meta_path):
+                self.join.arrive(base_name, part, meta_path)
+
+    def on_join_complete(self, base_name, parts):
+        # Clé = chemin de la vidéo : une vidéo re-déposée sous le même nom est refinalisée
+        self.finalize_jobs.submit(self.finalize_key(parts), base_name, parts)
+
+    def finalize_key(self, parts):
+        return os.path.join(INPUT_FOLDER, parts["detect"]["filename"])
+
+    def finalize_join(self, base_name, parts):
+        detect = parts["detect"]
+        # Jointure persistée par une version sans trace : on relit le manifeste
+        trace_id = detect.get("trace_id") or trace_id_of(load_manifest(INPUT_FOLDER, base_name), base_name)
+        # Attente en file = depuis l'arrivée de la dernière sortie de la jointure
+        with Span("finalize", trace_id, base_name, queued_at=self.finalize_jobs.submitted_at(self.finalize_key(parts))) as span:
+            self.finalize(detect["filename"], detect["animals"], parts["lang"], parts["subs"], trace_id, span)
+        self.join.acknowledge(base_name)
+        self.send_trace(base_name, trace_id)
+        # Toutes les étapes ont lu leurs artefacts d'ingestion : on libère le volume partagé
+        freed = remove_artifacts(INPUT_FOLDER, base_name)
+        if freed:
+            print(f"🧹 Artefacts d'ingestion supprimés : {base_name} ({freed / 1024 ** 2:.0f} Mo)", flush=True)
+
+    def send_trace(self, base_name, trace_id):
+        spans = read_trace(trace_id)
+        if spans:
+            self.outbox.put_json("trace", base_name, f"{TRACE_URL}/{base_name}", {"trace_id": trace_id, "spans": spans})
+
+    def process_pipeline(self, file_path, filename):
+        base_name = filename.replace("_downscaled.mp4", "")
+        manifest = load_manifest(INPUT_FOLDER, base_name)
+        with Span("animal-detect", trace_id_of(manifest, base_name), base_name,
+                  queued_at=self.jobs.submitted_at(file_path)) as span:
+            self.detect(file_path, filename, base_name, manifest, span)
+
+    def detect(self, file_path, filename, base_name, manifest, span):
+        print(f"DEBUG: Entrée fonction process pour {filename}", flush=True)
+        trace_id = span.data["trace_id"]
+
+        # 0. Même source déjà analysée : on reprend l'ensemble des animaux détectés
+        try:
+            source_hash = source_hash_of(manifest, file_path)
+            entry = self.cache.lookup(source_hash)
+            if entry is not None:
+                animals_list = self.cache.read_value(entry)["animals"]
+                print(f"✅ [RESULT] Total animaux (cache) : {animals_list}", flush=True)
+                span.set(cache="hit")
+                self.collect_metadata(base_name)
+                self.join.arrive(base_name, "detect", {"filename": filename, "animals": animals_list, "trace_id": trace_id})
+                return
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Cache inutilisable ({e})", flush=True)
+            source_hash = None
+        
+        # 1. Analyse YOLO (Mode Streaming optimisé)
+        print(f"--> 🧠 Lancement YOLO (Mode Stream) sur {filename}...", flush=True)
+        
+        animals_found = set()
+        frame_count = 0
+        infer_s = 0.0
+        # Échantillonnage adaptatif : pas + détection de changement de scène
+        sampler = FrameSampler()
+        
+        try:
+            # Images déjà échantillonnées par le downscaler (MJPEG) : pas de décodage de la vidéo
+            sampled = load_frames(INPUT_FOLDER, base_name)
+            if sampled is not None:
+                jpegs, frame_fps, frames_bytes = sampled
+                span.set(bytes_in=frames_bytes)
+                print(f"    Source : images pré-échantillonnées ({frame_fps} img/s, {frames_bytes / 1024 ** 2:.0f} Mo)", flush=True)
+                selected = sampler.select(decode_jpeg_frames(jpegs))
+            else:
+                span.set(bytes_in=file_size(file_path))
+                selected = sampler.select(iter_video_frames(file_path, stats=sampler.stats), count_decoded=False)
+            print("    Progression : ", end="", flush=True)
+
+            def run_batch(batch):
+                nonlocal infer_s
+                # Une passe du modèle pour BATCH_SIZE images
+                start = time.perf_counter()
+                batch_classes = self.model.classes(batch)
+                infer_s += time.perf_counter() - start
+                for classes in batch_classes:
+                    found_new = False
+                    for c in classes:
+                        class_name = self.model.names[int(c)]
+                        if class_name not in animals_found:
+                            animals_found.add(class_name)
+                            found_new = True
+                            print(f"[{class_name}]", end="", flush=True)
+                    sampler.report(found_new)
+
+            batch = []
+            for frame in selected:
+                batch.append(frame)
+                frame_count += 1
+                if frame_count % 20 == 0:
+                    print(".", end="", flush=True)
+                if len(batch) >= BATCH_SIZE:
+                    run_batch(batch)
+                    batch = []
+            if batch:
+                run_batch(batch)
+
+            print(f"\n✅ Terminé ! {frame_count} frames analysées ({sampler.summary()}).")
+            if infer_s > 0:
+                YOLO_FPS.labels(self.model.name).observe(frame_count / infer_s)
+            animals_list = list(animals_found)
+            print(f"✅ [RESULT] Total animaux : {animals_list}", flush=True)
+            self.cache.store(source_hash, value={"animals": sorted(animals_list)})
+            
+        except Exception as e:
+            print(f"\n❌ CRASH YOLO : {e}", flush=True)
+            raise
+
+        # 2. Jointure avec les metadata (générées par les autres conteneurs) :
+        # pas d'attente ici, finalize partira à l'arrivée de la dernière sortie.
+        self.collect_metadata(base_name)
+        self.join.arrive(base_name, "detect", {"filename": filename, "animals": animals_list, "trace_id": trace_id})
+
+    def finalize(self, filename, animals, lang_file, subs_file, trace_id, span):
+        try:
+            # A. Lecture du fichier langue
+            with open(lang_file, 'r') as f:
+                lang_data = json.load(f)
+
+            # B. Lecture complète des sous-titres
+            try:
+                with open(subs_file, 'r', encoding='utf-8') as f:
+                    subs_content = f.read()
+            except:
+                subs_content = "Erreur lecture sous-titres"
+            span.set(bytes_in=file_size(lang_file, subs_file))
+
+            # C. Sauvegarde Locale (Backup)
+            payload_local = {
+                "video_name": filename,
+                "animals_detected": animals,
+                "audio_language": lang_data.get("language", "unknown"),
+                "subtitles_path": subs_file,
+                "trace_id": trace_id,
+                "processed_at": time.ctime()
+            }
+            
+            base_name = filename.replace("_downscaled.mp4", "")
+            final_filename = f"{base_name}_final_result.json"
+            final_path = os.path.join(FINAL_FOLDER, final_filename)
+
+            with open(final_path, 'w', encoding='utf-8') as f:
+                json.dump(payload_local, f, indent=4, ensure_ascii=False)
+
+            print("\n------------------------------------------------", flush=True)
+            print(f" ✅ SUCCÈS LOCAL ! Résultat dans : {final_filename}", flush=True)
+
+            span.set(bytes_out=file_size(final_path))
+
+            # --- D. ENVOI VERS AWS (via l'outbox : JSON puis vidéo) ---
+            # Version HLS publiée par le downscaler (PLAYBACK_HLS=1) : média puis playlist
+            hls_files = [path for path in (hls_paths(INPUT_FOLDER, base_name)[k] for k in ("media", "playlist"))
+                         if os.path.exists(path)]
+            # Payload pour le Cloud
+            aws_payload = {
+                "video_id": base_name,
+                "filename": filename,
+                "original_resolution": "1080p", 
+                "processed_resolution": "720p",
+                "detected_language": lang_data.get("language", "unknown"),
+                "subtitles": subs_content, # Contenu complet des SRT
+                "detected_objects": animals,
+                "s3_url": f"/media/{filename}", # URL relative pour le frontend (Range, cache)
+                "hls_url": f"/media/{os.path.basename(hls_files[-1])}" if hls_files else None,
+                "trace_id": trace_id,
+                "timestamp": time.time()
+            }
+            self.outbox.put_json("result", base_name, BACKEND_URL, aws_payload)
+
+            video_full_path = os.path.join(INPUT_FOLDER, filename)
+            if os.path.exists(video_full_path):
+                self.outbox.put_video(base_name, BACKEND_URL.replace("/upload_result", "/uploads"), video_full_path, filename)
+                for path in hls_files:
+                    self.outbox.put_video(base_name, BACKEND_URL.replace("/upload_result", "/uploads"), path, os.path.basename(path))
+            else:
+                print(" ⚠️ Fichier vidéo introuvable sur le disque local.")
+            print(f" 📡 Envoi vers {BACKEND_URL} confié à l'outbox ({self.outbox.pending()} en attente)", flush=True)
+
+            print("------------------------------------------------", flush=True)
+            
+        except Exception as e:
+            # La jointure n'est pas acquittée : la file "finalize" retente (registre, backoff)
+            print(f"[ERROR] Finalisation : {e}", flush=True)
+            raise
+
+def scan_existing_files(handler):
+    print("🔍 Scan des fichiers...", flush=True)
+    # 1. Détections interrompues ou en attente d'un nouvel essai (registre)
+    handler.jobs.recover()
+
+    # 2. Jointures en cours : metadata arrivées pendant l'arrêt du service
+    for base_name in handler.join.pending():
+        handler.collect_metadata(base_name)
+
+    # 3. Vidéos arrivées pendant l'arrêt (depuis le watermark du registre)
+    for filename, path in handler.ledger.scan(INPUT_FOLDER, handler.accepts):
+        base_name = filename.replace("_downscaled.mp4", "")
+        final_check = os.path.join(FINAL_FOLDER, f"{base_name}_final_result.json")
+        parts = handler.join.pending().get(base_name, {})
+        if os.path.exists(final_check) or "detect" in parts:
+            print(f"   Déjà traité : {filename}", flush=True)
+            handler.ledger.mark_done(path, (path, filename))
+            continue
+        print(f"   Rattrapage : {filename}", flush=True)
+        handler.jobs.submit(path, path, filename)
+
+if __name__ == "__main__":
+    if not os.path.exists(INPUT_FOLDER): os.makedirs(INPUT_FOLDER, exist_ok=True)
+    if not os.path.exists(META_FOLDER): os.makedirs(META_FOLDER, exist_ok=True)
+    if not os.path.exists(FINAL_FOLDER): os.makedirs(FINAL_FOLDER, exist_ok=True)
+
+    start_metrics_server()
+    handler = AnimalHandler()
+    handler.jobs.start()
+    handler.finalize_jobs.start()
+    handler.outbox.start()
+    # Finalisations en échec ou interrompues (registre)
+    handler.finalize_jobs.recover()
+    # Jointures complètes avant l'arrêt précédent mais jamais finalisées
+    handler.join.resume()
+    scan_existing_files(handler)
+
+    ingestor = FileIngestor(INPUT_FOLDER, handler.on_file_ready, accept=handler.accepts)
+    ingestor.start()
+    # Arrivée des sorties lang-ident / subtitler => alimente la jointure
+    meta_ingestor = FileIngestor(META_FOLDER, handler.on_metadata_ready, accept=handler.accepts_metadata)
+    meta_ingestor.start()
+    # docker stop (SIGTERM) => même arrêt propre que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt:
+        ingestor.stop()
+        meta_ingestor.stop()
+    ingestor.join()
+    meta_ingestor.join()
+    handler.jobs.shutdown()
+    handler.finalize_jobs.shutdown()
+    handler.outbox.stop()
\ No newline at end of file
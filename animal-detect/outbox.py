@@ -0,0 +1,224 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import itertools
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from common.metrics import OUTBOX_PENDING, UPLOAD_BYTES, UPLOAD_DURATION
+from common.cas import file_sha256
+
+# --- OUTBOX : LIVRAISON AU BACKEND EN ARRIÈRE-PLAN ---
+# finalize() ne parle plus au réseau : il dépose chaque envoi (résultat JSON, vidéo,
+# trace) dans un fichier de <OUTBOX_ROOT>/<service>/ puis rend la main. Un thread
+# unique vide l'outbox avec une session HTTP keep-alive (pool de connexions) :
+#  - JSON compressé en gzip (Content-Encoding: gzip) ;
+#  - vidéo par morceaux via le protocole reprenable /uploads (jamais chargée en entier) ;
+#  - échec réseau / 5xx : nouvel essai avec backoff exponentiel, sans limite, l'entrée
+#    reste sur disque (survit aux redémarrages) ;
+#  - refus définitif (4xx, vidéo disparue) : l'entrée part dans dead/ pour inspection.
+# Tous les envois sont idempotents côté backend (UPSERT, upload reprenable) :
+# renvoyer une entrée après un crash ne crée pas de doublon.
+
+OUTBOX_ROOT = os.getenv("OUTBOX_ROOT", "/mnt/data/state/outbox")
+OUTBOX_BACKOFF_S = float(os.getenv("OUTBOX_BACKOFF_S", "5"))
+OUTBOX_BACKOFF_MAX_S = float(os.getenv("OUTBOX_BACKOFF_MAX_S", "600"))
+OUTBOX_TIMEOUT_S = float(os.getenv("OUTBOX_TIMEOUT_S", "50"))
+OUTBOX_POOL_SIZE = int(os.getenv("OUTBOX_POOL_SIZE", "4"))
+# Taille des morceaux pour l'upload reprenable de la vidéo
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "5"))
+
+# Sans entrée à échéance, on relit quand même le dossier de temps en temps
+IDLE_RESCAN_S = 30
+
+
+class DeliveryRejected(Exception):
+    """Refus définitif : inutile de réessayer."""
+
+
+def make_session(pool_size=OUTBOX_POOL_SIZE):
+    # Connexions réutilisées entre les envois (keep-alive) ; les nouveaux essais
+    # sont gérés par l'outbox, pas par urllib3
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def upload_video_resumable(video_path, filename, uploads_url, session):
+    """Envoie la vidéo par morceaux (/uploads). En cas de coupure, on redemande
+    l'offset au serveur et on reprend là où on s'était arrêté."""
+    size = os.path.getsize(video_path)
+    # Le serveur dérive l'upload_id de (nom, taille, hash) : un nouvel appel
+    # après un crash reprend le même upload.
+    resp = session.post(uploads_url, json={
+        "filename": filename, "size": size, "sha256": file_sha256(video_path),
+    }, timeout=30)
+    resp.raise_for_status()
+    upload_id = resp.json()["upload_id"]
+    offset = resp.json()["offset"]
+    upload_url = f"{uploads_url}/{upload_id}"
+
+    failures = 0
+    upload_start = time.perf_counter()
+    with open(video_path, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(UPLOAD_CHUNK_SIZE)
+            try:
+                r = session.patch(upload_url, data=chunk, timeout=120, headers={
+                    "Upload-Offset": str(offset),
+                    "X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest(),
+                    "Content-Type": "application/offset+octet-stream",
+                })
+                if r.status_code in (409, 422) and "Upload-Offset" in r.headers:
+                    # Désynchronisé (ou morceau corrompu) : on repart de l'offset serveur
+                    offset = int(r.headers["Upload-Offset"])
+                    failures += 1
+                else:
+                    r.raise_for_status()
+                    UPLOAD_BYTES.labels("video").inc(int(r.headers["Upload-Offset"]) - offset)
+                    offset = int(r.headers["Upload-Offset"])
+                    failures = 0
+            except requests.RequestException as e:
+                failures += 1
+                print(f" ⚠️ Morceau à {offset} échoué ({e}), reprise...", flush=True)
+                time.sleep(min(2 ** failures, 30))
+                offset = int(session.head(upload_url, timeout=30).headers["Upload-Offset"])
+            if failures > UPLOAD_MAX_RETRIES:
+                raise RuntimeError(f"Upload abandonné à l'offset {offset}/{size}")
+
+    r = session.post(f"{upload_url}/complete", timeout=600)
+    r.raise_for_status()
+    UPLOAD_DURATION.labels("video").observe(time.perf_counter() - upload_start)
+    return r
+
+
+def _is_permanent(error):
+    if isinstance(error, DeliveryRejected):
+        return True
+    response = getattr(error, "response", None)
+    # 408 / 409 / 429 : le serveur demande de revenir plus tard
+    return (isinstance(error, requests.HTTPError) and response is not None
+            and 400 <= response.status_code < 500 and response.status_code not in (408, 409, 429))
+
+
+class Outbox:
+    def __init__(self, folder, session=None):
+        self.folder = folder
+        self.dead_folder = os.path.join(folder, "dead")
+        os.makedirs(self.dead_folder, exist_ok=True)
+        self.session = session or make_session()
+        self._seq = itertools.count()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="outbox", daemon=True)
+        OUTBOX_PENDING.set_function(self.pending)
+
+    # --- Dépôt (appelé par finalize) ---
+    def put_json(self, kind, video_id, url, payload):
+        self._write({"kind": kind, "video_id": video_id, "url": url, "payload": payload})
+
+    def put_video(self, video_id, uploads_url, path, filename):
+        self._write({"kind": "video", "video_id": video_id, "url": uploads_url, "path": path, "filename": filename})
+
+    def _write(self, item):
+        item.update(created_at=time.time(), attempts=0, next_attempt_at=0)
+        # Nom croissant : les envois d'une vidéo partent dans l'ordre de dépôt
+        name = f"{time.time_ns():020d}-{next(self._seq):06d}-{item['kind']}.json"
+        tmp_path = os.path.join(self.folder, f".tmp_{name}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(item, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.folder, name))
+        self._wake.set()
+
+    def _entries(self):
+        return sorted(n for n in os.listdir(self.folder) if n.endswith(".json") and not n.startswith("."))
+
+    def pending(self):
+        try:
+            return len(self._entries())
+        except OSError:
+            return 0
+
+    # --- Livraison (thread de l'outbox) ---
+    def _deliver(self, item):
+        if item["kind"] == "video":
+            if not os.path.exists(item["path"]):
+                raise DeliveryRejected(f"Fichier introuvable : {item['path']}")
+            upload_video_resumable(item["path"], item["filename"], item["url"], self.session)
+            return
+        body = gzip.compress(json.dumps(item["payload"], ensure_ascii=False).encode("utf-8"))
+        start = time.perf_counter()
+        r = self.session.post(item["url"], data=body, timeout=OUTBOX_TIMEOUT_S, headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        })
+        r.raise_for_status()
+        UPLOAD_DURATION.labels(item["kind"]).observe(time.perf_counter() - start)
+        UPLOAD_BYTES.labels(item["kind"]).inc(len(body))
+
+    def _drain(self):
+        """Un passage sur l'outbox ; renvoie le délai avant le prochain passage."""
+        next_due = IDLE_RESCAN_S
+        for name in self._entries():
+            if self._stop.is_set():
+                break
+            path = os.path.join(self.folder, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    item = json.load(f)
+            except (OSError, ValueError):
+                continue
+            wait = item["next_attempt_at"] - time.time()
+            if wait > 0:
+                next_due = min(next_due, wait)
+                continue
+            try:
+                self._deliver(item)
+            except Exception as e:
+                if _is_permanent(e):
+                    print(f"[OUTBOX] ❌ {item['kind']} {item['video_id']} refusé ({e}) -> dead/", flush=True)
+                    shutil.move(path, os.path.join(self.dead_folder, name))
+                    continue
+                item["attempts"] += 1
+                delay = min(OUTBOX_BACKOFF_MAX_S, OUTBOX_BACKOFF_S * 2 ** (item["attempts"] - 1))
+                item["next_attempt_at"] = time.time() + delay
+                item["error"] = str(e)[:500]
+                tmp_path = os.path.join(self.folder, f".tmp_{name}")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(item, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+                print(f"[OUTBOX] ⚠️ {item['kind']} {item['video_id']} : échec n°{item['attempts']} ({e}), "
+                      f"nouvel essai dans {delay:.0f}s", flush=True)
+                # Backend injoignable : inutile d'essayer les entrées suivantes maintenant
+                return min(next_due, delay)
+            os.remove(path)
+            print(f"[OUTBOX] 🚀 {item['kind']} {item['video_id']} livré", flush=True)
+        return next_due
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                delay = self._drain()
+            except OSError as e:
+                print(f"[OUTBOX] ⚠️ {self.folder} illisible ({e})", flush=True)
+                delay = IDLE_RESCAN_S
+            self._wake.wait(delay)
+
+    def start(self):
+        self._thread.start()
+        print(f"[OUTBOX] {self.folder} : {self.pending()} envoi(s) en attente", flush=True)
+
+    def stop(self):
+        # Un upload interrompu reprendra à l'offset serveur au prochain démarrage
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self.session.close()
@@ -0,0 +1,106 @@
+import os
+import cv2
+import numpy as np
+
+# --- ÉCHANTILLONNAGE ADAPTATIF DES IMAGES AVANT YOLO ---
+# On ne garde qu'un ensemble de classes par vidéo : inutile d'inférer 25-30 images
+# quasi identiques par seconde. Une image part au modèle si :
+#   - SAMPLE_STRIDE images analysées se sont écoulées depuis la dernière inférence, ou
+#   - la scène a changé (différence moyenne sur une vignette en niveaux de gris).
+# Arrêt anticipé optionnel quand la liste des classes ne bouge plus.
+
+# Cadence d'analyse (mode fichier, sans artefact du downscaler) : images/seconde décodées
+SCAN_FPS = float(os.getenv("SCAN_FPS", "5"))
+# Inférence forcée toutes les N images analysées
+SAMPLE_STRIDE = int(os.getenv("SAMPLE_STRIDE", "5"))
+# Différence moyenne (0-255) au-delà de laquelle on considère un changement de scène
+SCENE_THRESHOLD = float(os.getenv("SCENE_THRESHOLD", "12"))
+# Écart minimal (en images analysées) entre deux inférences déclenchées par le mouvement
+SCENE_MIN_GAP = int(os.getenv("SCENE_MIN_GAP", "1"))
+# Arrêt après N inférences sans nouvelle classe (0 = désactivé)
+EARLY_EXIT_PATIENCE = int(os.getenv("EARLY_EXIT_PATIENCE", "0"))
+
+THUMB_SIZE = (64, 36)
+
+
+def thumbnail(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def iter_video_frames(path, scan_fps=SCAN_FPS, stats=None):
+    """Décode la vidéo et ne convertit (retrieve) qu'une image sur N : grab() seul
+    évite la conversion couleur des images qui ne seront pas analysées."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Impossible d'ouvrir {path}")
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    step = max(1, int(round(src_fps / scan_fps)))
+    index = 0
+    try:
+        while cap.grab():
+            if stats is not None: stats["decoded"] += 1
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if ok: yield frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def decode_jpeg_frames(jpegs):
+    """Images JPEG (artefact MJPEG du downscaler) -> images BGR, une à la fois."""
+    for data in jpegs:
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            yield frame
+
+
+class FrameSampler:
+    def __init__(self, stride=SAMPLE_STRIDE, scene_threshold=SCENE_THRESHOLD,
+                 min_gap=SCENE_MIN_GAP, patience=EARLY_EXIT_PATIENCE):
+        self.stride = max(1, stride)
+        self.scene_threshold = scene_threshold
+        self.min_gap = max(1, min_gap)
+        self.patience = patience
+        self.stats = {"decoded": 0, "scanned": 0, "inferred": 0, "scene_triggers": 0, "early_exit": False}
+        self._since_new_class = 0
+
+    def select(self, frames, count_decoded=True):
+        """Itère sur les images analysées et ne renvoie que celles à envoyer au modèle.
+        Après chaque image renvoyée, l'appelant signale report(nouvelle_classe)."""
+        last_thumb = None
+        since_inference = 0
+        for frame in frames:
+            if count_decoded: self.stats["decoded"] += 1
+            self.stats["scanned"] += 1
+            thumb = thumbnail(frame)
+            since_inference += 1
+
+            infer = last_thumb is None or since_inference >= self.stride
+            if not infer and since_inference >= self.min_gap:
+                score = float(np.abs(thumb - last_thumb).mean())
+                if score >= self.scene_threshold:
+                    infer = True
+                    self.stats["scene_triggers"] += 1
+            if not infer:
+                continue
+
+            last_thumb = thumb
+            since_inference = 0
+            self.stats["inferred"] += 1
+            yield frame
+
+            if self.patience and self._since_new_class >= self.patience:
+                self.stats["early_exit"] = True
+                return
+
+    def report(self, found_new_class):
+        self._since_new_class = 0 if found_new_class else self._since_new_class + 1
+
+    def summary(self):
+        s = self.stats
+        ratio = s["inferred"] / s["decoded"] * 100 if s["decoded"] else 0
+        line = (f"{s['decoded']} images décodées, {s['scanned']} analysées, "
+                f"{s['inferred']} inférées ({ratio:.1f}%), {s['scene_triggers']} changements de scène")
+        return line + (", arrêt anticipé" if s["early_exit"] else "")
@@ -1,81 +1,315 @@
-import shutil
-import os
-import json
-import time
-from fastapi import FastAPI, Request, File, UploadFile
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from fastapi.middleware.cors import CORSMiddleware
-
-app = FastAPI()
-
-# Permettre à tout le monde d'accéder (CORS)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Création du dossier static pour stocker les vidéos reçues
-os.makedirs("static", exist_ok=True)
-
-# On rend le dossier "static" accessible publiquement (pour lire les vidéos)
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-DB_FILE = "simulated_dynamodb.json"
-
-# --- ROUTE 1 : Afficher le site Web ---
-@app.get("/")
-async def read_index():
-    if os.path.exists("index.html"):
-        return FileResponse("index.html")
-    return {"error": "Veuillez créer le fichier index.html"}
-
-# --- ROUTE 2 : Recevoir les Métadonnées (JSON) ---
-@app.post("/upload_result")
-async def upload_result(request: Request):
-    new_data = await request.json()
-    # On utilise le nom de la vidéo comme ID unique
-    video_id = new_data.get("video_id", f"vid_{int(time.time())}")
-    
-    print(f"JSON reçu pour : {video_id}")
-
-    # 1. Charger l'historique existant
-    db_data = {}
-    if os.path.exists(DB_FILE):
-        try:
-            with open(DB_FILE, "r") as f:
-                db_data = json.load(f)
-        except:
-            db_data = {}
-
-    # 2. Ajouter/Mettre à jour la vidéo
-    db_data[video_id] = new_data
-
-    # 3. Sauvegarder sur le disque
-    with open(DB_FILE, "w") as f:
-        json.dump(db_data, f, indent=4)
-
-    return {"status": "success", "id": video_id}
-
-# --- ROUTE 3 : Recevoir la Vidéo (MP4) ---
-# C'est ICI que ton script local va envoyer le fichier
-@app.post("/upload_video")
-async def upload_video(file: UploadFile = File(...)):
-    file_location = f"static/{file.filename}"
-    print(f"VIDÉO reçue : {file.filename}")
-    
-    # Écriture du fichier sur le disque du serveur
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    return {"info": "Vidéo sauvegardée", "filename": file.filename}
-
-# --- ROUTE 4 : API pour le Frontend (Donner la liste des vidéos) ---
-@app.get("/api/results")
-async def get_results():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, "r") as f:
-            return json.load(f)
-    return {}
\ No newline at end of file
+import shutil
+import os
+import json
+import time
+import zlib
+import gzip
+from typing import Optional
+from fastapi import FastAPI, Request, File, UploadFile, Query
+from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, Response, JSONResponse
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from starlette.routing import Match
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from store import ResultStore
+from uploads import UploadManager, UploadError, safe_filename
+from timeline import build_timeline
+from media import media_response
+from search import match_expression
+
+app = FastAPI()
+
+# Permettre à tout le monde d'accéder (CORS)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# --- MÉTRIQUES PROMETHEUS (/metrics) ---
+# Étiquette = modèle de route ("/uploads/{upload_id}") : cardinalité bornée
+REQUEST_DURATION = Histogram(
+    "vidp_backend_request_duration_seconds", "Latence des requêtes HTTP",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPLOAD_BYTES = Counter("vidp_backend_upload_bytes_total", "Octets reçus (corps des requêtes)", ["route"])
+
+def route_template(request):
+    for route in request.app.router.routes:
+        if route.matches(request.scope)[0] == Match.FULL:
+            return route.path
+    return "other"
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    path = route_template(request)
+    REQUEST_DURATION.labels(request.method, path, f"{response.status_code // 100}xx").observe(
+        time.perf_counter() - start)
+    if request.method in ("POST", "PATCH", "PUT"):
+        UPLOAD_BYTES.labels(path).inc(int(request.headers.get("content-length") or 0))
+    return response
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Création du dossier static pour stocker les vidéos reçues
+os.makedirs("static", exist_ok=True)
+
+# On rend le dossier "static" accessible publiquement (pour lire les vidéos)
+app.mount("/static", StaticFiles(directory="static"), name="static")
+
+# Ancien stockage (fichier JSON complet), migré automatiquement au premier démarrage
+DB_FILE = "simulated_dynamodb.json"
+STORE_FILE = os.getenv("RESULTS_DB", "results.db")
+
+store = ResultStore(STORE_FILE, legacy_json=DB_FILE)
+
+# Uploads en cours (fichiers .part), publiés dans static/ une fois vérifiés
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads_tmp")
+uploads = UploadManager(UPLOAD_DIR, "static")
+
+async def read_json(request):
+    # Les workers compressent leurs envois JSON (outbox d'animal-detect)
+    body = await request.body()
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+# --- ROUTE 1 : Afficher le site Web ---
+@app.get("/")
+async def read_index():
+    if os.path.exists("index.html"):
+        return FileResponse("index.html")
+    return {"error": "Veuillez créer le fichier index.html"}
+
+# --- ROUTE 2 : Recevoir les Métadonnées (JSON) ---
+@app.post("/upload_result")
+async def upload_result(request: Request):
+    new_data = await read_json(request)
+    # On utilise le nom de la vidéo comme ID unique
+    video_id = new_data.get("video_id", f"vid_{int(time.time())}")
+    
+    print(f"JSON reçu pour : {video_id}")
+
+    # Ajout/Mise à jour de la vidéo (UPSERT indexé, pas de réécriture complète)
+    await run_in_threadpool(store.put, video_id, new_data)
+
+    return {"status": "success", "id": video_id}
+
+# --- ROUTE 3 : Recevoir la Vidéo (MP4) ---
+# C'est ICI que ton script local va envoyer le fichier
+@app.post("/upload_video")
+async def upload_video(file: UploadFile = File(...)):
+    try:
+        filename = safe_filename(file.filename)
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
+    file_location = f"static/{filename}"
+    temp_location = f"static/.tmp_{filename}"
+    print(f"VIDÉO reçue : {filename}")
+
+    # Écriture du fichier sur le disque du serveur, hors de la boucle asyncio,
+    # puis renommage atomique (le lecteur ne voit jamais un fichier à moitié écrit)
+    def _save():
+        with open(temp_location, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer, 1024 * 1024)
+        os.replace(temp_location, file_location)
+
+    await run_in_threadpool(_save)
+    return {"info": "Vidéo sauvegardée", "filename": filename}
+
+# --- ROUTE 3 bis : Upload reprenable par morceaux (voir uploads.py) ---
+def upload_error(e):
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else {}
+    return JSONResponse(status_code=e.status_code, content={"error": e.detail, "offset": e.offset}, headers=headers)
+
+@app.post("/uploads")
+async def create_upload(request: Request):
+    body = await read_json(request)
+    try:
+        upload_id, offset = await run_in_threadpool(
+            uploads.create, body.get("filename"), body.get("size"), body.get("sha256")
+        )
+    except UploadError as e:
+        return upload_error(e)
+    return JSONResponse(
+        status_code=201,
+        content={"upload_id": upload_id, "offset": offset},
+        headers={"Upload-Offset": str(offset)},
+    )
+
+@app.head("/uploads/{upload_id}")
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    try:
+        offset, meta = await run_in_threadpool(uploads.offset, upload_id)
+    except UploadError as e:
+        return upload_error(e)
+    return JSONResponse(
+        content={"upload_id": upload_id, "offset": offset, "size": meta.get("size")},
+        headers={"Upload-Offset": str(offset), "Cache-Control": "no-store"},
+    )
+
+@app.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    try:
+        offset = int(request.headers.get("upload-offset", "-1"))
+        writer = await run_in_threadpool(uploads.open_chunk, upload_id, offset)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "En-tête Upload-Offset manquant"})
+    except UploadError as e:
+        return upload_error(e)
+
+    # Le corps est lu en flux et chaque bloc est écrit depuis le threadpool :
+    # la boucle asyncio reste libre pour les autres requêtes.
+    try:
+        async for block in request.stream():
+            if block:
+                await run_in_threadpool(writer.write, block)
+    except UploadError as e:
+        await run_in_threadpool(writer.abort)
+        return upload_error(e)
+    except Exception:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    try:
+        new_offset = await run_in_threadpool(writer.close, request.headers.get("x-chunk-sha256"))
+    except UploadError as e:
+        return upload_error(e)
+    return JSONResponse(content={"offset": new_offset}, headers={"Upload-Offset": str(new_offset)})
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    try:
+        filename, size, digest = await run_in_threadpool(uploads.complete, upload_id)
+    except UploadError as e:
+        return upload_error(e)
+    print(f"VIDÉO reçue (par morceaux) : {filename} ({size} octets)")
+    return {"info": "Vidéo sauvegardée", "filename": filename, "size": size, "sha256": digest}
+
+# --- ROUTE 4 : API pour le Frontend (Donner la liste des vidéos) ---
+# Sans paramètre : dict complet {video_id: résultat} (compatibilité index.html).
+# Avec paramètres : page {"items": [...], "next_cursor": ...}
+#   ?limit=50&cursor=<next_cursor>&order=desc|asc
+#   ?fields=video_id,filename  ou  ?exclude=subtitles   (projection)
+#   ?language=fr&object=dog&since=<ts>&until=<ts>      (filtres indexés)
+@app.get("/api/results")
+async def get_results(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    language: Optional[str] = None,
+    obj: Optional[str] = Query(None, alias="object"),
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    order: str = "desc",
+):
+    # ETag = version du store + paramètres de la requête : un poll sans changement
+    # coûte une seule lecture du compteur et renvoie 304 sans corps.
+    query_key = zlib.crc32(str(sorted(request.query_params.multi_items())).encode())
+    version = await run_in_threadpool(store.version)
+    etag = f'W/"{version}-{query_key:08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # Sans paramètre : ancien format (dict complet), utilisé par index.html
+    if not request.query_params:
+        return Response(content=await run_in_threadpool(store.all_json), media_type="application/json", headers=headers)
+
+    limit = max(1, min(limit or 50, 500))
+    items, next_cursor = await run_in_threadpool(
+        store.query, language=language, obj=obj, since=since, until=until,
+        cursor=cursor, limit=limit, descending=(order != "asc"),
+    )
+
+    # Projection : on ne garde que les champs demandés (ex. sans le blob "subtitles")
+    if fields:
+        keep = set(fields.split(","))
+        items = [{k: v for k, v in item.items() if k in keep} for item in items]
+    if exclude:
+        drop = set(exclude.split(","))
+        items = [{k: v for k, v in item.items() if k not in drop} for item in items]
+
+    body = json.dumps({"items": items, "next_cursor": next_cursor}, ensure_ascii=False)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# --- ROUTE 5 : Traces de bout en bout (spans de chaque étape du pipeline) ---
+# POST : animal-detect envoie tous les spans de la vidéo après la finalisation
+# GET  : chronologie (attente / exécution par étape), chemin critique et goulot
+@app.post("/api/trace/{video_id}")
+async def upload_trace(video_id: str, request: Request):
+    body = await read_json(request)
+    spans = body.get("spans")
+    if not body.get("trace_id") or not isinstance(spans, list):
+        return JSONResponse(status_code=400, content={"error": "trace_id et spans requis"})
+    await run_in_threadpool(store.put_trace, video_id, body["trace_id"], spans)
+    return {"status": "success", "id": video_id, "spans": len(spans)}
+
+@app.get("/api/trace/{video_id}")
+async def get_trace(video_id: str):
+    trace = await run_in_threadpool(store.get_trace, video_id)
+    if trace is None:
+        return JSONResponse(status_code=404, content={"error": "Trace inconnue"})
+    trace_id, spans = trace
+    return build_timeline(video_id, trace_id, spans)
+
+# --- ROUTE 6 : Lecture des vidéos (Range, ETag, cache, HLS) ---
+# Mêmes fichiers que /static, mais un lecteur peut démarrer et chercher (seek)
+# sans télécharger la vidéo entière : MP4 faststart, ou playlist HLS <base>_hls.m3u8
+@app.head("/media/{filename}")
+@app.get("/media/{filename}")
+async def media(filename: str, request: Request):
+    try:
+        path = os.path.join("static", safe_filename(filename))
+        return media_response(request, path)
+    except (UploadError, FileNotFoundError, IsADirectoryError):
+        return JSONResponse(status_code=404, content={"error": "Fichier inconnu"})
+
+# --- ROUTE 7 : Recherche dans les sous-titres (index plein texte, voir search.py) ---
+#   ?q=lion mange            tous les mots (le dernier en préfixe)
+#   ?q="le lion mange"       phrase exacte
+#   &video_id=...&language=fr&limit=20&offset=0
+# Chaque réponse donne start/end (secondes) et seek_url pour démarrer la lecture à la réplique.
+@app.get("/api/search")
+async def search(
+    request: Request,
+    q: str = "",
+    video_id: Optional[str] = None,
+    language: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+):
+    match = match_expression(q)
+    if match is None:
+        return JSONResponse(status_code=400, content={"error": "Paramètre q vide"})
+
+    # Même principe que /api/results : pas de nouveau résultat => 304
+    query_key = zlib.crc32(str(sorted(request.query_params.multi_items())).encode())
+    version = await run_in_threadpool(store.version)
+    etag = f'W/"{version}-{query_key:08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    hits, more = await run_in_threadpool(
+        store.search, match, video_id=video_id, language=language, limit=limit, offset=offset
+    )
+    for hit in hits:
+        hit["seek_url"] = f"/media/{hit['filename']}#t={hit['start']:.3f}" if hit["filename"] else None
+    body = json.dumps(
+        {"query": q, "hits": hits, "next_offset": offset + limit if more else None},
+        ensure_ascii=False,
+    )
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,93 @@
+import os
+import re
+from email.utils import formatdate
+from fastapi.responses import Response, StreamingResponse
+
+# --- SERVICE DES VIDÉOS POUR LA LECTURE (MP4 faststart, HLS fMP4) ---
+# StaticFiles renvoie le fichier entier : pas de seek sans tout télécharger.
+# Ici : requêtes Range (un seul intervalle, 206 / 416), If-Range, ETag + 304,
+# Last-Modified, Cache-Control, et types MIME HLS. Le corps est lu par blocs
+# depuis le threadpool (StreamingResponse avec un itérateur synchrone).
+
+MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".m4s": "video/iso.segment",
+    ".m3u8": "application/vnd.apple.mpegurl",
+}
+# Un fichier publié n'est plus modifié (re-publication = nouvel ETag) ;
+# la playlist reste courte en cache pour voir passer une re-publication
+CACHE_CONTROL = {".m3u8": "public, max-age=60"}
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+READ_BLOCK = 256 * 1024
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """(début, fin) inclus, ou None pour renvoyer le fichier entier."""
+    match = _RANGE.fullmatch(header.strip())
+    # Syntaxe inconnue ou plusieurs intervalles : la RFC 9110 permet d'ignorer Range
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # "bytes=-N" : les N derniers octets
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def _iter_file(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(READ_BLOCK, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def media_response(request, path):
+    stat = os.stat(path)
+    ext = os.path.splitext(path)[1].lower()
+    media_type = MEDIA_TYPES.get(ext, "application/octet-stream")
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL.get(ext, DEFAULT_CACHE_CONTROL),
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    size = stat.st_size
+    start, length, status = 0, size, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range : l'intervalle n'est valable que si le fichier n'a pas changé
+    if range_header and if_range in (None, etag, headers["Last-Modified"]):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            length, status = end - start + 1, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(_iter_file(path, start, length), status_code=status, headers=headers, media_type=media_type)
@@ -0,0 +1,95 @@
+import re
+
+# --- RECHERCHE PLEIN TEXTE DANS LES SOUS-TITRES ---
+# Chaque résultat reçu découpe son SRT en répliques (video_id, début, fin, texte)
+# rangées dans subtitle_cues. L'index inversé est une table FTS5 (mot -> répliques)
+# adossée à cette table : mise à jour à chaque UPSERT (on retire les anciennes
+# répliques de la vidéo, on ajoute les nouvelles), jamais reconstruite en entier.
+# Le classement est le BM25 de FTS5 ; chaque réponse porte start/end en secondes
+# pour se positionner dans la vidéo (/media/<fichier>#t=<start>).
+# Toutes les correspondances sont classées (ORDER BY rank de FTS5) ; les filtres
+# vidéo / langue passent par subtitle_cues.video_id, avant la pagination.
+
+CUES_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS subtitle_cues (
+           id       INTEGER PRIMARY KEY,
+           video_id TEXT NOT NULL,
+           start    REAL NOT NULL,
+           end      REAL NOT NULL,
+           text     TEXT NOT NULL
+       )""",
+    "CREATE INDEX IF NOT EXISTS idx_cues_video ON subtitle_cues (video_id)",
+    # Accents ignorés ("éléphant" trouve "elephant") ; le texte n'est pas dupliqué ;
+    # index de préfixes pour la recherche pendant la frappe ("élé*")
+    """CREATE VIRTUAL TABLE IF NOT EXISTS cue_index USING fts5(
+           text, content='subtitle_cues', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+       )""",
+)
+
+_TIMING = re.compile(
+    r"(\d+):(\d{2}):(\d{2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{1,3})"
+)
+_PHRASE = re.compile(r'"([^"]*)"')
+_WORD = re.compile(r"\w+")
+
+
+def _seconds(h, m, s, ms):
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms.ljust(3, "0")) / 1000
+
+
+def parse_srt(content):
+    """[(début, fin, texte)] ; les blocs sans horodatage valide sont ignorés."""
+    if not isinstance(content, str):
+        return []
+    cues = []
+    for block in re.split(r"\r?\n\s*\r?\n", content):
+        lines = block.strip().splitlines()
+        for i, line in enumerate(lines):
+            timing = _TIMING.search(line)
+            if timing:
+                text = " ".join(l.strip() for l in lines[i + 1:] if l.strip())
+                if text:
+                    g = timing.groups()
+                    cues.append((_seconds(*g[:4]), _seconds(*g[4:]), text))
+                break
+    return cues
+
+
+def match_expression(query):
+    """Requête utilisateur -> expression MATCH FTS5 sûre.
+    Mots en ET, "entre guillemets" pour une phrase exacte, dernier mot en préfixe
+    (recherche pendant la frappe). None si la requête ne contient aucun mot."""
+    terms = []
+    for phrase in _PHRASE.findall(query):
+        words = _WORD.findall(phrase)
+        if words:
+            terms.append('"' + " ".join(words) + '"')
+    words = _WORD.findall(_PHRASE.sub(" ", query))
+    terms.extend(f'"{word}"' for word in words)
+    if not terms:
+        return None
+    if words and not query.rstrip().endswith('"'):
+        terms[-1] += "*"
+    return " AND ".join(terms)
+
+
+def index_cues(conn, video_id, subtitles):
+    """Remplace les répliques d'une vidéo (à appeler dans la transaction de l'UPSERT)."""
+    old = conn.execute(
+        "SELECT id, text FROM subtitle_cues WHERE video_id = ?", (video_id,)
+    ).fetchall()
+    if old:
+        # Table externe : FTS5 doit recevoir l'ancien texte pour retirer ses mots
+        conn.executemany(
+            "INSERT INTO cue_index (cue_index, rowid, text) VALUES ('delete', ?, ?)", old
+        )
+        conn.execute("DELETE FROM subtitle_cues WHERE video_id = ?", (video_id,))
+    conn.executemany(
+        "INSERT INTO subtitle_cues (video_id, start, end, text) VALUES (?, ?, ?, ?)",
+        [(video_id, start, end, text) for start, end, text in parse_srt(subtitles)],
+    )
+    conn.execute(
+        "INSERT INTO cue_index (rowid, text) SELECT id, text FROM subtitle_cues WHERE video_id = ?",
+        (video_id,),
+    )
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from search import CUES_SCHEMA, index_cues
+
+# --- STOCKAGE DES RÉSULTATS (remplace le fichier JSON "simulated DynamoDB") ---
+# SQLite embarqué en mode WAL : chaque upload est un UPSERT indexé (O(1) amorti)
+# au lieu de relire / réécrire tout le fichier JSON à chaque vidéo.
+
+
+class ResultStore:
+    def __init__(self, db_path, legacy_json=None):
+        self.db_path = db_path
+        # Un seul objet connexion partagé, protégé par un verrou :
+        # les routes FastAPI et le threadpool peuvent l'appeler en parallèle.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._create_schema()
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def _create_schema(self):
+        with self._lock:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                       video_id   TEXT PRIMARY KEY,
+                       data       TEXT NOT NULL,
+                       updated_at REAL NOT NULL
+                   )"""
+            )
+            # Colonnes dénormalisées pour les filtres de /api/results (et le fichier pour /api/search)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+            backfill = "ts" not in columns or "filename" not in columns
+            if "detected_language" not in columns:
+                self._conn.execute("ALTER TABLE results ADD COLUMN detected_language TEXT")
+            if "ts" not in columns:
+                self._conn.execute("ALTER TABLE results ADD COLUMN ts REAL")
+            if "filename" not in columns:
+                self._conn.execute("ALTER TABLE results ADD COLUMN filename TEXT")
+            # Index secondaires : langue, horodatage, et objets détectés (table d'association)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_results_lang ON results (detected_language)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_ts ON results (ts)")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS result_objects (
+                       object   TEXT NOT NULL,
+                       video_id TEXT NOT NULL,
+                       PRIMARY KEY (object, video_id)
+                   ) WITHOUT ROWID"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_objects_video ON result_objects (video_id)"
+            )
+            # Compteur de version, incrémenté à chaque écriture (sert d'ETag)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+            # Traces par vidéo (spans de toutes les étapes, envoyés par animal-detect)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS traces (
+                       video_id   TEXT PRIMARY KEY,
+                       trace_id   TEXT NOT NULL,
+                       spans      TEXT NOT NULL,
+                       updated_at REAL NOT NULL
+                   )"""
+            )
+            # Répliques des sous-titres + index plein texte (voir search.py)
+            for statement in CUES_SCHEMA:
+                self._conn.execute(statement)
+            # Base créée avant les index secondaires : on les remplit une fois
+            if backfill:
+                rows = self._conn.execute("SELECT video_id, data FROM results").fetchall()
+                for video_id, data in rows:
+                    self._upsert(video_id, json.loads(data))
+
+    # --- MIGRATION ONE-SHOT DEPUIS L'ANCIEN FICHIER JSON ---
+    def migrate_json(self, json_path):
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[STORE] ⚠️ Migration impossible ({json_path}) : {e}", flush=True)
+            return 0
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for video_id, data in legacy.items():
+                    self._upsert(video_id, data)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        # On renomme l'ancien fichier pour ne pas le réimporter au prochain démarrage
+        os.replace(json_path, f"{json_path}.migrated")
+        print(f"[STORE] ✅ Migration : {len(legacy)} vidéos importées depuis {json_path}", flush=True)
+        return len(legacy)
+
+    # --- ÉCRITURE ---
+    def _upsert(self, video_id, data):
+        # ON CONFLICT garde le rowid d'origine : l'ordre d'insertion reste stable
+        # (comme les clés du dict JSON d'avant, utilisé par le frontend).
+        timestamp = data.get("timestamp")
+        self._conn.execute(
+            """INSERT INTO results (video_id, data, updated_at, detected_language, ts, filename)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(video_id) DO UPDATE SET data = excluded.data,
+                                                   updated_at = excluded.updated_at,
+                                                   detected_language = excluded.detected_language,
+                                                   ts = excluded.ts,
+                                                   filename = excluded.filename""",
+            (
+                video_id,
+                json.dumps(data, ensure_ascii=False),
+                time.time(),
+                data.get("detected_language"),
+                float(timestamp) if isinstance(timestamp, (int, float)) else None,
+                data.get("filename"),
+            ),
+        )
+        self._conn.execute("DELETE FROM result_objects WHERE video_id = ?", (video_id,))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO result_objects (object, video_id) VALUES (?, ?)",
+            [(obj, video_id) for obj in data.get("detected_objects") or []],
+        )
+        index_cues(self._conn, video_id, data.get("subtitles"))
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def put(self, video_id, data):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._upsert(video_id, data)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def put_trace(self, video_id, trace_id, spans):
+        # Trace complète à chaque envoi : une nouvelle ingestion (autre trace_id) remplace l'ancienne
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO traces (video_id, trace_id, spans, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(video_id) DO UPDATE SET trace_id = excluded.trace_id,
+                                                       spans = excluded.spans,
+                                                       updated_at = excluded.updated_at""",
+                (video_id, trace_id, json.dumps(spans, ensure_ascii=False), time.time()),
+            )
+
+    # --- LECTURE ---
+    def get(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM results WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT video_id, data FROM results ORDER BY rowid").fetchall()
+        return {video_id: json.loads(data) for video_id, data in rows}
+
+    def all_json(self):
+        # Les documents sont déjà stockés sérialisés : on assemble la réponse
+        # sans repasser par json.loads / json.dumps pour chaque vidéo.
+        with self._lock:
+            rows = self._conn.execute("SELECT video_id, data FROM results ORDER BY rowid").fetchall()
+        return "{" + ",".join(f"{json.dumps(video_id)}:{data}" for video_id, data in rows) + "}"
+
+    def get_trace(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT trace_id, spans FROM traces WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def version(self):
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def query(self, language=None, obj=None, since=None, until=None,
+              cursor=None, limit=50, descending=True):
+        """Page de résultats filtrée. Le curseur est le rowid du dernier élément renvoyé."""
+        clauses, params = [], []
+        if language:
+            clauses.append("r.detected_language = ?")
+            params.append(language)
+        if obj:
+            clauses.append(
+                "r.video_id IN (SELECT video_id FROM result_objects WHERE object = ?)"
+            )
+            params.append(obj)
+        if since is not None:
+            clauses.append("r.ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("r.ts <= ?")
+            params.append(until)
+        if cursor is not None:
+            clauses.append("r.rowid < ?" if descending else "r.rowid > ?")
+            params.append(cursor)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "DESC" if descending else "ASC"
+        sql = f"SELECT r.rowid, r.data FROM results r {where} ORDER BY r.rowid {order} LIMIT ?"
+        # On lit un élément de plus pour savoir s'il existe une page suivante
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][0]
+        return [json.loads(data) for _, data in rows], next_cursor
+
+    def search(self, match, video_id=None, language=None, limit=20, offset=0):
+        """Répliques correspondant à l'expression FTS5, meilleur score BM25 en tête."""
+        # Toutes les correspondances sont classées ; les filtres s'appliquent avant
+        # le LIMIT/OFFSET, sur la table des répliques (index par vidéo)
+        filters, params = [], [match]
+        if video_id:
+            filters.append("fc.video_id = ?")
+            params.append(video_id)
+        if language:
+            filters.append(
+                "fc.video_id IN (SELECT video_id FROM results WHERE detected_language = ?)"
+            )
+            params.append(language)
+        if filters:
+            ranked = f"""SELECT m.id, m.score
+                         FROM (SELECT rowid AS id, rank AS score FROM cue_index WHERE cue_index MATCH ?) m
+                         JOIN subtitle_cues fc ON fc.id = m.id
+                         WHERE {' AND '.join(filters)}
+                         ORDER BY m.score LIMIT ? OFFSET ?"""
+        else:
+            ranked = """SELECT rowid AS id, rank AS score FROM cue_index
+                        WHERE cue_index MATCH ? ORDER BY rank LIMIT ? OFFSET ?"""
+        # Un élément de plus pour savoir s'il existe une page suivante
+        params.extend((limit + 1, offset))
+        with self._lock:
+            # Classement sur l'index seul ; répliques et fichier lus pour la page renvoyée seulement
+            rows = self._conn.execute(
+                f"""SELECT c.video_id, r.filename, c.start, c.end, c.text, h.score
+                    FROM ({ranked}) h
+                    JOIN subtitle_cues c ON c.id = h.id
+                    LEFT JOIN results r ON r.video_id = c.video_id
+                    ORDER BY h.score""",
+                params,
+            ).fetchall()
+
+        hits = [
+            {
+                "video_id": video_id,
+                "filename": filename,
+                "start": start,
+                "end": end,
+                "text": text,
+                # BM25 de FTS5 : négatif, plus petit = plus pertinent ; on l'inverse
+                "score": round(-score, 6),
+            }
+            for video_id, filename, start, end, text, score in rows[:limit]
+        ]
+        return hits, len(rows) > limit
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,96 @@
+# --- CHRONOLOGIE D'UNE VIDÉO À PARTIR DE SES SPANS ---
+# Chaque étape du pipeline enregistre un span (queued_at, started_at, finished_at,
+# octets lus/écrits). Le graphe des dépendances est fixe :
+#   downscaler -> {lang-ident, subtitler, animal-detect} -> finalize
+# Le chemin critique part de la fin du dernier span et remonte, à chaque étape,
+# vers le prédécesseur terminé le plus tard : c'est lui qui a retardé la suite.
+
+DEPENDS_ON = {
+    "downscaler": (),
+    "lang-ident": ("downscaler",),
+    "subtitler": ("downscaler",),
+    "animal-detect": ("downscaler",),
+    "finalize": ("lang-ident", "subtitler", "animal-detect"),
+}
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def _complete(span):
+    return span.get("started_at") is not None and span.get("finished_at") is not None
+
+
+def _last_by_stage(spans):
+    # Plusieurs essais d'une étape (échec puis reprise) : c'est le dernier qui compte
+    last = {}
+    for span in spans:
+        stage = span.get("stage")
+        if stage not in last or span["finished_at"] >= last[stage]["finished_at"]:
+            last[stage] = span
+    return last
+
+
+def critical_path(spans):
+    """Étapes du chemin critique, de la première à la dernière."""
+    last = _last_by_stage([s for s in spans if _complete(s)])
+    if not last:
+        return []
+    node = last.get("finalize") or max(last.values(), key=lambda s: s["finished_at"])
+    path = []
+    while node is not None:
+        preds = [last[p] for p in DEPENDS_ON.get(node["stage"], ()) if p in last]
+        pred = max(preds, key=lambda s: s["finished_at"]) if preds else None
+        queued_at = node.get("queued_at") or node["started_at"]
+        path.append({
+            "stage": node["stage"],
+            # Délai entre la sortie du prédécesseur et la mise en file (détection du fichier)
+            "handoff_s": _round(max(0.0, queued_at - pred["finished_at"])) if pred else None,
+            "queue_s": _round(node["started_at"] - queued_at),
+            "run_s": _round(node["finished_at"] - node["started_at"]),
+        })
+        node = pred
+    path.reverse()
+    return path
+
+
+def build_timeline(video_id, trace_id, spans):
+    done = sorted((s for s in spans if _complete(s)), key=lambda s: s["started_at"])
+    if not done:
+        return {"video_id": video_id, "trace_id": trace_id, "spans": [], "critical_path": []}
+
+    origin = min(s.get("queued_at") or s["started_at"] for s in done)
+    end = max(s["finished_at"] for s in done)
+    timeline = []
+    for s in done:
+        queued_at = s.get("queued_at") or s["started_at"]
+        timeline.append({
+            "stage": s.get("stage"),
+            "name": s.get("name"),
+            "host": s.get("host"),
+            "status": s.get("status"),
+            "cache": s.get("cache"),
+            # Instants relatifs au début de la trace (secondes)
+            "queued_s": _round(queued_at - origin),
+            "started_s": _round(s["started_at"] - origin),
+            "finished_s": _round(s["finished_at"] - origin),
+            "queue_s": _round(s["started_at"] - queued_at),
+            "run_s": _round(s["finished_at"] - s["started_at"]),
+            "bytes_in": s.get("bytes_in", 0),
+            "bytes_out": s.get("bytes_out", 0),
+        })
+
+    path = critical_path(done)
+    # Goulot : l'étape du chemin critique qui a coûté le plus (attente + exécution)
+    bottleneck = max(path, key=lambda p: (p["handoff_s"] or 0) + p["queue_s"] + p["run_s"]) if path else None
+    return {
+        "video_id": video_id,
+        "trace_id": trace_id,
+        "started_at": origin,
+        "finished_at": end,
+        "total_s": _round(end - origin),
+        "spans": timeline,
+        "critical_path": path,
+        "bottleneck": bottleneck["stage"] if bottleneck else None,
+    }
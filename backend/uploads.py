@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+# --- UPLOAD REPRENABLE PAR MORCEAUX ---
+# Protocole :
+#   POST  /uploads                {filename, size, sha256} -> {upload_id, offset}
+#   HEAD  /uploads/{id}           -> en-tête Upload-Offset (reprise après coupure)
+#   PATCH /uploads/{id}           en-tête Upload-Offset + corps brut = un morceau
+#   POST  /uploads/{id}/complete  -> vérification taille + SHA-256, publication atomique
+# Toutes les méthodes ici sont bloquantes : les routes les appellent via le threadpool.
+
+CHUNK_READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, status_code, detail, offset=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.offset = offset
+
+
+def safe_filename(name):
+    # On ne garde que le nom de base (pas de "../" ni de chemin Windows)
+    name = os.path.basename((name or "").replace("\\", "/")).strip()
+    if not name or name.startswith("."):
+        raise UploadError(400, f"Nom de fichier invalide : {name!r}")
+    return name
+
+
+class UploadManager:
+    def __init__(self, upload_dir, dest_dir):
+        self.upload_dir = upload_dir
+        self.dest_dir = dest_dir
+        os.makedirs(upload_dir, exist_ok=True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # Hash incrémental tant que les morceaux arrivent dans l'ordre : évite de
+        # relire tout le fichier au moment du "complete".
+        self._hashers = {}
+
+    def _lock(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _paths(self, upload_id):
+        if not upload_id.isalnum():
+            raise UploadError(404, "Upload inconnu")
+        base = os.path.join(self.upload_dir, upload_id)
+        return f"{base}.json", f"{base}.part"
+
+    def _meta(self, upload_id):
+        meta_path, _ = self._paths(upload_id)
+        try:
+            with open(meta_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError(404, "Upload inconnu")
+
+    def create(self, filename, size=None, sha256=None):
+        filename = safe_filename(filename)
+        if sha256:
+            # Identifiant déterministe : relancer "create" après un crash client
+            # retombe sur le même upload et renvoie l'offset déjà reçu.
+            upload_id = hashlib.sha256(f"{filename}:{size}:{sha256}".encode()).hexdigest()[:32]
+        else:
+            upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._paths(upload_id)
+
+        with self._lock(upload_id):
+            if not os.path.exists(meta_path):
+                meta = {"filename": filename, "size": size, "sha256": sha256, "created_at": time.time()}
+                with open(f"{meta_path}.tmp", "w") as f:
+                    json.dump(meta, f)
+                os.replace(f"{meta_path}.tmp", meta_path)
+                open(part_path, "ab").close()
+            return upload_id, os.path.getsize(part_path)
+
+    def offset(self, upload_id):
+        meta = self._meta(upload_id)
+        _, part_path = self._paths(upload_id)
+        return os.path.getsize(part_path), meta
+
+    def open_chunk(self, upload_id, offset):
+        """Vérifie l'offset et renvoie le fichier .part ouvert en écriture à cette position."""
+        meta = self._meta(upload_id)
+        _, part_path = self._paths(upload_id)
+        lock = self._lock(upload_id)
+        if not lock.acquire(blocking=False):
+            raise UploadError(409, "Un morceau est déjà en cours d'écriture pour cet upload")
+        try:
+            current = os.path.getsize(part_path)
+            if offset != current:
+                raise UploadError(409, "Offset incorrect", offset=current)
+            f = open(part_path, "r+b")
+            f.seek(offset)
+        except Exception:
+            lock.release()
+            raise
+        return ChunkWriter(self, upload_id, f, offset, meta.get("size"), lock)
+
+    def complete(self, upload_id):
+        meta = self._meta(upload_id)
+        meta_path, part_path = self._paths(upload_id)
+        with self._lock(upload_id):
+            size = os.path.getsize(part_path)
+            if meta.get("size") is not None and size != meta["size"]:
+                raise UploadError(409, f"Upload incomplet ({size}/{meta['size']} octets)", offset=size)
+
+            digest = self._digest(upload_id, part_path, size)
+            if meta.get("sha256") and digest != meta["sha256"].lower():
+                # Contenu corrompu : on repart de zéro
+                os.remove(part_path)
+                os.remove(meta_path)
+                self._hashers.pop(upload_id, None)
+                raise UploadError(422, "SHA-256 différent : upload rejeté")
+
+            # Publication atomique dans le dossier servi (même système de fichiers)
+            final_path = os.path.join(self.dest_dir, meta["filename"])
+            os.replace(part_path, final_path)
+            os.remove(meta_path)
+            self._hashers.pop(upload_id, None)
+            return meta["filename"], size, digest
+
+    def _digest(self, upload_id, part_path, size):
+        state = self._hashers.get(upload_id)
+        if state and state[0] == size:
+            return state[1].hexdigest()
+        # Redémarrage du serveur ou morceaux réécrits : on recalcule
+        h = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_READ_SIZE), b""):
+                h.update(block)
+        return h.hexdigest()
+
+
+class ChunkWriter:
+    def __init__(self, manager, upload_id, f, offset, expected_size, lock):
+        self.manager = manager
+        self.upload_id = upload_id
+        self.f = f
+        self.start = offset
+        self.offset = offset
+        self.expected_size = expected_size
+        self._lock = lock
+        self._chunk_hash = hashlib.sha256()
+        state = manager._hashers.get(upload_id)
+        if offset == 0:
+            state = (0, hashlib.sha256())
+        self._file_hash = state[1].copy() if state and state[0] == offset else None
+
+    def write(self, data):
+        if self.expected_size is not None and self.offset + len(data) > self.expected_size:
+            raise UploadError(413, "Morceau au-delà de la taille annoncée", offset=self.offset)
+        self.f.write(data)
+        self.offset += len(data)
+        self._chunk_hash.update(data)
+        if self._file_hash is not None:
+            self._file_hash.update(data)
+
+    def close(self, chunk_sha256=None):
+        """Valide le morceau. En cas d'échec, le fichier est tronqué à l'offset de départ."""
+        try:
+            ok = not chunk_sha256 or self._chunk_hash.hexdigest() == chunk_sha256.lower()
+            if not ok:
+                self.f.truncate(self.start)
+            self.f.close()
+            if not ok:
+                raise UploadError(422, "SHA-256 du morceau incorrect", offset=self.start)
+            if self._file_hash is not None:
+                self.manager._hashers[self.upload_id] = (self.offset, self._file_hash)
+            return self.offset
+        finally:
+            self._lock.release()
+
+    def abort(self):
+        # Connexion coupée : on garde ce qui a été écrit, le client reprendra via HEAD
+        try:
+            self.f.flush()
+            self.f.close()
+        finally:
+            self._lock.release()
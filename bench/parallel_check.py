@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# --- VÉRIFICATION AUTOMATIQUE : TRANSCRIPTION PARALLÈLE vs SÉRIE ---
+# Audio synthétique (phrases, pauses, passages de musique) et modèle factice qui
+# relit les mots depuis l'audio (stubs.SpeechStubWhisper) : pas de Whisper à
+# télécharger, résultat déterministe. Le vrai ParallelTranscriber découpe, transcrit
+# dans son pool de processus puis recolle ; on compare au passage en série.
+# Code de sortie 1 si le WER dépasse --max-wer (recollage cassé, langue non
+# imposée aux tronçons qui commencent par de la musique...).
+#   python bench/parallel_check.py --duration 900 --workers 2 --max-wer 0.02
+# Nécessite le paquet whisper (mel de la détection de langue), pas ses modèles.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_speech(duration, seed, sample_rate):
+    """Phrases de mots (amplitude = identifiant), pauses et passages de musique."""
+    from stubs import WORD_BASE, WORD_STEP, WORD_IDS
+    rng = np.random.default_rng(seed)
+    parts, total = [], 0
+    limit = int(duration * sample_rate)
+
+    def add(samples):
+        nonlocal total
+        parts.append(samples.astype(np.float32))
+        total += len(samples)
+
+    while total < limit:
+        if parts and rng.random() < 0.15:
+            # Musique (ou bruit) sous le seuil des mots, 5 à 20 s
+            length = int(rng.uniform(5, 20) * sample_rate)
+            add(rng.uniform(-0.05, 0.05, length))
+        for _ in range(rng.integers(3, 13)):
+            word_id = rng.integers(0, WORD_IDS)
+            add(np.full(int(rng.uniform(0.3, 0.9) * sample_rate), WORD_BASE + word_id * WORD_STEP))
+            add(np.zeros(int(rng.uniform(0.1, 0.3) * sample_rate)))
+        add(np.zeros(int(rng.uniform(0.7, 1.5) * sample_rate)))
+    return np.concatenate(parts)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=900, help="durée de l'audio synthétique (s)")
+    parser.add_argument("--chunk", type=float, default=120, help="PARALLEL_CHUNK_S")
+    parser.add_argument("--overlap", type=float, default=5, help="PARALLEL_OVERLAP_S")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-wer", type=float, default=0.02)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    # Avant l'import de parallel.py (lu à l'import, y compris dans les processus du pool)
+    os.environ["PARALLEL_CHUNK_S"] = str(args.chunk)
+    os.environ["PARALLEL_OVERLAP_S"] = str(args.overlap)
+    for path in (os.path.join(REPO_ROOT, "bench"), os.path.join(REPO_ROOT, "subtitler"), REPO_ROOT):
+        if path not in sys.path: sys.path.insert(0, path)
+    from stubs import SpeechStubWhisper, load_speech_stub
+    from parallel import ParallelTranscriber, SAMPLE_RATE
+    from srt import word_error_rate
+
+    audio = synthetic_speech(args.duration, args.seed, SAMPLE_RATE)
+    serial = SpeechStubWhisper().transcribe(audio)["segments"]
+
+    transcriber = ParallelTranscriber("stub", workers=args.workers, loader=load_speech_stub)
+    start = time.perf_counter()
+    try:
+        parallel = transcriber.transcribe(audio)
+    finally:
+        transcriber.shutdown()
+    elapsed = time.perf_counter() - start
+
+    wer = word_error_rate(" ".join(s["text"] for s in serial), " ".join(s["text"] for s in parallel))
+    result = {
+        "duration_s": args.duration,
+        "chunk_s": args.chunk,
+        "overlap_s": args.overlap,
+        "serial_segments": len(serial),
+        "parallel_segments": len(parallel),
+        "wer": round(wer, 4),
+        "max_wer": args.max_wer,
+        "parallel_s": round(elapsed, 2),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if wer > args.max_wer:
+        print(f"❌ WER série / parallèle {wer:.3f} > {args.max_wer}", flush=True)
+        sys.exit(1)
+    print(f"✅ WER série / parallèle {wer:.3f} <= {args.max_wer}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import itertools
+import subprocess
+import importlib.util
+
+# --- BANC D'ESSAI DE BOUT EN BOUT DU PIPELINE ---
+# Génère des vidéos synthétiques (ffmpeg lavfi : durée, résolution, audio variables),
+# puis les fait passer par le vrai code des 4 services (VideoHandler, LangHandler,
+# SubtitleHandler, AnimalHandler), dans un seul processus, sur une arborescence
+# temporaire câblée comme docker-compose (mêmes FileIngestor, JobQueue, jointure).
+# Modèles réels, ou factices déterministes à latence réglable (--stub, voir stubs.py).
+# Les durées par étape viennent des spans écrits par les services (common/tracing.py).
+#   python bench/pipeline.py --stub --durations 10 60 --resolutions 640x360 1920x1080 \
+#       --audio tone none --repeat 4 --output run.json
+#   python bench/pipeline.py --stub ... --baseline run.json   # code 1 si régression
+# Prérequis : dépendances des services installées (requirements.txt) et ffmpeg.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("downscaler", "lang-ident", "subtitler", "animal-detect", "finalize")
+PERCENTILES = (50, 90, 95, 99)
+# Contenu audio des vidéos synthétiques ("none" : pas de piste audio)
+AUDIO_SOURCES = {
+    "tone": "sine=frequency=440:sample_rate=44100",
+    "noise": "anoisesrc=color=pink:sample_rate=44100",
+    "silent": "anullsrc=channel_layout=stereo:sample_rate=44100",
+}
+
+
+# --- VIDÉOS SYNTHÉTIQUES ---
+def generate_video(path, duration, resolution, audio, rate=25):
+    if os.path.exists(path):
+        return path
+    cmd = ["ffmpeg", "-y", "-loglevel", "error",
+           "-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate={rate}:duration={duration}"]
+    if audio != "none":
+        cmd += ["-f", "lavfi", "-t", str(duration), "-i", AUDIO_SOURCES[audio], "-c:a", "aac", "-shortest"]
+    cmd += ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p"]
+    tmp_path = f"{path}.tmp.mp4"
+    subprocess.run(cmd + [tmp_path], check=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_corpus(args):
+    os.makedirs(args.video_cache, exist_ok=True)
+    corpus = []
+    for duration, resolution, audio in itertools.product(args.durations, args.resolutions, args.audio):
+        name = f"synth_{resolution}_{duration:g}s_{audio}.mp4"
+        print(f"🎞️  {name}", flush=True)
+        corpus.append(generate_video(os.path.join(args.video_cache, name), duration, resolution, audio))
+    return corpus
+
+
+# --- CHARGEMENT DES SERVICES ---
+def configure_env(args, state):
+    # Avant tout import de common/ : les modules lisent leur configuration à l'import
+    os.environ.update({
+        "CAS_ROOT": os.path.join(state, "cas"),
+        "LEDGER_ROOT": os.path.join(state, "ledger"),
+        "CLAIMS_ROOT": os.path.join(state, "claims"),
+        "TRACES_ROOT": os.path.join(state, "traces"),
+        "OUTBOX_ROOT": os.path.join(state, "outbox"),
+        "CLAIMS_ENABLED": "0",
+        # Corpus répété à l'identique : sans ça, tout sauf le 1er passage serait un hit
+        "CAS_ENABLED": "1" if args.cache else "0",
+        # Un échec est définitif : le banc ne reste pas bloqué sur un backoff
+        "LEDGER_MAX_ATTEMPTS": "1",
+        "WORKERS": str(args.workers),
+    })
+    for path in (REPO_ROOT, *(os.path.join(REPO_ROOT, d) for d in ("downscaler", "lang-ident", "subtitler", "animal-detect"))):
+        if path not in sys.path: sys.path.insert(0, path)
+
+
+def load_service(folder, name):
+    # Tous les services s'appellent main.py : chargement par chemin, sous un nom distinct
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_ROOT, folder, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_pipeline(args, tree):
+    from common.ingest import FileIngestor
+    from stubs import StubWhisper, StubYolo
+
+    down = load_service("downscaler", "vidp_downscaler")
+    lang = load_service("lang-ident", "vidp_lang")
+    subs = load_service("subtitler", "vidp_subs")
+    animal = load_service("animal-detect", "vidp_animal")
+
+    # Même câblage des dossiers que docker-compose.yml
+    down.INPUT_FOLDER, down.OUTPUT_FOLDER = tree["input"], tree["working"]
+    down.LOCAL_STAGING_FOLDER = tree["staging"]
+    lang.INPUT_FOLDER, lang.OUTPUT_FOLDER = tree["working"], tree["metadata"]
+    subs.INPUT_FOLDER, subs.OUTPUT_FOLDER = tree["working"], tree["metadata"]
+    subs.SUBS_MODE = args.subs_mode
+    animal.INPUT_FOLDER, animal.META_FOLDER, animal.FINAL_FOLDER = tree["working"], tree["metadata"], tree["final"]
+    animal.JOIN_STATE_FILE = os.path.join(tree["final"], ".join_state.json")
+    animal.BACKEND_URL = args.backend_url
+    animal.TRACE_URL = args.backend_url.replace("/upload_result", "/api/trace")
+
+    if args.stub:
+        whisper_stub = lambda name: StubWhisper(args.stub_whisper_rtf, args.stub_lang_s)
+        lang.load_whisper = subs.load_whisper = whisper_stub
+        animal.make_backend = lambda model_path: StubYolo(args.stub_yolo_ms / 1000)
+
+    handlers = {
+        "downscaler": down.VideoHandler(),
+        "lang-ident": lang.LangHandler(),
+        "subtitler": subs.SubtitleHandler(),
+        "animal-detect": animal.AnimalHandler(),
+    }
+    handlers["lang-ident"].batcher.start()
+    for handler in handlers.values():
+        handler.jobs.start()
+    handlers["animal-detect"].finalize_jobs.start()
+    handlers["animal-detect"].outbox.start()
+
+    ingestors = [
+        FileIngestor(tree["input"], handlers["downscaler"].on_file_ready, accept=handlers["downscaler"].accepts),
+        FileIngestor(tree["working"], handlers["lang-ident"].on_file_ready, accept=handlers["lang-ident"].accepts),
+        FileIngestor(tree["working"], handlers["subtitler"].on_file_ready, accept=handlers["subtitler"].accepts),
+        FileIngestor(tree["working"], handlers["animal-detect"].on_file_ready, accept=handlers["animal-detect"].accepts),
+        FileIngestor(tree["metadata"], handlers["animal-detect"].on_metadata_ready,
+                     accept=handlers["animal-detect"].accepts_metadata),
+    ]
+    for ingestor in ingestors:
+        ingestor.start()
+    return handlers, ingestors
+
+
+def stop_pipeline(handlers, ingestors):
+    for ingestor in ingestors:
+        ingestor.stop()
+    for ingestor in ingestors:
+        ingestor.join()
+    for handler in handlers.values():
+        handler.jobs.shutdown(drain=False)
+    handlers["animal-detect"].finalize_jobs.shutdown(drain=False)
+    handlers["lang-ident"].batcher.shutdown()
+    handlers["animal-detect"].outbox.stop()
+
+
+# --- MESURES ---
+def read_spans(traces_root):
+    # Dernier span de chaque (vidéo, étape) : un essai raté puis repris compte une fois
+    spans = {}
+    for name in os.listdir(traces_root) if os.path.isdir(traces_root) else []:
+        with open(os.path.join(traces_root, name), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                key = (span["video_id"], span["stage"])
+                if key not in spans or span["finished_at"] >= spans[key]["finished_at"]:
+                    spans[key] = span
+    return spans
+
+
+def settled(spans, video_ids):
+    """Vidéos terminées : finalisées, ou en échec à une étape (LEDGER_MAX_ATTEMPTS=1)."""
+    done = set()
+    for (video_id, stage), span in spans.items():
+        if video_id in video_ids and (stage == "finalize" or span["status"] != "ok"):
+            done.add(video_id)
+    return done
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    out = {}
+    for p in PERCENTILES:
+        # Interpolation linéaire entre rangs
+        rank = (len(values) - 1) * p / 100
+        low = int(rank)
+        high = min(low + 1, len(values) - 1)
+        out[f"p{p}"] = round(values[low] + (values[high] - values[low]) * (rank - low), 3)
+    out["mean"] = round(sum(values) / len(values), 3)
+    out["max"] = round(values[-1], 3)
+    return out
+
+
+def summarize(spans, dropped_at):
+    stages = {}
+    for stage in STAGES:
+        mine = [s for (_, st), s in spans.items() if st == stage and s["video_id"] in dropped_at]
+        stages[stage] = {
+            "count": len(mine),
+            "errors": sum(1 for s in mine if s["status"] != "ok"),
+            "run_s": percentiles([s["finished_at"] - s["started_at"] for s in mine]),
+            "queue_s": percentiles([s["started_at"] - s["queued_at"] for s in mine]),
+            "bytes_in": sum(s.get("bytes_in", 0) for s in mine),
+            "bytes_out": sum(s.get("bytes_out", 0) for s in mine),
+        }
+    finished = {
+        video_id: spans[(video_id, "finalize")]["finished_at"]
+        for video_id in dropped_at
+        if (video_id, "finalize") in spans and spans[(video_id, "finalize")]["status"] == "ok"
+    }
+    # Débit sur la fenêtre réelle : du premier dépôt à la dernière finalisation
+    window = (max(finished.values()) - min(dropped_at.values())) if finished else 0
+    return {
+        "completed": len(finished),
+        "failed": len(dropped_at) - len(finished),
+        "window_s": round(window, 3),
+        "videos_per_hour": round(len(finished) / window * 3600, 2) if window > 0 else None,
+        "end_to_end_s": percentiles([finished[v] - dropped_at[v] for v in finished]),
+        "stages": stages,
+    }
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- COMPARAISON AVEC UN RUN DE RÉFÉRENCE ---
+def compare(result, baseline, tolerance):
+    """Liste des régressions au-delà de tolerance (débit, p95 par étape, p95 de bout en bout)."""
+    regressions = []
+    old, new = baseline.get("videos_per_hour"), result.get("videos_per_hour")
+    if old and new is not None and new < old * (1 - tolerance):
+        regressions.append(f"videos/heure : {old} -> {new}")
+    pairs = [("bout en bout", baseline.get("end_to_end_s"), result.get("end_to_end_s"))]
+    pairs += [(stage, baseline["stages"].get(stage, {}).get("run_s"), result["stages"][stage]["run_s"])
+              for stage in STAGES if stage in baseline.get("stages", {})]
+    for label, old_stats, new_stats in pairs:
+        if old_stats and new_stats and new_stats["p95"] > old_stats["p95"] * (1 + tolerance):
+            regressions.append(f"{label} p95 : {old_stats['p95']}s -> {new_stats['p95']}s")
+    return regressions
+
+
+def print_report(result):
+    print("\n" + "-" * 72, flush=True)
+    print(f"{'étape':<14} {'n':>4} {'err':>4} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'file p50':>9}")
+    for stage, s in result["stages"].items():
+        run, wait = s["run_s"] or {}, s["queue_s"] or {}
+        print(f"{stage:<14} {s['count']:>4} {s['errors']:>4} {run.get('p50', '-'):>8} "
+              f"{run.get('p95', '-'):>8} {run.get('p99', '-'):>8} {wait.get('p50', '-'):>9}")
+    e2e = result["end_to_end_s"] or {}
+    print(f"\nTerminées : {result['completed']}/{result['videos']}  |  bout en bout p50 {e2e.get('p50', '-')}s "
+          f"p95 {e2e.get('p95', '-')}s  |  {result['videos_per_hour']} vidéos/heure")
+    print(f"Pic RSS : {result['peak_rss_mb']} Mo (services) / {result['peak_child_rss_mb']} Mo (plus gros processus fils : ffmpeg)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--durations", nargs="+", type=float, default=[10, 60])
+    parser.add_argument("--resolutions", nargs="+", default=["640x360", "1920x1080"])
+    parser.add_argument("--audio", nargs="+", choices=[*AUDIO_SOURCES, "none"], default=["tone", "none"])
+    parser.add_argument("--repeat", type=int, default=1, help="copies de chaque vidéo du corpus")
+    parser.add_argument("--interval", type=float, default=0.0, help="secondes entre deux dépôts (0 : rafale)")
+    parser.add_argument("--workers", type=int, default=1, help="workers par étape (WORKERS)")
+    parser.add_argument("--subs-mode", choices=["full", "streaming", "parallel"], default="full")
+    parser.add_argument("--cache", action="store_true", help="active le cache partagé (CAS)")
+    parser.add_argument("--stub", action="store_true", help="modèles factices (stubs.py) au lieu de Whisper/YOLO")
+    parser.add_argument("--stub-whisper-rtf", type=float, default=0.05)
+    parser.add_argument("--stub-lang-s", type=float, default=0.1)
+    parser.add_argument("--stub-yolo-ms", type=float, default=10.0)
+    parser.add_argument("--backend-url", default="http://127.0.0.1:9/upload_result",
+                        help="backend réel (uvicorn) ; livré par l'outbox, hors des durées mesurées")
+    parser.add_argument("--timeout", type=float, default=3600)
+    parser.add_argument("--workdir", help="arborescence de travail (défaut : dossier temporaire supprimé)")
+    parser.add_argument("--video-cache", default=os.path.join(tempfile.gettempdir(), "vidp_bench_videos"))
+    parser.add_argument("--output")
+    parser.add_argument("--baseline", help="résultat JSON d'un run précédent à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+    if args.stub and args.subs_mode == "parallel":
+        # Le pool de processus charge ses propres modèles : les stubs ne l'atteignent pas
+        parser.error("--subs-mode parallel n'est pas compatible avec --stub")
+
+    corpus = build_corpus(args)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="vidp_bench_")
+    tree = {name: os.path.join(workdir, folder) for name, folder in (
+        ("input", "00_input"), ("working", "01_working"), ("metadata", "02_metadata"),
+        ("final", "03_output"), ("state", "04_state"), ("staging", "staging"))}
+    for path in tree.values():
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+    configure_env(args, tree["state"])
+    handlers, ingestors = start_pipeline(args, tree)
+
+    # Dépôt comme un client : copie sous un nom caché, puis rename atomique
+    dropped_at = {}
+    for i, (copy, source) in enumerate(itertools.product(range(args.repeat), corpus)):
+        base_name = f"bench{i:04d}_{os.path.splitext(os.path.basename(source))[0]}"
+        tmp_path = os.path.join(tree["input"], f".{base_name}.mp4")
+        shutil.copyfile(source, tmp_path)
+        dropped_at[base_name] = time.time()
+        os.rename(tmp_path, os.path.join(tree["input"], f"{base_name}.mp4"))
+        if args.interval: time.sleep(args.interval)
+
+    deadline = time.time() + args.timeout
+    traces_root = os.path.join(tree["state"], "traces")
+    while time.time() < deadline:
+        if len(settled(read_spans(traces_root), dropped_at)) == len(dropped_at):
+            break
+        time.sleep(0.5)
+    else:
+        print(f"⚠️ Délai dépassé ({args.timeout:.0f}s) : résultats partiels", flush=True)
+    stop_pipeline(handlers, ingestors)
+
+    result = {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "workdir", "video_cache")},
+        "videos": len(dropped_at),
+        **summarize(read_spans(traces_root), dropped_at),
+        # Linux : ru_maxrss est en kilo-octets ; RUSAGE_CHILDREN = le plus gros processus fils
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"❌ Régression : {line}", flush=True)
+        if regressions:
+            sys.exit(1)
+        print(f"✅ Pas de régression au-delà de {args.tolerance:.0%}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import time
+import numpy as np
+
+# --- MODÈLES FACTICES DÉTERMINISTES ---
+# Remplacent Whisper et YOLO dans le banc d'essai : mêmes méthodes que celles
+# appelées par les services, latence réglable, résultats fonction de l'entrée
+# seulement (deux runs identiques donnent les mêmes sorties).
+# Seule l'inférence est remplacée : décodage audio, mel, FFmpeg et échantillonnage
+# des images restent le vrai code.
+
+SAMPLE_RATE = 16000
+SEGMENT_S = 5.0
+# Quelques classes COCO (indices Ultralytics) pour les détections factices
+ANIMAL_CLASSES = {14: "bird", 15: "cat", 16: "dog", 17: "horse"}
+
+
+class _Dims:
+    n_mels = 80
+
+
+class StubWhisper:
+    """transcribe : rtf secondes de calcul par seconde d'audio.
+    detect_language : lang_s secondes par fichier du lot."""
+
+    device = "cpu"
+    dims = _Dims()
+
+    def __init__(self, rtf=0.05, lang_s=0.1, language="en"):
+        self.rtf = rtf
+        self.lang_s = lang_s
+        self.language = language
+
+    def detect_language(self, mel):
+        batched = mel.ndim == 3
+        count = mel.shape[0] if batched else 1
+        time.sleep(self.lang_s * count)
+        probs = {self.language: 1.0}
+        return None, [dict(probs) for _ in range(count)] if batched else probs
+
+    def transcribe(self, audio, language=None, **kwargs):
+        duration = len(audio) / SAMPLE_RATE
+        time.sleep(duration * self.rtf)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + SEGMENT_S)
+            segments.append({"start": start, "end": end, "text": f" Segment {len(segments) + 1}"})
+            start = end
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": language or self.language,
+        }
+
+
+class StubYolo:
+    """frame_s secondes par image ; la classe « détectée » dépend de la luminosité moyenne."""
+
+    name = "stub"
+    names = ANIMAL_CLASSES
+
+    def __init__(self, frame_s=0.01):
+        self.frame_s = frame_s
+
+    def classes(self, frames):
+        frames = list(frames)
+        time.sleep(self.frame_s * len(frames))
+        ids = sorted(ANIMAL_CLASSES)
+        return [{ids[int(frame[::16, ::16].mean()) % len(ids)]} for frame in frames]
+
+
+# --- PAROLE SYNTHÉTIQUE (vérification série / parallèle du subtitler) ---
+# Chaque « mot » est un bloc d'amplitude constante WORD_BASE + id x WORD_STEP ; la
+# musique reste sous WORD_MIN. Le modèle factice relit les mots depuis l'audio : sa
+# sortie ne dépend que du contenu, pas de l'endroit où un tronçon commence. Sans
+# langue imposée, il se trompe de langue quand le début de l'audio n'est pas de la
+# parole (comme Whisper sur de la musique) et préfixe alors ses mots autrement.
+
+WORD_BASE = 0.2
+WORD_STEP = 0.01
+WORD_MIN = 0.15
+WORD_IDS = 50
+STUB_FRAME_S = 0.01
+SEGMENT_PAUSE_S = 0.6
+SEGMENT_MAX_WORDS = 8
+
+
+class SpeechStubWhisper:
+    device = "cpu"
+    dims = _Dims()
+
+    def __init__(self, language="en", wrong_language="fr"):
+        self.language = language
+        self.wrong_language = wrong_language
+
+    def detect_language(self, mel):
+        return None, {self.language: 1.0}
+
+    def _words(self, audio):
+        frame = int(SAMPLE_RATE * STUB_FRAME_S)
+        n = len(audio) // frame
+        level = np.abs(np.asarray(audio[:n * frame], dtype=np.float32)).reshape(n, frame).mean(axis=1)
+        ids = np.where(level >= WORD_MIN, np.rint((level - WORD_BASE) / WORD_STEP), -1).astype(int)
+        words, start = [], None
+        for i in range(n + 1):
+            current = ids[i] if i < n else -1
+            if start is not None and current != ids[start]:
+                words.append((start * STUB_FRAME_S, i * STUB_FRAME_S, int(ids[start])))
+                start = None
+            if start is None and current >= 0:
+                start = i
+        return words
+
+    def transcribe(self, audio, language=None, **kwargs):
+        words = self._words(audio)
+        if language is None:
+            # Détection naïve sur la première seconde
+            speaking = any(start < 1.0 for start, _, _ in words)
+            language = self.language if speaking else self.wrong_language
+        segments = []
+        for start, end, word_id in words:
+            text = f" {language}{word_id}"
+            last = segments[-1] if segments else None
+            if last and start - last["end"] <= SEGMENT_PAUSE_S and last["words"] < SEGMENT_MAX_WORDS:
+                last.update(end=end, text=last["text"] + text, words=last["words"] + 1)
+            else:
+                segments.append({"start": start, "end": end, "text": text, "words": 1})
+        for seg in segments:
+            del seg["words"]
+        return {"text": "".join(seg["text"] for seg in segments), "segments": segments, "language": language}
+
+
+def load_speech_stub(model_name):
+    # Chargeur du pool de ParallelTranscriber (fonction de module : picklable)
+    return SpeechStubWhisper()
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import time
+import struct
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# --- TEMPS JUSQU'À LA PREMIÈRE IMAGE (lecture web) ---
+# Pour chaque URL (ou fichier local) : temps mis par ffmpeg pour décoder la première
+# image, et octets qu'un lecteur doit lire avant de pouvoir démarrer :
+#  - MP4 : position de l'atome moov (en tête = faststart ; en fin = tout le fichier
+#    à télécharger sans Range, un aller-retour de plus avec Range) ;
+#  - HLS : playlist + segment d'init + premier segment.
+# Avant / après sur une même source :
+#   python bench/ttff.py --prepare source.mp4 backend/static
+#   python bench/ttff.py http://host:8000/media/source_plain.mp4 \
+#       http://host:8000/media/source_faststart.mp4 http://host:8000/media/source_hls.m3u8 --runs 5
+
+HLS_SEGMENT_S = 4
+
+
+def read_range(target, start, length):
+    if re.match(r"https?://", target):
+        request = urllib.request.Request(target, headers={"Range": f"bytes={start}-{start + length - 1}"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.read(length)
+        except urllib.error.HTTPError as e:
+            if e.code == 416:
+                return b""  # au-delà de la fin du fichier
+            raise
+    with open(target, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+def resolve(base, uri):
+    if re.match(r"https?://", uri) or os.path.isabs(uri):
+        return uri
+    if re.match(r"https?://", base):
+        return urllib.parse.urljoin(base, uri)
+    return os.path.join(os.path.dirname(base), uri)
+
+
+def mp4_layout(target):
+    """Atomes de premier niveau : {type: (offset, taille)}."""
+    boxes, offset = {}, 0
+    while True:
+        header = read_range(target, offset, 16)
+        if len(header) < 8:
+            break
+        size, kind = struct.unpack(">I4s", header[:8])
+        if size == 1:
+            size = struct.unpack(">Q", header[8:16])[0]
+        kind = kind.decode("latin-1")
+        boxes.setdefault(kind, (offset, size))
+        if size == 0:
+            break  # l'atome court jusqu'à la fin du fichier
+        offset += size
+    return boxes, offset
+
+
+def mp4_startup(target):
+    boxes, total = mp4_layout(target)
+    moov = boxes.get("moov")
+    mdat = boxes.get("mdat")
+    faststart = bool(moov and mdat and moov[0] < mdat[0])
+    return {
+        "faststart": faststart,
+        "moov_offset": moov[0] if moov else None,
+        # Sans faststart, un lecteur sans Range lit tout ; avec Range, il saute à la fin
+        "bytes_before_start": (moov[0] + moov[1]) if faststart else total,
+        "size": total,
+    }
+
+
+def hls_startup(target):
+    playlist = read_range(target, 0, 1024 * 1024).decode("utf-8")
+    needed = len(playlist.encode("utf-8"))
+    # EXT-X-MAP (init) puis premier segment, éventuellement en byte-range "longueur@offset"
+    init = re.search(r'#EXT-X-MAP:URI="([^"]+)"(?:,BYTERANGE="(\d+)@(\d+)")?', playlist)
+    if init:
+        needed += int(init.group(2)) if init.group(2) else len(read_range(resolve(target, init.group(1)), 0, 64 * 1024 * 1024))
+    lines = playlist.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("#EXTINF"):
+            byterange = lines[i + 1] if lines[i + 1].startswith("#EXT-X-BYTERANGE") else None
+            if byterange:
+                needed += int(byterange.split(":")[1].split("@")[0])
+            else:
+                uri = next(l for l in lines[i + 1:] if l and not l.startswith("#"))
+                needed += len(read_range(resolve(target, uri), 0, 64 * 1024 * 1024))
+            break
+    return {"segments": playlist.count("#EXTINF"), "bytes_before_start": needed}
+
+
+def first_frame_s(target):
+    start = time.perf_counter()
+    subprocess.run(["ffmpeg", "-v", "error", "-i", target, "-map", "0:v:0", "-frames:v", "1", "-f", "null", "-"],
+                   check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def measure(target, runs):
+    kind = "hls" if target.split("?")[0].endswith(".m3u8") else "mp4"
+    timings = [first_frame_s(target) for _ in range(runs)]
+    result = {
+        "target": target,
+        "kind": kind,
+        "ttff_first_s": round(timings[0], 3),
+        "ttff_median_s": round(statistics.median(timings), 3),
+    }
+    result.update(hls_startup(target) if kind == "hls" else mp4_startup(target))
+    return result
+
+
+def prepare(source, dest_dir, segment_s=HLS_SEGMENT_S):
+    """Même encodage en trois variantes : MP4 simple, MP4 faststart, HLS fMP4."""
+    base = os.path.splitext(os.path.basename(source))[0]
+    out = {kind: os.path.join(dest_dir, f"{base}_{kind}") for kind in ("plain", "faststart", "hls")}
+    encode = ["-vf", "scale=-2:480", "-force_key_frames", f"expr:gte(t,n_forced*{segment_s})"]
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", source, *encode, f"{out['plain']}.mp4"], check=True)
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", f"{out['plain']}.mp4", "-c", "copy",
+                    "-movflags", "+faststart", f"{out['faststart']}.mp4"], check=True)
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", f"{out['plain']}.mp4", "-c", "copy", "-f", "hls",
+                    "-hls_time", str(segment_s), "-hls_playlist_type", "vod", "-hls_segment_type", "fmp4",
+                    "-hls_flags", "single_file", "-hls_segment_filename", f"{out['hls']}.m4s",
+                    f"{out['hls']}.m3u8"], check=True)
+    return [f"{out['plain']}.mp4", f"{out['faststart']}.mp4", f"{out['hls']}.m3u8"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("targets", nargs="*", help="URLs /media/... ou fichiers locaux")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--prepare", nargs=2, metavar=("SOURCE", "DEST_DIR"),
+                        help="génère les variantes simple / faststart / HLS d'une source")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.prepare:
+        for path in prepare(*args.prepare):
+            print(path)
+        return
+    if not args.targets:
+        parser.error("au moins une URL ou un fichier")
+
+    results = [measure(target, args.runs) for target in args.targets]
+    print(f"{'cible':<48} {'1er s':>7} {'médiane s':>10} {'octets avant lecture':>21}")
+    for r in results:
+        print(f"{r['target'][-48:]:<48} {r['ttff_first_s']:>7} {r['ttff_median_s']:>10} {r['bytes_before_start']:>21}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
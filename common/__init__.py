@@ -0,0 +1,2 @@
+# Modules partagés par les services de la pipeline VidP.
+# Monté dans chaque conteneur sous /app/common (voir docker-compose.yml).
@@ -0,0 +1,117 @@
+import os
+import json
+import numpy as np
+
+# --- ARTEFACTS D'INGESTION (produits en une seule passe par le downscaler) ---
+# A côté de chaque "<base>_downscaled.mp4", le downscaler publie :
+#   <base>_audio.f32    : audio PCM float32 mono 16 kHz (format attendu par Whisper)
+#   <base>_frames.mjpeg : images échantillonnées, flux MJPEG (JPEG concaténés), format d'origine
+#                         réduit à FRAME_SIZE px sur le plus grand côté (le letterbox reste à YOLO)
+#   <base>_ingest.json  : manifeste (dimensions, fps d'échantillonnage, nombre d'images...)
+# L'audio est ouvert en memmap, les images décodées une à une : aucun nouveau décodage
+# de la vidéo. Les images brutes pèseraient ~22 Go/h (640x640 BGR à 5 img/s) ; en JPEG,
+# quelques centaines de Mo/h. animal-detect supprime les trois fichiers une fois la
+# vidéo finalisée (remove_artifacts) : ils ne servent qu'au premier passage.
+# Avec PLAYBACK_HLS=1, il publie aussi la version HLS de la vidéo (lecture web) :
+#   <base>_hls.m3u8 + <base>_hls.m4s (MP4 fragmenté unique, segments en byte-ranges)
+
+AUDIO_SAMPLE_RATE = 16000
+FRAME_SIZE = 640
+
+AUDIO_SUFFIX = "_audio.f32"
+FRAMES_SUFFIX = "_frames.mjpeg"
+FRAMES_FORMAT = "mjpeg"
+MANIFEST_SUFFIX = "_ingest.json"
+HLS_PLAYLIST_SUFFIX = "_hls.m3u8"
+HLS_MEDIA_SUFFIX = "_hls.m4s"
+
+
+def base_name_of(filename):
+    return filename.replace("_downscaled.mp4", "")
+
+
+def artifact_paths(folder, base_name):
+    return {
+        "audio": os.path.join(folder, f"{base_name}{AUDIO_SUFFIX}"),
+        "frames": os.path.join(folder, f"{base_name}{FRAMES_SUFFIX}"),
+        "manifest": os.path.join(folder, f"{base_name}{MANIFEST_SUFFIX}"),
+    }
+
+
+def hls_paths(folder, base_name):
+    return {
+        "media": os.path.join(folder, f"{base_name}{HLS_MEDIA_SUFFIX}"),
+        "playlist": os.path.join(folder, f"{base_name}{HLS_PLAYLIST_SUFFIX}"),
+    }
+
+
+def write_json_atomic(path, data):
+    tmp_path = os.path.join(os.path.dirname(path), f".tmp_{os.path.basename(path)}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(folder, base_name):
+    path = artifact_paths(folder, base_name)["manifest"]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_audio(folder, base_name):
+    """Audio 16 kHz float32 en memmap (copy-on-write : torch.from_numpy l'accepte sans copie).
+    Renvoie None si l'artefact n'existe pas (le service décode alors lui-même)."""
+    manifest = load_manifest(folder, base_name)
+    if not manifest or not manifest.get("audio"):
+        return None
+    path = os.path.join(folder, manifest["audio"])
+    if not os.path.exists(path):
+        return None
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="c")
+
+
+def iter_jpeg(path, block_size=1024 * 1024):
+    """Découpe un flux MJPEG en images JPEG (octets), sans tout charger en mémoire.
+    Dans les données compressées, 0xFF est toujours suivi de 0x00 ou d'un marqueur
+    RST : la fin d'image (FF D9) ne peut apparaître qu'en fin de JPEG."""
+    buffer = b""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            buffer += block
+            start = 0
+            while True:
+                end = buffer.find(b"\xff\xd9", start)
+                if end < 0:
+                    break
+                yield buffer[start:end + 2]
+                start = end + 2
+            buffer = buffer[start:]
+
+
+def load_frames(folder, base_name):
+    """(images JPEG, fps d'échantillonnage, taille du fichier), ou None.
+    Les manifestes d'avant le format MJPEG renvoient None (décodage de la vidéo)."""
+    manifest = load_manifest(folder, base_name)
+    if not manifest or not manifest.get("frames") or manifest.get("frame_format") != FRAMES_FORMAT:
+        return None
+    path = os.path.join(folder, manifest["frames"])
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    return iter_jpeg(path), manifest["frame_fps"], os.path.getsize(path)
+
+
+def remove_artifacts(folder, base_name):
+    """Supprime les artefacts d'ingestion d'une vidéo (fin du pipeline)."""
+    removed = 0
+    for path in artifact_paths(folder, base_name).values():
+        try:
+            removed += os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import queue
+import hashlib
+import threading
+from common.metrics import CACHE_LOOKUPS
+
+# --- CACHE ADRESSÉ PAR CONTENU, PARTAGÉ ENTRE LES ÉTAPES ---
+# Clé d'une entrée = hash SHA-256 de la vidéo SOURCE + étape + version de l'étape
+# (modèle, paramètres). Une vidéo re-déposée, même sous un autre nom, retrouve
+# donc les sorties déjà calculées : l'étape les republie sous le nouveau nom.
+#   <CAS_ROOT>/<hash[:2]>/<hash>-<étape>-<version>/   fichiers de l'entrée (+ value.json)
+# Le hash source est calculé une fois par le downscaler et noté dans le manifeste.
+# Éviction LRU (mtime de l'entrée, rafraîchi à chaque hit) au-delà de CAS_MAX_BYTES.
+# La taille d'une entrée est notée à l'écriture (fichier "size") ; l'arborescence
+# n'est reparcourue que si l'estimation dépasse CAS_MAX_BYTES ou toutes les
+# CAS_EVICT_RESCAN_S (écritures des autres réplicas). Une entrée plus grosse que
+# CAS_MAX_BYTES n'est pas stockée ; celle qu'on vient d'écrire n'est jamais évincée.
+# store_later() fait la copie dans un thread dédié : les gros fichiers (vidéo,
+# audio) ne retardent pas la publication. Les fichiers sont d'abord épinglés par lien
+# physique (immédiat, même volume) dans <dossier>/.cas_pending/ : une étape suivante
+# peut supprimer l'original avant la copie. Une copie perdue à l'arrêt = un miss plus tard.
+# Compteurs hit/miss : <CAS_ROOT>/stats/<étape>-<hôte>.json
+
+CAS_ROOT = os.getenv("CAS_ROOT", "/mnt/data/state/cas")
+CAS_ENABLED = os.getenv("CAS_ENABLED", "1") == "1"
+CAS_MAX_BYTES = int(os.getenv("CAS_MAX_BYTES", str(20 * 1024 ** 3)))
+CAS_EVICT_RESCAN_S = float(os.getenv("CAS_EVICT_RESCAN_S", "300"))
+# Écritures différées en attente (store_later) ; au-delà, l'écriture est abandonnée
+CAS_STORE_QUEUE_MAX = int(os.getenv("CAS_STORE_QUEUE_MAX", "16"))
+
+VALUE_FILE = "value.json"
+PIN_FOLDER = ".cas_pending"
+# Épingles laissées par un arrêt en pleine copie, supprimées au démarrage du thread d'écriture
+PIN_MAX_AGE_S = 3600
+SIZE_FILE = "size"
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_hash_of(manifest, fallback_path):
+    """Hash de la source noté par le downscaler ; à défaut, hash du fichier reçu."""
+    if manifest and manifest.get("source_sha256"):
+        return manifest["source_sha256"]
+    return file_sha256(fallback_path)
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _entry_size(path):
+    try:
+        with open(os.path.join(path, SIZE_FILE), "r") as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        # Entrée écrite avant le fichier "size"
+        return _dir_size(path)
+
+
+def _link_or_copy(src, dest):
+    # Lien physique si le cache et la destination sont sur le même volume, sinon copie
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class ContentCache:
+    def __init__(self, stage, version, root=CAS_ROOT, max_bytes=CAS_MAX_BYTES, enabled=CAS_ENABLED):
+        self.stage = stage
+        self.version = str(version)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Estimation de l'occupation depuis le dernier parcours complet (None = inconnue)
+        self._approx_bytes = None
+        self._scanned_at = 0.0
+        self._pending = queue.Queue(maxsize=CAS_STORE_QUEUE_MAX)
+        self._writer = None
+        if self.enabled:
+            try:
+                os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+                os.makedirs(os.path.join(self.root, "stats"), exist_ok=True)
+            except OSError as e:
+                print(f"[CACHE] ⚠️ {self.root} inutilisable ({e}), cache désactivé", flush=True)
+                self.enabled = False
+
+    def _entry_dir(self, source_hash):
+        key = f"{source_hash}-{self.stage}-{self.version}"
+        return os.path.join(self.root, source_hash[:2], key)
+
+    def lookup(self, source_hash):
+        """Chemin de l'entrée (et la marque comme récemment utilisée), ou None."""
+        if not self.enabled or not source_hash:
+            return None
+        entry = self._entry_dir(source_hash)
+        found = os.path.isdir(entry)
+        if found:
+            try:
+                os.utime(entry)
+            except OSError:
+                found = False  # évincée entre-temps
+        with self._lock:
+            if found: self.hits += 1
+            else: self.misses += 1
+        CACHE_LOOKUPS.labels(self.stage, "hit" if found else "miss").inc()
+        self._save_stats()
+        if found:
+            print(f"[CACHE] ♻️ {self.stage} : hit {source_hash[:12]}", flush=True)
+        return entry if found else None
+
+    def has(self, entry, name):
+        return os.path.exists(os.path.join(entry, name))
+
+    def publish(self, entry, name, dest_path):
+        """Republie un fichier de l'entrée sous dest_path, atomiquement (.tmp_ puis rename)."""
+        tmp_path = os.path.join(os.path.dirname(dest_path), f".tmp_{os.path.basename(dest_path)}")
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        _link_or_copy(os.path.join(entry, name), tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def read_value(self, entry):
+        with open(os.path.join(entry, VALUE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def store(self, source_hash, files=None, value=None):
+        """Enregistre les sorties d'une étape. files : {nom dans l'entrée: chemin},
+        value : petit résultat JSON. Une entrée déjà présente n'est pas réécrite."""
+        if not self.enabled or not source_hash:
+            return
+        entry = self._entry_dir(source_hash)
+        if os.path.isdir(entry):
+            return
+        try:
+            size = sum(os.path.getsize(path) for path in (files or {}).values())
+        except OSError as e:
+            print(f"[CACHE] ⚠️ Écriture impossible ({e})", flush=True)
+            return
+        if size > self.max_bytes:
+            # Elle évincerait tout le cache, puis serait évincée à son tour
+            print(f"[CACHE] {self.stage} : entrée de {size / 1024 ** 3:.1f} Go > CAS_MAX_BYTES, non stockée", flush=True)
+            return
+        tmp_dir = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        try:
+            os.makedirs(tmp_dir)
+            for name, path in (files or {}).items():
+                _link_or_copy(path, os.path.join(tmp_dir, name))
+            if value is not None:
+                with open(os.path.join(tmp_dir, VALUE_FILE), "w", encoding="utf-8") as f:
+                    json.dump(value, f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, SIZE_FILE), "w") as f:
+                f.write(str(size))
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            # Rename atomique : une entrée est visible complète ou pas du tout
+            os.rename(tmp_dir, entry)
+        except OSError as e:
+            # Entrée publiée en parallèle par un autre worker, ou volume plein
+            if not os.path.isdir(entry):
+                print(f"[CACHE] ⚠️ Écriture impossible ({e})", flush=True)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        with self._lock:
+            self.stores += 1
+            if self._approx_bytes is not None:
+                self._approx_bytes += size
+            rescan = (self._approx_bytes is None or self._approx_bytes > self.max_bytes
+                      or time.time() - self._scanned_at > CAS_EVICT_RESCAN_S)
+        if rescan:
+            self.evict(keep=entry)
+        self._save_stats()
+
+    def store_later(self, source_hash, files=None, value=None):
+        """Comme store(), dans le thread d'écriture. Les fichiers sont épinglés tout de
+        suite (lien physique) : ils peuvent être supprimés avant la copie."""
+        if not self.enabled or not source_hash or self._has_entry(source_hash):
+            return
+        files = files or {}
+        with self._lock:
+            if self._writer is None:
+                folders = {os.path.dirname(path) for path in files.values()}
+                self._writer = threading.Thread(target=self._write_loop, args=(folders,),
+                                                name=f"cas-{self.stage}", daemon=True)
+                self._writer.start()
+        pin_dir, pinned = self._pin(files)
+        try:
+            self._pending.put_nowait((source_hash, pinned, value, pin_dir))
+        except queue.Full:
+            print(f"[CACHE] ⚠️ {self.stage} : file d'écriture pleine, entrée {source_hash[:12]} non stockée", flush=True)
+            if pin_dir: shutil.rmtree(pin_dir, ignore_errors=True)
+
+    def _has_entry(self, source_hash):
+        return os.path.isdir(self._entry_dir(source_hash))
+
+    def _pin(self, files):
+        if not files:
+            return None, files
+        pin_dir = os.path.join(os.path.dirname(next(iter(files.values()))), PIN_FOLDER, uuid.uuid4().hex)
+        pinned = {}
+        try:
+            os.makedirs(pin_dir)
+            for name, path in files.items():
+                pinned[name] = os.path.join(pin_dir, name)
+                os.link(path, pinned[name])
+        except OSError as e:
+            # Pas de lien physique possible (autre volume, système de fichiers) : chemins d'origine
+            print(f"[CACHE] ⚠️ Épinglage impossible ({e}), copie depuis les fichiers publiés", flush=True)
+            shutil.rmtree(pin_dir, ignore_errors=True)
+            return None, files
+        return pin_dir, pinned
+
+    def _sweep_pins(self, folders):
+        for folder in folders:
+            pins = os.path.join(folder, PIN_FOLDER)
+            if not os.path.isdir(pins):
+                continue
+            for name in os.listdir(pins):
+                path = os.path.join(pins, name)
+                try:
+                    if time.time() - os.stat(path).st_mtime > PIN_MAX_AGE_S:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+
+    def _write_loop(self, folders):
+        self._sweep_pins(folders)
+        while True:
+            source_hash, files, value, pin_dir = self._pending.get()
+            try:
+                self.store(source_hash, files, value)
+            except Exception as e:
+                print(f"[CACHE] ⚠️ Écriture différée impossible ({e})", flush=True)
+            finally:
+                if pin_dir: shutil.rmtree(pin_dir, ignore_errors=True)
+
+    def evict(self, keep=None):
+        """LRU : supprime les entrées les moins récemment utilisées au-delà de max_bytes
+        (jamais keep, l'entrée qui vient d'être écrite)."""
+        entries = []
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard in ("tmp", "stats") or not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, name)
+                try:
+                    entries.append((os.stat(path).st_mtime, _entry_size(path), path))
+                except OSError:
+                    pass
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            if path == keep: continue
+            # Renommage d'abord : un lecteur ne voit jamais une entrée à moitié supprimée
+            trash = os.path.join(self.root, "tmp", f"evict_{uuid.uuid4().hex}")
+            try:
+                os.rename(path, trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._approx_bytes = total
+            self._scanned_at = time.time()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "stage": self.stage,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "updated_at": time.time(),
+            }
+
+    def _save_stats(self):
+        if not self.enabled:
+            return
+        path = os.path.join(self.root, "stats", f"{self.stage}-{socket.gethostname()}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.stats(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import threading
+
+# --- BAUX (LEASES) SUR LE SYSTÈME DE FICHIERS PARTAGÉ ---
+# Plusieurs réplicas d'une même étape reçoivent les mêmes fichiers : avant de traiter,
+# un worker prend un bail <CLAIMS_ROOT>/<étape>/<sha1(clé)>.lease, créé avec O_EXCL
+# (un seul gagnant, sans broker). Tant que le travail tourne, un thread rafraîchit
+# le mtime du bail (heartbeat). Un bail dont le mtime a plus de CLAIM_TTL_S secondes
+# appartient à un worker mort : il est repris par rename atomique (un seul repreneur).
+# Un bail laissé par une incarnation précédente du même conteneur (même hôte, autre
+# identifiant de processus) est repris immédiatement. Le pid ne suffit pas : en
+# conteneur le worker est toujours le pid 1 et le hostname survit au redémarrage,
+# d'où un identifiant aléatoire tiré au démarrage du processus.
+
+CLAIMS_ROOT = os.getenv("CLAIMS_ROOT", "/mnt/data/state/claims")
+CLAIMS_ENABLED = os.getenv("CLAIMS_ENABLED", "1") == "1"
+CLAIM_TTL_S = float(os.getenv("CLAIM_TTL_S", "60"))
+CLAIM_HEARTBEAT_S = float(os.getenv("CLAIM_HEARTBEAT_S", str(CLAIM_TTL_S / 4)))
+
+HOSTNAME = socket.gethostname()
+INSTANCE_ID = uuid.uuid4().hex[:12]
+
+
+class LeaseManager:
+    def __init__(self, stage, root=CLAIMS_ROOT, ttl=CLAIM_TTL_S, heartbeat=CLAIM_HEARTBEAT_S):
+        self.stage = stage
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = f"{HOSTNAME}:{os.getpid()}:{INSTANCE_ID}"
+        self.folder = os.path.join(root, stage)
+        os.makedirs(self.folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._held = {}             # clé -> chemin du bail
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name=f"{stage}-leases", daemon=True)
+        self._thread.start()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.lease")
+
+    def _create(self, path, key):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "owner": self.owner, "acquired_at": time.time()}, f)
+        return True
+
+    def _read_owner(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("owner")
+        except (OSError, ValueError):
+            return None
+
+    def _is_stale(self, path):
+        try:
+            age = time.time() - os.stat(path).st_mtime
+        except FileNotFoundError:
+            return True
+        if age > self.ttl:
+            return True
+        # Bail d'un processus précédent de ce conteneur (redémarrage) : il ne reviendra pas
+        owner = self._read_owner(path)
+        return bool(owner) and owner.split(":")[0] == HOSTNAME and owner != self.owner
+
+    def _reclaim(self, path):
+        # Rename atomique : si deux workers tentent la reprise, un seul réussit
+        stale = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return
+        # Heartbeat arrivé entre le test et le rename : on rend le bail à son propriétaire
+        if not self._is_stale(stale):
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+        else:
+            print(f"[CLAIMS] {self.stage} : bail expiré repris ({self._read_owner(stale)})", flush=True)
+        os.remove(stale)
+
+    def acquire(self, key):
+        """True si ce worker détient désormais le bail sur key."""
+        path = self._path(key)
+        with self._lock:
+            if key in self._held:
+                return True
+        if not self._create(path, key):
+            if not self._is_stale(path):
+                return False
+            self._reclaim(path)
+            if not self._create(path, key):
+                return False
+        with self._lock:
+            self._held[key] = path
+        return True
+
+    def holds(self, key):
+        with self._lock:
+            return key in self._held
+
+    def release(self, key):
+        with self._lock:
+            path = self._held.pop(key, None)
+        if path and self._read_owner(path) == self.owner:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat):
+            with self._lock:
+                held = list(self._held.items())
+            for key, path in held:
+                owner = self._read_owner(path)
+                if owner != self.owner and (owner is not None or not os.path.exists(path)):
+                    # Bail repris par un autre (heartbeat trop en retard) : on le signale une fois
+                    print(f"[CLAIMS] ⚠️ {self.stage} : bail perdu pour {key}", flush=True)
+                    with self._lock: self._held.pop(key, None)
+                    continue
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+
+    def close(self):
+        self._stop.set()
+        for key in list(self._held):
+            self.release(key)
+
+
+def make_claims(stage):
+    """LeaseManager de l'étape, ou None si CLAIMS_ENABLED=0 (un seul réplica)."""
+    return LeaseManager(stage) if CLAIMS_ENABLED else None
@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers.polling import PollingObserver
+
+# --- INGESTION DE FICHIERS (commune aux 4 services) ---
+# Remplace "PollingObserver + time.sleep(N)" : un fichier n'est transmis au service
+# que lorsqu'il est complet.
+#  - inotify (Linux) : IN_CLOSE_WRITE / IN_MOVED_TO => l'écrivain a terminé, envoi immédiat
+#  - polling (montages Windows / Docker Desktop, où inotify ne voit rien) : envoi quand
+#    taille + mtime n'ont pas bougé depuis INGEST_STABLE_SECONDS (une copie réseau / SMB
+#    peut marquer des pauses de plusieurs secondes), sur au moins STABLE_CHECKS contrôles
+#  - dans tous les cas, un marqueur explicite "<fichier>.ready" valide le fichier
+
+# Polling par défaut : les bind mounts Windows / Docker Desktop du docker-compose ne
+# remontent aucun événement inotify (et l'import réussit quand même). "auto" ou
+# "inotify" seulement sur un volume Linux natif.
+INGEST_MODE = os.getenv("INGEST_MODE", "polling")       # polling | auto | inotify
+POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "1"))
+CHECK_INTERVAL = float(os.getenv("INGEST_CHECK_INTERVAL", "0.25"))
+STABLE_CHECKS = int(os.getenv("INGEST_STABLE_CHECKS", "2"))
+STABLE_SECONDS = float(os.getenv("INGEST_STABLE_SECONDS", "5"))
+# En mode inotify, la stabilité n'est qu'un filet de sécurité (écriture sans close) :
+# on laisse au IN_CLOSE_WRITE le temps d'arriver avant de conclure.
+INOTIFY_STABLE_SECONDS = float(os.getenv("INGEST_INOTIFY_STABLE_SECONDS", "10"))
+READY_MARKER = ".ready"
+# Les fichiers partis du dossier sont oubliés (événement de suppression, ou contrôle périodique)
+DISPATCHED_PRUNE_SECONDS = 60
+
+
+def make_observer(mode=INGEST_MODE):
+    if mode != "polling":
+        try:
+            from watchdog.observers.inotify import InotifyObserver
+            return InotifyObserver(), "inotify"
+        except (ImportError, OSError) as e:
+            if mode == "inotify":
+                raise
+            print(f"[INGEST] inotify indisponible ({e}), bascule en polling", flush=True)
+    return PollingObserver(timeout=POLL_INTERVAL), "polling"
+
+
+class FileIngestor(FileSystemEventHandler):
+    def __init__(self, folder, on_ready, accept=None, mode=INGEST_MODE):
+        self.folder = folder
+        self.on_ready = on_ready
+        self.accept = accept or (lambda filename: True)
+        self.observer, self.mode = make_observer(mode)
+        self.stable_seconds = INOTIFY_STABLE_SECONDS if self.mode == "inotify" else STABLE_SECONDS
+        self._lock = threading.Lock()
+        # Fichiers en attente de stabilité : chemin -> [taille, mtime, contrôles stables, stable depuis]
+        self._pending = {}
+        # Dernière version transmise (taille, mtime) : évite les doublons d'événements
+        self._dispatched = {}
+        self._stop = threading.Event()
+        self._checker = threading.Thread(target=self._check_loop, name="ingest-checker", daemon=True)
+
+    # --- Événements watchdog ---
+    def on_created(self, event):
+        if not event.is_directory: self._track(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory: self._track(event.src_path)
+
+    def on_closed(self, event):
+        # IN_CLOSE_WRITE : l'écrivain a fermé le fichier
+        if not event.is_directory: self._track(event.src_path, complete=True)
+
+    def on_moved(self, event):
+        # IN_MOVED_TO : publication par renommage atomique (".tmp_x" -> "x")
+        if not event.is_directory:
+            self._forget(event.src_path)
+            self._track(event.dest_path, complete=(self.mode == "inotify"))
+
+    def on_deleted(self, event):
+        if not event.is_directory: self._forget(event.src_path)
+
+    # --- Suivi ---
+    def _track(self, path, complete=False):
+        filename = os.path.basename(path)
+        if filename.endswith(READY_MARKER):
+            # Marqueur explicite : le fichier cible est prêt
+            path, complete = path[:-len(READY_MARKER)], True
+            filename = os.path.basename(path)
+        if not self.accept(filename): return
+
+        if complete:
+            with self._lock:
+                self._pending.pop(path, None)
+            self._dispatch(path)
+            return
+        with self._lock:
+            self._pending.setdefault(path, [-1, -1, 0, 0.0])
+
+    def _forget(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+            self._dispatched.pop(path, None)
+
+    def _prune_dispatched(self):
+        with self._lock:
+            paths = list(self._dispatched)
+        for path in paths:
+            if not os.path.exists(path):
+                with self._lock: self._dispatched.pop(path, None)
+
+    def _check_loop(self):
+        pruned_at = time.monotonic()
+        while not self._stop.wait(CHECK_INTERVAL):
+            if time.monotonic() - pruned_at > DISPATCHED_PRUNE_SECONDS:
+                self._prune_dispatched()
+                pruned_at = time.monotonic()
+            with self._lock:
+                candidates = list(self._pending.items())
+            for path, state in candidates:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    with self._lock: self._pending.pop(path, None)
+                    continue
+                if os.path.exists(path + READY_MARKER) or self._is_stable(state, st):
+                    with self._lock: self._pending.pop(path, None)
+                    self._dispatch(path)
+
+    def _is_stable(self, state, st):
+        now = time.monotonic()
+        if (st.st_size, st.st_mtime) == (state[0], state[1]) and st.st_size > 0:
+            state[2] += 1
+        else:
+            state[0], state[1], state[2], state[3] = st.st_size, st.st_mtime, 0, now
+        return state[2] >= STABLE_CHECKS and now - state[3] >= self.stable_seconds
+
+    def _dispatch(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        signature = (st.st_size, st.st_mtime)
+        with self._lock:
+            if self._dispatched.get(path) == signature: return
+            self._dispatched[path] = signature
+        try:
+            self.on_ready(path)
+        except Exception as e:
+            print(f"[INGEST] ❌ Erreur sur {os.path.basename(path)} : {e}", flush=True)
+
+    # --- Cycle de vie ---
+    def start(self):
+        self.observer.schedule(self, path=self.folder, recursive=False)
+        self.observer.start()
+        self._checker.start()
+        print(f"[INGEST] Surveillance de {self.folder} ({self.mode})", flush=True)
+
+    def stop(self):
+        self._stop.set()
+        self.observer.stop()
+
+    def join(self):
+        self.observer.join()
+        self._checker.join()
@@ -0,0 +1,205 @@
+import os
+import time
+import queue
+import threading
+from common.metrics import JOB_DURATION, JOBS_COMPLETED, JOB_FAILURES, QUEUE_DEPTH, JOBS_IN_FLIGHT
+
+# --- FILE DE TRAVAUX BORNÉE (une par service) ---
+# Le watcher (FileIngestor) ne fait plus que soumettre ; un pool de threads
+# configurable exécute les traitements (FFmpeg / Whisper / YOLO relâchent le GIL).
+#  - profondeur max : submit() bloque quand la file est pleine (backpressure sur le watcher)
+#  - déduplication : un même chemin ne peut pas être en attente / en cours deux fois
+#  - arrêt propre : shutdown() laisse finir les travaux en cours (et la file si drain=True)
+#  - registre optionnel (common/ledger.py) : états persistés, reprise au démarrage
+#    (recover) et nouvel essai avec backoff quand le handler lève une exception.
+#    Un handler qui confie la fin du travail à un autre composant renvoie DEFERRED
+#    puis ce composant appelle complete(key, error).
+#  - baux optionnels (common/claims.py) : avec plusieurs réplicas, un seul exécute
+#    chaque travail ; les autres revérifient après CLAIM_TTL_S (worker mort => reprise).
+
+WORKERS = int(os.getenv("WORKERS", "1"))
+QUEUE_MAX = int(os.getenv("QUEUE_MAX", "64"))
+
+_STOP = object()
+DEFERRED = object()
+
+
+class JobQueue:
+    def __init__(self, name, handler, workers=WORKERS, max_depth=QUEUE_MAX, initializer=None, ledger=None, claims=None):
+        self.name = name
+        self.handler = handler
+        self.ledger = ledger
+        self.claims = claims
+        self.workers = max(1, workers)
+        self.initializer = initializer
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._lock = threading.Lock()
+        self._keys = set()          # en attente + en cours
+        self._in_flight = 0
+        self._started = {}          # clé -> début d'exécution (durée, y compris DEFERRED)
+        self._submitted = {}        # clé -> heure de mise en file (traces : attente en file)
+        self._closed = False
+        self._threads = []
+        QUEUE_DEPTH.labels(name).set_function(self.depth)
+        JOBS_IN_FLIGHT.labels(name).set_function(self.in_flight)
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"[JOBS] {self.name} : {self.workers} worker(s), file max {self._queue.maxsize}", flush=True)
+
+    def submit(self, key, *args, block=True, timeout=None):
+        """Ajoute un travail. Renvoie False si doublon, file fermée ou pleine (block=False / timeout)."""
+        with self._lock:
+            if self._closed or key in self._keys:
+                return False
+            self._keys.add(key)
+            self._submitted.setdefault(key, time.time())
+        if self.ledger is not None and not self.ledger.queued(key, args):
+            # Déjà traité (et fichier inchangé depuis)
+            self._forget(key)
+            return False
+        try:
+            self._queue.put((key, args), block=block, timeout=timeout)
+        except queue.Full:
+            self._forget(key)
+            print(f"[JOBS] ⚠️ File {self.name} pleine, refus : {key}", flush=True)
+            return False
+        return True
+
+    def _forget(self, key):
+        with self._lock:
+            self._keys.discard(key)
+            self._submitted.pop(key, None)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def in_flight(self):
+        return self._in_flight
+
+    def submitted_at(self, key):
+        """Heure (epoch) de la première mise en file de key, None si inconnue."""
+        with self._lock:
+            return self._submitted.get(key)
+
+    def _worker(self):
+        if self.initializer:
+            # Ex. chargement d'un modèle par thread
+            self.initializer()
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            key, args = item
+            if not self._claim(key, args):
+                self._forget(key)
+                self._queue.task_done()
+                continue
+            with self._lock:
+                self._in_flight += 1
+                self._started[key] = time.perf_counter()
+            if self.ledger is not None: self.ledger.running(key)
+            try:
+                if self.handler(*args) is not DEFERRED:
+                    self.complete(key)
+            except Exception as e:
+                self.complete(key, error=e)
+            finally:
+                # La clé reste réservée jusqu'à complete() : un travail DEFERRED encore
+                # en cours ailleurs (batcher) ne peut pas être remis en file
+                with self._lock:
+                    self._in_flight -= 1
+                self._queue.task_done()
+
+    def _claim(self, key, args):
+        if self.claims is None:
+            return True
+        if not self.claims.acquire(key):
+            # Un autre réplica s'en occupe ; s'il meurt, son bail expire et on reprendra
+            self._retry_later(key, self.claims.ttl, args)
+            return False
+        if self.ledger is not None and self.ledger.is_done(key):
+            # Terminé par un autre réplica pendant que le travail attendait ici
+            self.claims.release(key)
+            return False
+        return True
+
+    def complete(self, key, error=None):
+        """Fin d'un travail (appelé par le worker, ou plus tard pour un travail DEFERRED)."""
+        with self._lock:
+            started = self._started.pop(key, None)
+            self._submitted.pop(key, None)
+            self._keys.discard(key)
+        if started is not None:
+            JOB_DURATION.labels(self.name).observe(time.perf_counter() - started)
+        if error is None:
+            JOBS_COMPLETED.labels(self.name).inc()
+        else:
+            JOB_FAILURES.labels(self.name, type(error).__name__).inc()
+        try:
+            self._record(key, error)
+        finally:
+            if self.claims is not None: self.claims.release(key)
+
+    def _record(self, key, error):
+        if error is None:
+            if self.ledger is not None: self.ledger.done(key)
+            return
+        print(f"[JOBS] ❌ {self.name} : échec sur {key} : {error}", flush=True)
+        if self.ledger is None:
+            return
+        delay = self.ledger.failed(key, error)
+        if delay is None:
+            print(f"[JOBS] {self.name} : abandon de {key} (essais épuisés)", flush=True)
+        else:
+            print(f"[JOBS] {self.name} : nouvel essai de {key} dans {delay:.0f}s", flush=True)
+            self._retry_later(key, delay)
+
+    def _retry_later(self, key, delay, args=None):
+        timer = threading.Timer(delay, self._retry, (key, args))
+        timer.daemon = True
+        timer.start()
+
+    def _retry(self, key, args=None):
+        if args is None and self.ledger is not None:
+            args = self.ledger.args(key)
+        if args is not None and not self._closed:
+            self.submit(key, *args)
+
+    def recover(self):
+        """Au démarrage : relance les travaux non terminés du registre (à appeler après start)."""
+        if self.ledger is None:
+            return 0
+        pending = self.ledger.unfinished()
+        now = time.time()
+        for key, args, next_attempt_at in pending:
+            if next_attempt_at and next_attempt_at > now:
+                self._retry_later(key, next_attempt_at - now)
+            else:
+                self.submit(key, *args)
+        if pending:
+            print(f"[JOBS] {self.name} : {len(pending)} travail(aux) repris du registre", flush=True)
+        return len(pending)
+
+    def shutdown(self, wait=True, drain=True):
+        with self._lock:
+            self._closed = True
+        if not drain:
+            # On abandonne ce qui n'a pas commencé
+            try:
+                while True:
+                    item = self._queue.get_nowait()
+                    self._forget(item[0])
+                    self._queue.task_done()
+            except queue.Empty:
+                pass
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        if wait:
+            for t in self._threads:
+                t.join()
+        print(f"[JOBS] {self.name} arrêté.", flush=True)
@@ -0,0 +1,66 @@
+import os
+import json
+import threading
+
+# --- JOINTURE ÉVÉNEMENTIELLE DES SORTIES DE PIPELINE ---
+# Pour chaque vidéo, on note quelles sorties d'étapes sont arrivées (détection,
+# langue, sous-titres...). Dès que la dernière arrive, quel que soit l'ordre,
+# on_complete(video_id, parts) est appelé. L'état des jointures en attente est
+# persisté (écriture atomique) : un redémarrage ne perd rien. Une jointure complète
+# reste enregistrée jusqu'à acknowledge() (fin réelle du traitement) ; resume()
+# relance au démarrage celles qui n'avaient pas été acquittées.
+
+
+class JoinBarrier:
+    def __init__(self, state_path, required, on_complete):
+        self.state_path = state_path
+        self.required = set(required)
+        self.on_complete = on_complete
+        self._lock = threading.Lock()
+        self._pending = self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            print(f"[JOIN] ⚠️ État illisible ({self.state_path}) : {e}", flush=True)
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._pending, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def arrive(self, video_id, part, value=None):
+        with self._lock:
+            parts = self._pending.setdefault(video_id, {})
+            already_complete = self.required.issubset(parts)
+            parts[part] = value
+            complete = self.required.issubset(parts)
+            self._save()
+        if complete:
+            if not already_complete:
+                self.on_complete(video_id, dict(parts))
+        else:
+            missing = ", ".join(sorted(self.required - set(parts)))
+            print(f"[JOIN] {video_id} : '{part}' reçu, en attente de : {missing}", flush=True)
+        return complete
+
+    def pending(self):
+        with self._lock:
+            return {video_id: dict(parts) for video_id, parts in self._pending.items()}
+
+    def acknowledge(self, video_id):
+        with self._lock:
+            if self._pending.pop(video_id, None) is not None:
+                self._save()
+
+    def resume(self):
+        """Relance les jointures complètes mais non acquittées (arrêt en plein traitement)."""
+        for video_id, parts in self.pending().items():
+            if self.required.issubset(parts):
+                self.on_complete(video_id, parts)
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# --- REGISTRE DURABLE DES TRAVAUX (un par étape) ---
+# SQLite (WAL) sur le volume partagé : <LEDGER_ROOT>/<étape>.db
+# Chaque travail (clé = chemin du fichier) passe par queued -> running -> done | failed.
+#  - redémarrage : seuls les travaux non terminés sont relancés (recover), plus de
+#    retraitement de tout le dossier
+#  - échec : nouvel essai avec backoff exponentiel, jusqu'à LEDGER_MAX_ATTEMPTS
+#  - scan incrémental : un "watermark" (ctime max des fichiers déjà vus) limite le
+#    rattrapage aux fichiers arrivés pendant l'arrêt
+#  - un fichier remplacé (ctime plus récent que celui enregistré) est retraité
+
+LEDGER_ROOT = os.getenv("LEDGER_ROOT", "/mnt/data/state/ledger")
+LEDGER_MAX_ATTEMPTS = int(os.getenv("LEDGER_MAX_ATTEMPTS", "3"))
+LEDGER_BACKOFF_S = float(os.getenv("LEDGER_BACKOFF_S", "30"))
+LEDGER_BACKOFF_MAX_S = float(os.getenv("LEDGER_BACKOFF_MAX_S", "900"))
+# Marge sur le watermark (horloges, copies lentes)
+LEDGER_SCAN_SLACK_S = float(os.getenv("LEDGER_SCAN_SLACK_S", "60"))
+# WAL exige une mémoire partagée locale : sur un volume réseau partagé entre
+# réplicas (NFS, ReadWriteMany), utiliser LEDGER_JOURNAL_MODE=DELETE
+LEDGER_JOURNAL_MODE = os.getenv("LEDGER_JOURNAL_MODE", "WAL")
+
+
+def file_stamp(path):
+    """ctime couvre aussi les fichiers arrivés par rename ou lien (mtime d'origine conservé)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return max(st.st_mtime, st.st_ctime)
+
+
+class JobLedger:
+    def __init__(self, stage, root=LEDGER_ROOT, max_attempts=LEDGER_MAX_ATTEMPTS,
+                 backoff=LEDGER_BACKOFF_S, backoff_max=LEDGER_BACKOFF_MAX_S):
+        self.stage = stage
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, f"{stage}.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={LEDGER_JOURNAL_MODE}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        with self._lock:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                       key             TEXT PRIMARY KEY,
+                       args            TEXT NOT NULL,
+                       state           TEXT NOT NULL,
+                       attempts        INTEGER NOT NULL DEFAULT 0,
+                       error           TEXT,
+                       stamp           REAL,
+                       queued_at       REAL,
+                       started_at      REAL,
+                       finished_at     REAL,
+                       next_attempt_at REAL
+                   )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL)"
+            )
+
+    # --- TRANSITIONS ---
+    def queued(self, key, args):
+        """Enregistre un travail. Renvoie False s'il est déjà terminé pour ce fichier."""
+        stamp = file_stamp(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, stamp, next_attempt_at FROM jobs WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[0] == "done" and not (stamp and row[1] and stamp > row[1]):
+                return False
+            if row and (row[0] == "done" or (row[0] == "failed" and row[2] is None)):
+                # Fichier remplacé ou re-déposé après abandon : compteur d'essais remis à zéro
+                self._conn.execute("UPDATE jobs SET attempts = 0 WHERE key = ?", (key,))
+            self._conn.execute(
+                """INSERT INTO jobs (key, args, state, stamp, queued_at)
+                   VALUES (?, ?, 'queued', ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET
+                       args = excluded.args,
+                       -- déjà en cours chez un autre réplica : on ne l'écrase pas
+                       state = CASE WHEN jobs.state = 'running' THEN 'running' ELSE 'queued' END,
+                       stamp = COALESCE(excluded.stamp, jobs.stamp),
+                       queued_at = excluded.queued_at, next_attempt_at = NULL""",
+                (key, json.dumps(list(args)), stamp, now),
+            )
+            if stamp:
+                self._conn.execute(
+                    """INSERT INTO meta (key, value) VALUES ('watermark', ?)
+                       ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)""",
+                    (stamp,),
+                )
+        return True
+
+    def running(self, key):
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET state = 'running', attempts = attempts + 1,
+                       started_at = ?, error = NULL WHERE key = ?""",
+                (time.time(), key),
+            )
+
+    def done(self, key):
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET state = 'done', finished_at = ?, error = NULL,
+                       next_attempt_at = NULL WHERE key = ?""",
+                (time.time(), key),
+            )
+
+    def mark_done(self, key, args):
+        """Travail constaté comme déjà fait (sortie présente) sans passer par la file."""
+        if self.queued(key, args):
+            self.done(key)
+
+    def failed(self, key, error):
+        """Note l'échec ; renvoie le délai avant le prochain essai, ou None si abandon."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE key = ?", (key,)).fetchone()
+            attempts = row[0] if row else self.max_attempts
+            delay = None
+            if attempts < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff * 2 ** (attempts - 1))
+            self._conn.execute(
+                """UPDATE jobs SET state = 'failed', finished_at = ?, error = ?,
+                       next_attempt_at = ? WHERE key = ?""",
+                (now, str(error)[:2000], now + delay if delay is not None else None, key),
+            )
+        return delay
+
+    # --- LECTURE ---
+    def state(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, key):
+        return self.state(key) == "done"
+
+    def args(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT args FROM jobs WHERE key = ?", (key,)).fetchone()
+        return tuple(json.loads(row[0])) if row else None
+
+    def unfinished(self):
+        """Travaux à reprendre : [(clé, args, prochain_essai ou None), ...].
+        'running' au démarrage = interrompu par l'arrêt précédent."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT key, args, next_attempt_at FROM jobs
+                   WHERE state IN ('queued', 'running')
+                      OR (state = 'failed' AND next_attempt_at IS NOT NULL)
+                   ORDER BY queued_at"""
+            ).fetchall()
+        return [(key, tuple(json.loads(args)), next_at) for key, args, next_at in rows]
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def watermark(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        return row[0] if row else 0.0
+
+    def scan(self, folder, accept, slack=LEDGER_SCAN_SLACK_S):
+        """Fichiers acceptés arrivés depuis le watermark : [(nom, chemin), ...].
+        Ceux déjà connus du registre sont ignorés (recover() s'en charge)."""
+        if not os.path.isdir(folder):
+            return []
+        since = self.watermark() - slack
+        found = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or not accept(entry.name):
+                    continue
+                stamp = file_stamp(entry.path)
+                if stamp is None or stamp < since:
+                    continue
+                with self._lock:
+                    row = self._conn.execute(
+                        "SELECT state, stamp FROM jobs WHERE key = ?", (entry.path,)
+                    ).fetchone()
+                # Connu et non remplacé depuis : rien à faire ici
+                if row and not (row[0] == "done" and stamp > (row[1] or 0)):
+                    continue
+                found.append((entry.name, entry.path))
+        return sorted(found)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
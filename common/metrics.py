@@ -0,0 +1,65 @@
+import os
+
+# --- MÉTRIQUES APPLICATIVES PROMETHEUS (workers) ---
+# Chaque worker expose /metrics sur METRICS_PORT (start_metrics_server au démarrage).
+# Les métriques sont étiquetées par étape : on compare directement les étapes entre
+# elles pour trouver le goulot d'étranglement sous charge.
+# prometheus_client absent (ancienne image) : métriques sans effet, le service tourne.
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+    class _NoopMetric:
+        def __init__(self, *args, **kwargs): pass
+        def labels(self, *args, **kwargs): return self
+        def observe(self, *args, **kwargs): pass
+        def inc(self, *args, **kwargs): pass
+        def set(self, *args, **kwargs): pass
+        def set_function(self, *args, **kwargs): pass
+
+    Counter = Gauge = Histogram = _NoopMetric
+
+
+# Durées de traitement : de la seconde (cache, langue) à l'heure (vidéo longue)
+_DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+
+JOB_DURATION = Histogram(
+    "vidp_job_duration_seconds", "Durée de traitement d'un travail", ["stage"], buckets=_DURATION_BUCKETS,
+)
+JOBS_COMPLETED = Counter("vidp_jobs_completed_total", "Travaux terminés avec succès", ["stage"])
+JOB_FAILURES = Counter("vidp_job_failures_total", "Échecs de travaux par type d'exception", ["stage", "error_type"])
+QUEUE_DEPTH = Gauge("vidp_queue_depth", "Travaux en attente dans la file", ["stage"])
+JOBS_IN_FLIGHT = Gauge("vidp_jobs_in_flight", "Travaux en cours d'exécution", ["stage"])
+
+FFMPEG_ENCODE_FPS = Histogram(
+    "vidp_ffmpeg_encode_fps", "Images source traitées par seconde (passe FFmpeg)",
+    buckets=(10, 25, 50, 100, 200, 400, 800, 1600),
+)
+YOLO_FPS = Histogram(
+    "vidp_yolo_frames_per_second", "Images analysées par seconde par YOLO",
+    ["backend"], buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+WHISPER_RTF = Histogram(
+    "vidp_whisper_rtf", "Real-time factor Whisper (temps de calcul / durée audio)",
+    ["stage"], buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5),
+)
+UPLOAD_BYTES = Counter("vidp_upload_bytes_total", "Octets envoyés au backend", ["kind"])
+UPLOAD_DURATION = Histogram(
+    "vidp_upload_duration_seconds", "Durée des envois vers le backend",
+    ["kind"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+OUTBOX_PENDING = Gauge("vidp_outbox_pending", "Envois vers le backend en attente dans l'outbox")
+CACHE_LOOKUPS = Counter("vidp_cache_lookups_total", "Consultations du cache partagé", ["stage", "result"])
+
+
+def start_metrics_server(port=METRICS_PORT):
+    if not METRICS_AVAILABLE:
+        print("[METRICS] ⚠️ prometheus_client absent, /metrics désactivé", flush=True)
+        return
+    start_http_server(port)
+    print(f"[METRICS] /metrics exposé sur le port {port}", flush=True)
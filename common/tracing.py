@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import uuid
+import socket
+
+# --- TRACES PAR VIDÉO ---
+# Le downscaler crée un trace_id à l'ingestion et le note dans le manifeste
+# (<base>_ingest.json) ; les étapes suivantes le relisent. Chaque étape ajoute ses
+# spans (attente en file, début, fin, octets lus/écrits) en JSONL dans
+#   <TRACES_ROOT>/<trace_id>.jsonl
+# Un fichier par vidéo : animal-detect relit toute la trace en O(1) pour l'envoyer
+# au backend (/api/trace/{video_id} : chronologie + chemin critique).
+
+TRACES_ROOT = os.getenv("TRACES_ROOT", "/mnt/data/state/traces")
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+
+HOSTNAME = socket.gethostname()
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def trace_id_of(manifest, base_name):
+    """trace_id du manifeste ; sans manifeste (INGEST_ARTIFACTS=0), le nom de base."""
+    if manifest and manifest.get("trace_id"):
+        return manifest["trace_id"]
+    return base_name
+
+
+def file_size(*paths):
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except (OSError, TypeError):
+            pass
+    return total
+
+
+def _trace_path(trace_id):
+    return os.path.join(TRACES_ROOT, f"{trace_id}.jsonl")
+
+
+def record_span(span):
+    if not TRACING_ENABLED:
+        return
+    try:
+        os.makedirs(TRACES_ROOT, exist_ok=True)
+        # Une ligne par écriture en O_APPEND : pas d'entrelacement entre étapes
+        line = (json.dumps(span, ensure_ascii=False) + "\n").encode("utf-8")
+        fd = os.open(_trace_path(span["trace_id"]), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print(f"[TRACE] ⚠️ Span non enregistré ({e})", flush=True)
+
+
+def read_trace(trace_id):
+    spans = []
+    try:
+        with open(_trace_path(trace_id), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue  # ligne tronquée (arrêt brutal)
+    except FileNotFoundError:
+        pass
+    return spans
+
+
+class Span:
+    """Mesure une étape pour une vidéo. Utilisable en `with`, ou start()/finish()
+    quand la fin a lieu ailleurs (lot de lang-ident)."""
+
+    def __init__(self, stage, trace_id, video_id, name="process", queued_at=None):
+        self.data = {
+            "trace_id": trace_id,
+            "video_id": video_id,
+            "stage": stage,
+            "name": name,
+            "host": HOSTNAME,
+            "queued_at": queued_at,
+            "started_at": None,
+            "finished_at": None,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "status": "ok",
+        }
+
+    def start(self):
+        self.data["started_at"] = time.time()
+        if self.data["queued_at"] is None:
+            self.data["queued_at"] = self.data["started_at"]
+        return self
+
+    def finish(self, error=None):
+        self.data["finished_at"] = time.time()
+        if error is not None:
+            self.data["status"] = "error"
+            self.data["error"] = type(error).__name__
+        record_span(self.data)
+
+    def set(self, **fields):
+        self.data.update(fields)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
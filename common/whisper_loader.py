@@ -0,0 +1,57 @@
+import os
+import time
+import threading
+import torch
+import whisper
+
+# --- CHARGEMENT DES MODÈLES WHISPER (fp32 ou int8 dynamique) ---
+# WHISPER_QUANTIZE=1 : les couches Linear sont quantifiées en int8 (quantification
+# dynamique PyTorch, CPU). Le modèle quantifié est sauvegardé une fois à côté du
+# checkpoint fp32 ; les démarrages suivants le rechargent directement, sans relire
+# le fp32 ni refaire la conversion.
+
+WHISPER_CACHE = "/root/.cache/whisper"
+WHISPER_QUANTIZE = os.getenv("WHISPER_QUANTIZE", "0") == "1"
+
+
+def quantized_path(name, cache_dir=WHISPER_CACHE):
+    # Le module est picklé en entier : on lie l'artefact à la version de torch
+    return os.path.join(cache_dir, f"{name}-int8-torch{torch.__version__.split('+')[0]}.pt")
+
+
+def quantize_int8(model):
+    # whisper.model.Linear ne fait que caster les poids au dtype de l'entrée ;
+    # quantize_dynamic ne reconnaît que nn.Linear exactement.
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_whisper(name, quantized=WHISPER_QUANTIZE, cache_dir=WHISPER_CACHE):
+    t0 = time.perf_counter()
+    fp32_path = os.path.join(cache_dir, f"{name}.pt")
+    # Checkpoint local si présent, sinon téléchargement dans le cache
+    ref = fp32_path if os.path.exists(fp32_path) else name
+
+    if not quantized:
+        model = whisper.load_model(ref, device="cpu", download_root=cache_dir)
+        print(f"📂 Whisper {name} (fp32) chargé en {time.perf_counter() - t0:.1f}s", flush=True)
+        return model
+
+    int8_path = quantized_path(name, cache_dir)
+    if os.path.exists(int8_path):
+        model = torch.load(int8_path, map_location="cpu", weights_only=False)
+        model.eval()
+        print(f"📂 Whisper {name} (int8, cache) chargé en {time.perf_counter() - t0:.1f}s", flush=True)
+        return model
+
+    print(f"⏳ Quantification int8 de Whisper {name} (une seule fois)...", flush=True)
+    model = quantize_int8(whisper.load_model(ref, device="cpu", download_root=cache_dir))
+    model.eval()
+    # Plusieurs workers peuvent quantifier en même temps : fichier temporaire propre à chacun
+    tmp_path = f"{int8_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, int8_path)
+    print(f"✅ Whisper {name} (int8) prêt en {time.perf_counter() - t0:.1f}s, sauvegardé : {int8_path}", flush=True)
+    return model
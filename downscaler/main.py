@@ -1,73 +1,425 @@
 import time
 import os
 import shutil  # Nécessaire pour déplacer les fichiers entre dossiers
+import signal
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import ffmpeg
-from watchdog.observers.polling import PollingObserver as Observer
-from watchdog.events import FileSystemEventHandler
+from common.ingest import FileIngestor
+from common.jobs import JobQueue
+from common.ledger import JobLedger
+from common.claims import make_claims
+from common.metrics import FFMPEG_ENCODE_FPS, start_metrics_server
+from common.artifacts import (
+    AUDIO_SAMPLE_RATE, FRAME_SIZE, FRAMES_FORMAT, artifact_paths, hls_paths, write_json_atomic,
+)
+from common.cas import ContentCache, file_sha256
+from common.tracing import Span, file_size, new_trace_id
 
 INPUT_FOLDER = "/mnt/data/input"
 OUTPUT_FOLDER = "/mnt/data/processed"
 # Dossier de travail local (invisible pour les autres conteneurs)
 LOCAL_STAGING_FOLDER = "/tmp/vidp_staging"
+# Artefacts d'ingestion (audio 16 kHz + images échantillonnées) produits dans la même passe
+INGEST_ARTIFACTS = os.getenv("INGEST_ARTIFACTS", "1") == "1"
+# Cadence d'échantillonnage des images pour la détection (images/seconde)
+FRAME_SAMPLE_FPS = float(os.getenv("FRAME_SAMPLE_FPS", "5"))
+# Qualité JPEG des images échantillonnées (2 = meilleure, 31 = pire)
+FRAME_JPEG_QUALITY = int(os.getenv("FRAME_JPEG_QUALITY", "3"))
 
-class VideoHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        if event.is_directory: return
-        filename = os.path.basename(event.src_path)
-        
+# --- MODE SEGMENTÉ (vidéos longues) ---
+# "single" : un seul FFmpeg par fichier / "segmented" : découpe sur keyframes + pool de processus
+TRANSCODE_MODE = os.getenv("TRANSCODE_MODE", "single")
+SEGMENT_SECONDS = float(os.getenv("SEGMENT_SECONDS", "60"))
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", str(os.cpu_count() or 1)))
+# En dessous de cette durée, le découpage coûte plus qu'il ne rapporte
+SEGMENT_MIN_DURATION = float(os.getenv("SEGMENT_MIN_DURATION", str(2 * SEGMENT_SECONDS)))
+
+# --- LECTURE WEB ---
+# Le MP4 est toujours écrit en "faststart" (moov en tête) : le lecteur démarre sans
+# aller chercher l'index en fin de fichier. PLAYBACK_HLS=1 publie en plus une version
+# HLS (MP4 fragmenté, segments de HLS_SEGMENT_S s) remuxée sans ré-encodage ; les
+# keyframes sont alors forcées toutes les HLS_SEGMENT_S s pour des segments réguliers.
+PLAYBACK_HLS = os.getenv("PLAYBACK_HLS", "0") == "1"
+HLS_SEGMENT_S = float(os.getenv("HLS_SEGMENT_S", "4"))
+
+# Version des sorties pour le cache partagé : à changer dès que l'encodage change.
+# Seuls le MP4 et l'audio sont mis en cache ; les images sont ré-échantillonnées
+# depuis la source à chaque hit (décodage seul, bien moins cher que l'encodage x264)
+CACHE_VERSION = (
+    f"480p-pcm{AUDIO_SAMPLE_RATE}-faststart"
+    + (f"-kf{HLS_SEGMENT_S:g}" if PLAYBACK_HLS else "")
+    + ("-artifacts" if INGEST_ARTIFACTS else "")
+)
+
+def probe_source(input_path):
+    probe = ffmpeg.probe(input_path)
+    with_audio = any(s.get("codec_type") == "audio" for s in probe.get("streams", []))
+    duration = float(probe.get("format", {}).get("duration") or 0)
+    # Cadence de la vidéo source ("30000/1001"...), pour mesurer le débit d'encodage
+    video = next((s for s in probe.get("streams", []) if s.get("codec_type") == "video"), {})
+    num, _, den = (video.get("avg_frame_rate") or "0/1").partition("/")
+    frame_rate = float(num) / float(den) if den and float(den) else 0.0
+    return with_audio, duration, frame_rate
+
+def frames_output(video, frames_path):
+    # Format d'origine, plus grand côté ramené à FRAME_SIZE (jamais agrandi) ;
+    # JPEG intra : chaque image se décode seule (common/artifacts.iter_jpeg)
+    sampled = (
+        video
+        .filter("fps", fps=FRAME_SAMPLE_FPS)
+        .filter("scale", f"min({FRAME_SIZE},iw)", f"min({FRAME_SIZE},ih)", force_original_aspect_ratio="decrease", force_divisible_by=2)
+    )
+    return ffmpeg.output(sampled, frames_path, format="mjpeg", vcodec="mjpeg",
+                         pix_fmt="yuvj420p", **{"q:v": FRAME_JPEG_QUALITY})
+
+def build_frames_graph(input_path, frames_path):
+    """Images échantillonnées seules (republication depuis le cache)."""
+    return (
+        frames_output(ffmpeg.input(input_path).video, frames_path)
+        .global_args("-loglevel", "error").overwrite_output()
+    )
+
+def build_ingest_graph(input_path, mp4_path, audio_path=None, frames_path=None, with_audio=True, threads=None):
+    """Un seul décodage de la source, plusieurs sorties :
+    MP4 480p (+ audio) / PCM float32 mono 16 kHz / images échantillonnées MJPEG."""
+    source = ffmpeg.input(input_path)
+    video_branches = 2 if frames_path else 1
+    video = source.video.filter_multi_output("split", video_branches)
+
+    main_streams = [video[0].filter("scale", -2, 480)]
+    if with_audio:
+        main_streams.append(source.audio)
+    # En mode segmenté, on limite les threads x264 par job pour ne pas sur-souscrire les cœurs
+    encode_args = {"threads": threads} if threads else {}
+    encode_args["movflags"] = "+faststart"
+    if PLAYBACK_HLS:
+        # En mode segmenté, l'expression repart de 0 à chaque segment : alignée si
+        # SEGMENT_SECONDS est un multiple de HLS_SEGMENT_S
+        encode_args["force_key_frames"] = f"expr:gte(t,n_forced*{HLS_SEGMENT_S:g})"
+    outputs = [ffmpeg.output(*main_streams, mp4_path, **encode_args)]
+
+    if audio_path and with_audio:
+        outputs.append(ffmpeg.output(
+            source.audio, audio_path,
+            format="f32le", acodec="pcm_f32le", ac=1, ar=AUDIO_SAMPLE_RATE,
+        ))
+    if frames_path:
+        outputs.append(frames_output(video[1], frames_path))
+
+    return ffmpeg.merge_outputs(*outputs).global_args("-loglevel", "error").overwrite_output()
+
+def build_manifest(final_filename, source_filename, final_artifacts, with_audio, source_hash, trace_id):
+    return {
+        "video": final_filename,
+        "source": source_filename,
+        # Identifiant de trace de cette ingestion, repris par toutes les étapes suivantes
+        "trace_id": trace_id,
+        # Clé du cache partagé pour toutes les étapes suivantes
+        "source_sha256": source_hash,
+        "audio": os.path.basename(final_artifacts["audio"]) if with_audio else None,
+        "sample_rate": AUDIO_SAMPLE_RATE,
+        "frames": os.path.basename(final_artifacts["frames"]),
+        "frame_format": FRAMES_FORMAT,
+        "frame_max_size": FRAME_SIZE,
+        "frame_fps": FRAME_SAMPLE_FPS,
+    }
+
+def transcode_segment(segment_path, mp4_path, audio_path, frames_path, with_audio, threads):
+    # Exécuté dans un processus du pool : doit rester une fonction de module (picklable)
+    try:
+        build_ingest_graph(
+            segment_path, mp4_path, audio_path=audio_path, frames_path=frames_path,
+            with_audio=with_audio, threads=threads,
+        ).run(capture_stdout=True, capture_stderr=True)
+    except ffmpeg.Error as e:
+        # ffmpeg.Error ne se dé-picke pas : on remonte un message simple au parent
+        raise RuntimeError(f"Segment {os.path.basename(segment_path)} : {e.stderr.decode('utf8')}")
+    return mp4_path
+
+def build_source_tracks_graph(input_path, aac_path=None, audio_path=None, frames_path=None):
+    """Sorties continues sur toute la source (mode segmenté) : piste AAC du MP4,
+    PCM de l'audio et images échantillonnées. Un encodage AAC ou un filtre fps par
+    segment ajouterait des trous/clics aux raccords et une dérive A/V."""
+    source = ffmpeg.input(input_path)
+    outputs = []
+    if aac_path:
+        outputs.append(ffmpeg.output(source.audio, aac_path, acodec="aac"))
+    if audio_path:
+        outputs.append(ffmpeg.output(
+            source.audio, audio_path,
+            format="f32le", acodec="pcm_f32le", ac=1, ar=AUDIO_SAMPLE_RATE,
+        ))
+    if frames_path:
+        outputs.append(frames_output(source.video, frames_path))
+    return ffmpeg.merge_outputs(*outputs).global_args("-loglevel", "error").overwrite_output()
+
+def transcode_source_tracks(input_path, aac_path, audio_path, frames_path):
+    # Exécuté dans le pool, en parallèle des segments vidéo
+    try:
+        build_source_tracks_graph(
+            input_path, aac_path=aac_path, audio_path=audio_path, frames_path=frames_path,
+        ).run(capture_stdout=True, capture_stderr=True)
+    except ffmpeg.Error as e:
+        raise RuntimeError(f"Pistes audio / images : {e.stderr.decode('utf8')}")
+
+_segment_pool = None
+
+def get_segment_pool():
+    global _segment_pool
+    if _segment_pool is None:
+        # "spawn" : on ne forke pas un processus qui fait déjà tourner des threads
+        # (observer, workers de la JobQueue, serveur de métriques)
+        _segment_pool = ProcessPoolExecutor(
+            max_workers=SEGMENT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _segment_pool
+
+def transcode_segmented(input_path, staging_path, staged_artifacts, with_audio):
+    """Découpe la vidéo seule sans ré-encodage (coupes sur keyframes), transcode chaque
+    segment dans le pool, recolle sans perte avec le démuxeur concat et y multiplexe
+    l'audio. Audio (AAC, PCM) et images sont produits d'une traite depuis la source,
+    en parallèle des segments."""
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=LOCAL_STAGING_FOLDER)
+    try:
+        # 1. Découpe en copie de flux, vidéo seule : chaque segment commence sur une keyframe
+        source = ffmpeg.input(input_path)
+        (
+            ffmpeg
+            .output(source.video, os.path.join(work_dir, "src_%05d.mkv"),
+                    c="copy", f="segment", segment_time=SEGMENT_SECONDS, reset_timestamps=1)
+            .global_args("-loglevel", "error")
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        segments = sorted(f for f in os.listdir(work_dir) if f.startswith("src_"))
+        print(f"    {len(segments)} segments, {SEGMENT_WORKERS} workers", flush=True)
+
+        # 2. Transcodage parallèle : vidéo seule par segment, audio et images sur la source entière
+        threads = max(1, (os.cpu_count() or 1) // SEGMENT_WORKERS)
+        jobs = []
+        for i, _ in enumerate(segments):
+            part = os.path.join(work_dir, f"part_{i:05d}")
+            jobs.append({
+                "segment_path": os.path.join(work_dir, segments[i]),
+                "mp4_path": f"{part}.mp4",
+                "audio_path": None,
+                "frames_path": None,
+            })
+        aac_path = os.path.join(work_dir, "audio.m4a") if with_audio else None
+        pool = get_segment_pool()
+        futures = [pool.submit(transcode_segment, with_audio=False, threads=threads, **job) for job in jobs]
+        if aac_path or staged_artifacts:
+            futures.append(pool.submit(
+                transcode_source_tracks, input_path, aac_path,
+                staged_artifacts.get("audio"), staged_artifacts.get("frames"),
+            ))
+        for future in futures:
+            future.result()
+
+        # 3. Recollage sans ré-encodage, dans l'ordre des segments, + piste audio continue
+        list_path = os.path.join(work_dir, "concat.txt")
+        with open(list_path, "w") as f:
+            for job in jobs:
+                f.write(f"file '{job['mp4_path']}'\n")
+        streams = [ffmpeg.input(list_path, format="concat", safe=0).video]
+        if aac_path:
+            streams.append(ffmpeg.input(aac_path).audio)
+        (
+            ffmpeg
+            .output(*streams, staging_path, c="copy", movflags="+faststart")
+            .global_args("-loglevel", "error")
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def package_hls(mp4_path, playlist_path, media_path):
+    """Remux (copie de flux) du MP4 en HLS fMP4 : un seul fichier média, segments
+    adressés par byte-range dans la playlist (servis par le backend avec Range)."""
+    (
+        ffmpeg
+        .input(mp4_path)
+        .output(playlist_path, c="copy", f="hls", hls_time=HLS_SEGMENT_S, hls_playlist_type="vod",
+                hls_segment_type="fmp4", hls_flags="single_file", hls_segment_filename=media_path)
+        .global_args("-loglevel", "error")
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+
+class VideoHandler:
+    def __init__(self):
+        # FFmpeg est un sous-processus : plusieurs vidéos peuvent être traitées en parallèle
+        # Registre durable : reprise des travaux non terminés, nouveaux essais en cas d'échec
+        self.ledger = JobLedger("downscaler")
+        # Baux : plusieurs réplicas se partagent les sources sans les traiter deux fois
+        self.jobs = JobQueue("downscaler", self.process_video, ledger=self.ledger,
+                             claims=make_claims("downscaler"))
+        self.cache = ContentCache("downscale", CACHE_VERSION)
+
+    def accepts(self, filename):
         # Filtres basiques
-        if filename.startswith("TEMP_") or filename.startswith("."): return
-        if not filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')): return
+        if filename.startswith("TEMP_") or filename.startswith("."): return False
+        return filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv'))
 
+    def on_file_ready(self, path):
+        # Appelé par FileIngestor une fois la copie terminée (plus de délai fixe)
+        filename = os.path.basename(path)
         print(f"\n[DOWNSCALER] Nouvelle source : {filename}", flush=True)
-        # Petit délai de sécurité pour la copie
-        time.sleep(5)
-        self.process_video(event.src_path, filename)
+        self.jobs.submit(path, path, filename)
+
+    def publish_hls(self, mp4_path, base_name):
+        # Média puis playlist : une playlist visible pointe toujours vers un média complet
+        final_hls = hls_paths(OUTPUT_FOLDER, base_name)
+        staged_hls = {kind: os.path.join(LOCAL_STAGING_FOLDER, os.path.basename(path)) for kind, path in final_hls.items()}
+        package_hls(mp4_path, staged_hls["playlist"], staged_hls["media"])
+        for kind in ("media", "playlist"):
+            temp_path = os.path.join(OUTPUT_FOLDER, f".tmp_{os.path.basename(final_hls[kind])}")
+            shutil.move(staged_hls[kind], temp_path)
+            os.rename(temp_path, final_hls[kind])
+
+    def publish_cached(self, entry, input_path, base_name, final_filename, filename, source_hash, trace_id):
+        # Même ordre que le chemin normal : artefacts et manifeste, puis la vidéo
+        with_audio = self.cache.read_value(entry)["with_audio"]
+        if INGEST_ARTIFACTS:
+            final_artifacts = artifact_paths(OUTPUT_FOLDER, base_name)
+            if with_audio: self.cache.publish(entry, "audio", final_artifacts["audio"])
+            # Les images ne sont pas en cache : ré-échantillonnage depuis la source
+            staged_frames = os.path.join(LOCAL_STAGING_FOLDER, os.path.basename(final_artifacts["frames"]))
+            build_frames_graph(input_path, staged_frames).run(capture_stdout=True, capture_stderr=True)
+            temp_frames = os.path.join(OUTPUT_FOLDER, f".tmp_{os.path.basename(staged_frames)}")
+            shutil.move(staged_frames, temp_frames)
+            os.rename(temp_frames, final_artifacts["frames"])
+            write_json_atomic(final_artifacts["manifest"], build_manifest(
+                final_filename, filename, final_artifacts, with_audio, source_hash, trace_id))
+        # Remux rapide : la version HLS n'est pas mise en cache (nom du média dans la playlist)
+        if PLAYBACK_HLS: self.publish_hls(os.path.join(entry, "video"), base_name)
+        self.cache.publish(entry, "video", os.path.join(OUTPUT_FOLDER, final_filename))
 
     def process_video(self, input_path, filename):
+        base_name = os.path.splitext(filename)[0]
+        # Nouvelle trace à chaque ingestion ; sans manifeste, les étapes suivantes
+        # ne peuvent retrouver que le nom de base
+        trace_id = new_trace_id() if INGEST_ARTIFACTS else base_name
+        with Span("downscaler", trace_id, base_name, queued_at=self.jobs.submitted_at(input_path)) as span:
+            span.set(bytes_in=file_size(input_path))
+            self.ingest(input_path, base_name, filename, trace_id, span)
+            outputs = [os.path.join(OUTPUT_FOLDER, f"{base_name}_downscaled.mp4")]
+            if INGEST_ARTIFACTS: outputs += artifact_paths(OUTPUT_FOLDER, base_name).values()
+            if PLAYBACK_HLS: outputs += hls_paths(OUTPUT_FOLDER, base_name).values()
+            span.set(bytes_out=file_size(*outputs))
+
+    def ingest(self, input_path, base_name, filename, trace_id, span):
         try:
-            base_name = os.path.splitext(filename)[0]
             final_filename = f"{base_name}_downscaled.mp4"
-            
-            # 1. Chemins
             # Le fichier est créé dans le dossier temporaire local (/tmp)
             staging_path = os.path.join(LOCAL_STAGING_FOLDER, final_filename)
+
+            # 0. Source déjà traitée (même contenu, nom quelconque) : republication du cache
+            source_hash = file_sha256(input_path)
+            entry = self.cache.lookup(source_hash)
+            if entry is not None:
+                try:
+                    self.publish_cached(entry, input_path, base_name, final_filename, filename, source_hash, trace_id)
+                    span.set(cache="hit")
+                    print(f"[SUCCESS] Vidéo republiée depuis le cache : {final_filename}", flush=True)
+                    return
+                except (OSError, ValueError, KeyError, ffmpeg.Error) as e:
+                    print(f"[CACHE] ⚠️ Entrée inutilisable ({e}), traitement complet", flush=True)
             
+            # 1. Chemins
             # Destination finale
             final_dest_path = os.path.join(OUTPUT_FOLDER, final_filename)
             # Destination intermédiaire (fichier caché dans le dossier final le temps du transfert)
             temp_dest_path = os.path.join(OUTPUT_FOLDER, f".tmp_{final_filename}")
 
-            print(f"--> 1/3 Traitement FFmpeg en zone tampon ({LOCAL_STAGING_FOLDER})...", flush=True)
+            print(f"--> 1/3 Traitement FFmpeg (passe unique) en zone tampon ({LOCAL_STAGING_FOLDER})...", flush=True)
             
             # Nettoyage préventif si un vieux fichier traîne
             if os.path.exists(staging_path): os.remove(staging_path)
 
+            with_audio, duration, frame_rate = probe_source(input_path)
+            staged_artifacts = {}
+            if INGEST_ARTIFACTS:
+                # Artefacts d'ingestion : même nom de base, à côté de la vidéo finale
+                final_artifacts = artifact_paths(OUTPUT_FOLDER, base_name)
+                staged_artifacts = {
+                    kind: os.path.join(LOCAL_STAGING_FOLDER, os.path.basename(path))
+                    for kind, path in final_artifacts.items() if kind != "manifest"
+                }
+                if not with_audio: staged_artifacts.pop("audio")
+                for path in staged_artifacts.values():
+                    if os.path.exists(path): os.remove(path)
+
             # On lance FFmpeg vers le dossier STAGING (invisible pour les autres)
-            (
-                ffmpeg
-                .input(input_path)
-                .output(staging_path, vf='scale=-2:480', loglevel="error")
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
-            
-            print(f"--> 2/3 Transfert vers le dossier final...", flush=True)
+            encode_start = time.perf_counter()
+            if TRANSCODE_MODE == "segmented" and duration >= SEGMENT_MIN_DURATION:
+                print(f"    Mode segmenté ({duration:.0f}s, segments de {SEGMENT_SECONDS:.0f}s)", flush=True)
+                transcode_segmented(input_path, staging_path, staged_artifacts, with_audio)
+            else:
+                # Une seule passe de décodage pour toutes les sorties
+                build_ingest_graph(
+                    input_path, staging_path,
+                    audio_path=staged_artifacts.get("audio"),
+                    frames_path=staged_artifacts.get("frames"),
+                    with_audio=with_audio,
+                ).run(capture_stdout=True, capture_stderr=True)
+            encode_s = time.perf_counter() - encode_start
+            if encode_s > 0 and duration and frame_rate:
+                FFMPEG_ENCODE_FPS.observe(duration * frame_rate / encode_s)
+
+            print("--> 2/3 Transfert vers le dossier final...", flush=True)
+            # Les artefacts sont publiés AVANT la vidéo : quand un service voit
+            # le _downscaled.mp4, le manifeste et les memmaps sont déjà là.
+            if staged_artifacts:
+                for kind, path in staged_artifacts.items():
+                    temp_artifact = os.path.join(OUTPUT_FOLDER, f".tmp_{os.path.basename(path)}")
+                    shutil.move(path, temp_artifact)
+                    os.rename(temp_artifact, final_artifacts[kind])
+                write_json_atomic(final_artifacts["manifest"], build_manifest(
+                    final_filename, filename, final_artifacts, with_audio, source_hash, trace_id))
+            if PLAYBACK_HLS:
+                self.publish_hls(staging_path, base_name)
+
             # On déplace d'abord sous un nom caché (.tmp_) pour éviter que les autres le voient pendant la copie
             shutil.move(staging_path, temp_dest_path)
             
-            print(f"--> 3/3 Validation finale (Rename)...", flush=True)
+            print("--> 3/3 Validation finale (Rename)...", flush=True)
             # Le renommage est atomique : le fichier apparaît d'un coup pour les autres services
             os.rename(temp_dest_path, final_dest_path)
             
             print(f"[SUCCESS] Vidéo prête et visible : {final_filename}", flush=True)
 
+            # Mise en cache après publication, hors du chemin critique (thread d'écriture) :
+            # MP4 et audio seulement, copiés depuis leurs chemins publiés
+            cached_files = {"video": final_dest_path}
+            if "audio" in staged_artifacts: cached_files["audio"] = final_artifacts["audio"]
+            self.cache.store_later(source_hash, files=cached_files, value={"with_audio": with_audio})
+
         except ffmpeg.Error as e:
             print(f"[ERROR] FFmpeg a échoué : {e.stderr.decode('utf8')}", flush=True)
             # Nettoyage en cas d'erreur
             if os.path.exists(staging_path): os.remove(staging_path)
+            raise RuntimeError("FFmpeg a échoué") from e
         except Exception as e:
             print(f"[ERROR] Erreur inattendue : {e}", flush=True)
+            raise
+
+def scan_existing_files(handler):
+    print("🔍 Scan des sources en attente (Rattrapage)...", flush=True)
+    # 1. Travaux interrompus ou en attente d'un nouvel essai (registre)
+    handler.jobs.recover()
+    # 2. Sources déposées pendant l'arrêt (depuis le watermark du registre)
+    for filename, path in handler.ledger.scan(INPUT_FOLDER, handler.accepts):
+        final_filename = f"{os.path.splitext(filename)[0]}_downscaled.mp4"
+        if os.path.exists(os.path.join(OUTPUT_FOLDER, final_filename)):
+            handler.ledger.mark_done(path, (path, filename))
+            continue
+        print(f"   Rattrapage : {filename}", flush=True)
+        handler.jobs.submit(path, path, filename)
 
 if __name__ == "__main__":
     # Création des dossiers nécessaires
@@ -79,13 +431,21 @@ if __name__ == "__main__":
     
     # On vide le dossier staging au démarrage pour être propre
     for f in os.listdir(LOCAL_STAGING_FOLDER):
-        os.remove(os.path.join(LOCAL_STAGING_FOLDER, f))
+        path = os.path.join(LOCAL_STAGING_FOLDER, f)
+        if os.path.isdir(path): shutil.rmtree(path, ignore_errors=True)
+        else: os.remove(path)
 
-    observer = Observer()
-    observer.schedule(VideoHandler(), path=INPUT_FOLDER, recursive=False)
-    observer.start()
+    start_metrics_server()
+    handler = VideoHandler()
+    handler.jobs.start()
+    scan_existing_files(handler)
+    ingestor = FileIngestor(INPUT_FOLDER, handler.on_file_ready, accept=handler.accepts)
+    ingestor.start()
+    # docker stop (SIGTERM) => même arrêt propre que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
         while True: time.sleep(1)
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
\ No newline at end of file
+        ingestor.stop()
+    ingestor.join()
+    handler.jobs.shutdown()
\ No newline at end of file
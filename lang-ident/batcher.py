@@ -0,0 +1,96 @@
+import os
+import time
+import queue
+import threading
+import torch
+from common.metrics import WHISPER_RTF
+
+# --- DÉTECTION DE LANGUE PAR LOTS ---
+# Les workers préparent le mel (30 premières secondes) en parallèle puis le déposent
+# ici. Un thread unique regroupe jusqu'à LANG_BATCH_SIZE mels (ou attend au plus
+# LANG_BATCH_WAIT_S après le premier), lance UN seul model.detect_language sur le
+# lot empilé, puis redistribue les probabilités fichier par fichier.
+# Un fichier isolé attend donc au maximum LANG_BATCH_WAIT_S de plus.
+# Les workers rendent la main tout de suite (DEFERRED) : c'est la file du batcher,
+# bornée à LANG_QUEUE_MAX mels (~1 Mo chacun), qui bloque submit() et donc les
+# workers quand le modèle ne suit pas, au lieu d'accumuler les mels en mémoire.
+
+# Chaque mel couvre la fenêtre Whisper de 30 s (pad_or_trim)
+MEL_WINDOW_S = 30
+
+LANG_BATCH_SIZE = int(os.getenv("LANG_BATCH_SIZE", "16"))
+LANG_BATCH_WAIT_S = float(os.getenv("LANG_BATCH_WAIT_S", "0.5"))
+LANG_QUEUE_MAX = int(os.getenv("LANG_QUEUE_MAX", str(2 * LANG_BATCH_SIZE)))
+
+_STOP = object()
+
+
+class LangBatcher:
+    def __init__(self, model, on_result, batch_size=LANG_BATCH_SIZE, max_wait=LANG_BATCH_WAIT_S,
+                 max_depth=LANG_QUEUE_MAX):
+        self.model = model
+        self.on_result = on_result
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        # Au moins un lot complet en attente, pour que le regroupement reste possible
+        self._queue = queue.Queue(maxsize=max(self.batch_size, max_depth))
+        self._thread = threading.Thread(target=self._loop, name="lang-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, key, mel):
+        # Bloque tant que la file est pleine (backpressure sur les workers)
+        self._queue.put((key, mel))
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch: self._run(batch)
+
+    def _run(self, batch):
+        keys = [key for key, _ in batch]
+        start = time.perf_counter()
+        try:
+            mels = torch.stack([mel for _, mel in batch]).to(self.model.device)
+            with torch.no_grad():
+                _, probs = self.model.detect_language(mels)
+            WHISPER_RTF.labels("lang-ident").observe(
+                (time.perf_counter() - start) / (len(batch) * MEL_WINDOW_S))
+            if len(batch) > 1:
+                print(f"[LANG] Lot de {len(batch)} fichiers traité en une passe", flush=True)
+        except Exception as e:
+            # Un fichier défectueux ne doit pas faire échouer tout le lot : repli unitaire
+            print(f"[LANG] ⚠️ Lot en échec ({e}), traitement unitaire", flush=True)
+            probs = []
+            for _, mel in batch:
+                try:
+                    _, p = self.model.detect_language(mel.to(self.model.device))
+                except Exception as item_error:
+                    p = item_error
+                probs.append(p)
+        for key, p in zip(keys, probs):
+            self.on_result(key, p)
+
+    def shutdown(self):
+        self._queue.put(_STOP)
+        self._thread.join()
@@ -1,112 +1,174 @@
 import time
 import os
-import json
+import signal
 import whisper
-from watchdog.observers.polling import PollingObserver as Observer
-from watchdog.events import FileSystemEventHandler
+from common.ingest import FileIngestor
+from common.jobs import JobQueue, DEFERRED
+from common.ledger import JobLedger
+from common.claims import make_claims
+from common.metrics import start_metrics_server
+from common.artifacts import load_audio, load_manifest, base_name_of, write_json_atomic
+from common.whisper_loader import load_whisper, WHISPER_QUANTIZE
+from common.cas import ContentCache, source_hash_of
+from common.tracing import Span, file_size, trace_id_of
+from batcher import LangBatcher
 
 # --- CONFIGURATION ---
 INPUT_FOLDER = "/mnt/data/input"       # Mappé sur 01_working
 OUTPUT_FOLDER = "/mnt/data/processed"  # Mappé sur 02_metadata
-# Chemin vers le modèle LOCAL (mappé depuis Windows)
-MODEL_PATH = "/root/.cache/whisper/tiny.pt"
 
-class LangHandler(FileSystemEventHandler):
+class LangHandler:
     def __init__(self):
-        print(f"⏳ Chargement Whisper (tiny)...", flush=True)
-        
-        # CHARGEMENT ROBUSTE DU MODÈLE LOCAL
-        if os.path.exists(MODEL_PATH):
-            print(f"📂 Chargement depuis cache local : {MODEL_PATH}", flush=True)
-            self.model = whisper.load_model(MODEL_PATH)
-        else:
-            print(f"⚠️ Cache introuvable ({MODEL_PATH}) ! Tentative de téléchargement secours...", flush=True)
-            self.model = whisper.load_model("tiny")
-            
+        # Un seul modèle, utilisé par le thread de batching ; les workers du pool
+        # ne font que décoder l'audio et calculer le mel
+        self.model = self.load_model()
+        self.batcher = LangBatcher(self.model, self.on_detected)
+        # Registre durable : reprise des travaux non terminés, nouveaux essais en cas d'échec
+        self.ledger = JobLedger("lang-ident")
+        # Baux : plusieurs réplicas se partagent les fichiers sans les traiter deux fois
+        self.jobs = JobQueue("lang-ident", self.detect_language, ledger=self.ledger,
+                             claims=make_claims("lang-ident"))
+        self.cache = ContentCache("lang", "tiny-int8" if WHISPER_QUANTIZE else "tiny")
+
+    def load_model(self):
+        print("⏳ Chargement Whisper (tiny)...", flush=True)
+        # Cache local /root/.cache/whisper (téléchargement de secours sinon) ;
+        # WHISPER_QUANTIZE=1 => variante int8 pré-quantifiée
+        model = load_whisper("tiny")
         print("✅ Lang-Ident Ready.", flush=True)
+        return model
 
-    def on_created(self, event):
-        if event.is_directory: return
-        filename = os.path.basename(event.src_path)
-        
+    def accepts(self, filename):
         # Filtre sur l'extension et les fichiers temporaires
-        if not filename.endswith("_downscaled.mp4"): return
-        if filename.startswith("TEMP_"): return
+        if not filename.endswith("_downscaled.mp4"): return False
+        return not (filename.startswith("TEMP_") or filename.startswith("."))
 
+    def on_file_ready(self, path):
+        filename = os.path.basename(path)
         print(f"\n[LANG] 🌍 Détecté : {filename}", flush=True)
-        time.sleep(1)
-        self.detect_language(event.src_path, filename)
+        self.jobs.submit(path, path, filename)
 
     # --- C'EST ICI QU'ELLE DOIT ÊTRE (Indentation dans la classe) ---
     def detect_language(self, file_path, filename):
+        base_name = base_name_of(filename)
+        manifest = load_manifest(INPUT_FOLDER, base_name)
+        # Span terminé dans on_detected (après le lot), ou ici si on ne passe pas par le lot
+        span = Span("lang-ident", trace_id_of(manifest, base_name), base_name,
+                    queued_at=self.jobs.submitted_at(file_path)).start()
         try:
             print(f"--> Analyse langue pour {filename}...", flush=True)
+
+            # Même source déjà analysée : on republie le résultat sous le nouveau nom
+            source_hash = source_hash_of(manifest, file_path)
+            entry = self.cache.lookup(source_hash)
+            if entry is not None:
+                try:
+                    cached = self.cache.read_value(entry)
+                    self.write_result(filename, None, {cached["language"]: cached["confidence"]}, span)
+                    span.set(cache="hit")
+                    span.finish()
+                    return
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"[CACHE] ⚠️ Entrée inutilisable ({e}), analyse complète", flush=True)
             
             # Transcription (seulement les 30 premières secondes par défaut)
-            audio = whisper.load_audio(file_path)
+            # Audio déjà décodé par le downscaler (memmap) ; sinon décodage ffmpeg
+            audio = load_audio(INPUT_FOLDER, base_name)
+            if audio is None:
+                audio = whisper.load_audio(file_path)
             audio = whisper.pad_or_trim(audio)
+            span.set(bytes_in=int(audio.nbytes))
             
-            mel = whisper.log_mel_spectrogram(audio).to(self.model.device)
-            _, probs = self.model.detect_language(mel)
-            detected_lang = max(probs, key=probs.get)
-            
-            print(f"[RESULT] Langue : {detected_lang.upper()}", flush=True)
-
-            # Création du JSON
-            base_name = filename.replace("_downscaled.mp4", "")
-            json_filename = f"{base_name}_lang.json"
-            json_path = os.path.join(OUTPUT_FOLDER, json_filename)
-
-            data = {
-                "file": filename, 
-                "language": detected_lang,
-                "confidence": probs[detected_lang]
-            }
-            
-            with open(json_path, 'w') as f:
-                json.dump(data, f)
-            
-            print(f"[SUCCESS] JSON écrit : {json_filename}", flush=True)
+            mel = whisper.log_mel_spectrogram(audio, self.model.dims.n_mels)
+            # La détection elle-même est regroupée avec les autres fichiers en attente
+            self.batcher.submit((file_path, filename, source_hash, span), mel)
+            # Le travail se termine dans on_detected, après le passage du lot
+            return DEFERRED
+
+        except Exception as e:
+            print(f"[ERROR] {e}", flush=True)
+            span.finish(e)
+            raise
 
+    def on_detected(self, key, probs):
+        file_path, filename, source_hash, span = key
+        try:
+            if isinstance(probs, Exception): raise probs
+            self.write_result(filename, source_hash, probs, span)
+            span.finish()
+            self.jobs.complete(file_path)
         except Exception as e:
             print(f"[ERROR] {e}", flush=True)
+            span.finish(e)
+            self.jobs.complete(file_path, error=e)
+
+    def write_result(self, filename, source_hash, probs, span):
+        detected_lang = max(probs, key=probs.get)
+        
+        print(f"[RESULT] {filename} : Langue : {detected_lang.upper()}", flush=True)
+
+        # Création du JSON
+        base_name = filename.replace("_downscaled.mp4", "")
+        json_filename = f"{base_name}_lang.json"
+        json_path = os.path.join(OUTPUT_FOLDER, json_filename)
+
+        data = {
+            "file": filename, 
+            "language": detected_lang,
+            "confidence": probs[detected_lang],
+            "trace_id": span.data["trace_id"],
+        }
+        
+        # Écriture atomique : animal-detect réagit à l'apparition du fichier
+        write_json_atomic(json_path, data)
+        span.set(bytes_out=file_size(json_path))
+        self.cache.store(source_hash, value={"language": detected_lang, "confidence": data["confidence"]})
+        
+        print(f"[SUCCESS] JSON écrit : {json_filename}", flush=True)
 
 # --- FIN DE LA CLASSE ---
 
 def scan_existing_files(handler):
     print("🔍 Scan des fichiers en attente (Rattrapage)...", flush=True)
-    if not os.path.exists(INPUT_FOLDER): return
-    
-    files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith("_downscaled.mp4")]
-    
+    # 1. Travaux interrompus ou en attente d'un nouvel essai (registre)
+    handler.jobs.recover()
+
+    # 2. Fichiers arrivés pendant l'arrêt (depuis le watermark du registre)
+    files = handler.ledger.scan(INPUT_FOLDER, handler.accepts)
     if not files:
         print("   Aucun fichier en attente.", flush=True)
 
-    for filename in files:
+    for filename, path in files:
         # On vérifie si le travail est déjà fait
         json_check = os.path.join(OUTPUT_FOLDER, filename.replace("_downscaled.mp4", "_lang.json"))
         if not os.path.exists(json_check):
             print(f"   Rattrapage : {filename}", flush=True)
-            # Maintenant ça marchera car la méthode existe dans handler
-            handler.detect_language(os.path.join(INPUT_FOLDER, filename), filename)
+            handler.jobs.submit(path, path, filename)
         else:
             print(f"   Déjà traité : {filename}", flush=True)
+            handler.ledger.mark_done(path, (path, filename))
 
 if __name__ == "__main__":
     if not os.path.exists(INPUT_FOLDER): os.makedirs(INPUT_FOLDER, exist_ok=True)
     if not os.path.exists(OUTPUT_FOLDER): os.makedirs(OUTPUT_FOLDER, exist_ok=True)
     
+    start_metrics_server()
     handler = LangHandler()
+    handler.batcher.start()
+    handler.jobs.start()
     
     # 1. Rattrapage au démarrage
     scan_existing_files(handler)
     
     # 2. Surveillance temps réel
-    observer = Observer()
-    observer.schedule(handler, path=INPUT_FOLDER, recursive=False)
-    observer.start()
+    ingestor = FileIngestor(INPUT_FOLDER, handler.on_file_ready, accept=handler.accepts)
+    ingestor.start()
+    # docker stop (SIGTERM) => même arrêt propre que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
         while True: time.sleep(1)
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
\ No newline at end of file
+        ingestor.stop()
+    ingestor.join()
+    handler.jobs.shutdown()
+    handler.batcher.shutdown()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+# --- WHISPER fp32 CONTRE int8 : DÉMARRAGE, MÉMOIRE, VITESSE, PRÉCISION ---
+# Chaque variante tourne dans son propre processus (pic de RSS non mélangé).
+# La variante int8 est lancée deux fois : le 1er run construit l'artefact quantifié
+# s'il manque (démarrage à froid), le 2e mesure le démarrage à chaud.
+#   python bench_quant.py a.mp4 b.mp4 --models tiny base --output quant.json
+# Précision : accord sur la langue détectée et WER int8 / fp32 par fichier.
+
+SAMPLE_RATE = 16000
+
+
+def run_worker(videos, model_name, quantized):
+    import torch
+    import whisper
+    from common.whisper_loader import load_whisper
+
+    t0 = time.perf_counter()
+    model = load_whisper(model_name, quantized=quantized)
+    load_s = time.perf_counter() - t0
+
+    files = []
+    for video in videos:
+        audio = whisper.load_audio(video)
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+        with torch.no_grad():
+            _, probs = model.detect_language(mel)
+        t0 = time.perf_counter()
+        result = model.transcribe(audio, fp16=False)
+        elapsed = time.perf_counter() - t0
+        files.append({
+            "video": video,
+            "language": max(probs, key=probs.get),
+            # Real-time factor : < 1 => plus rapide que la lecture
+            "rtf": round(elapsed / (len(audio) / SAMPLE_RATE), 3),
+            "text": " ".join(seg["text"] for seg in result["segments"]),
+        })
+
+    return {
+        "model": model_name,
+        "variant": "int8" if quantized else "fp32",
+        "load_s": round(load_s, 3),
+        # Linux : ru_maxrss est en kilo-octets
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "files": files,
+    }
+
+
+def spawn(videos, model_name, quantized):
+    here = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, os.path.abspath(__file__), *videos, "--worker",
+           "--models", model_name] + (["--int8"] if quantized else [])
+    # Le dossier parent contient common/ (comme /app dans les conteneurs)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([here, os.path.dirname(here)]))
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True, cwd=here, env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base"])
+    parser.add_argument("--int8", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.videos, args.models[0], args.int8)))
+        return
+
+    from srt import word_error_rate
+
+    results = []
+    for model_name in args.models:
+        fp32 = spawn(args.videos, model_name, False)
+        cold = spawn(args.videos, model_name, True)
+        warm = spawn(args.videos, model_name, True)
+        warm["cold_load_s"] = cold["load_s"]
+        pairs = list(zip(fp32["files"], warm["files"]))
+        warm["lang_agreement"] = round(sum(a["language"] == b["language"] for a, b in pairs) / len(pairs), 3)
+        warm["wer_vs_fp32"] = round(sum(word_error_rate(a["text"], b["text"]) for a, b in pairs) / len(pairs), 3)
+        results += [fp32, warm]
+
+    print(f"{'modèle':<6} {'variante':<8} {'load s':>7} {'froid s':>8} {'RSS Mo':>8} {'RTF':>6} {'langue':>7} {'WER':>6}")
+    for r in results:
+        rtf = sum(f["rtf"] for f in r["files"]) / len(r["files"])
+        print(f"{r['model']:<6} {r['variant']:<8} {r['load_s']:>7} {r.get('cold_load_s', '-'):>8} "
+              f"{r['peak_rss_mb']:>8} {rtf:>6.3f} {r.get('lang_agreement', '-'):>7} {r.get('wer_vs_fp32', '-'):>6}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
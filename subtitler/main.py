@@ -1,110 +1,178 @@
 import time
 import os
+import signal
+import threading
 import whisper
-from watchdog.observers.polling import PollingObserver as Observer
-from watchdog.events import FileSystemEventHandler
+from common.ingest import FileIngestor
+from common.jobs import JobQueue
+from common.ledger import JobLedger
+from common.claims import make_claims
+from common.metrics import WHISPER_RTF, start_metrics_server
+from common.artifacts import load_audio, load_manifest, base_name_of
+from common.whisper_loader import load_whisper, WHISPER_QUANTIZE
+from common.cas import ContentCache, source_hash_of
+from common.tracing import Span, file_size, trace_id_of
+from srt import format_timestamp, write_srt_atomic
+from streaming import transcribe_streaming, PARTIAL_SUFFIX
+from parallel import ParallelTranscriber, PARALLEL_MIN_DURATION, SAMPLE_RATE
 
 INPUT_FOLDER = "/mnt/data/input"
 OUTPUT_FOLDER = "/mnt/data/metadata"
+# "full" : transcription du fichier entier / "streaming" : fenêtres VAD + SRT partiel incrémental
+# "parallel" : vidéos longues découpées en tronçons transcrits par un pool de processus
+SUBS_MODE = os.getenv("SUBS_MODE", "full")
 
-class SubtitleHandler(FileSystemEventHandler):
+class SubtitleHandler:
     def __init__(self):
+        # Un modèle par worker : transcribe() installe des hooks kv-cache sur le
+        # modèle, deux transcriptions ne peuvent donc pas partager la même instance.
+        self._local = threading.local()
+        # Registre durable : reprise des travaux non terminés, nouveaux essais en cas d'échec
+        self.ledger = JobLedger("subtitler")
+        # Baux : plusieurs réplicas se partagent les fichiers sans les traiter deux fois
+        self.jobs = JobQueue("subtitler", self.process_video, initializer=self.load_model,
+                             ledger=self.ledger, claims=make_claims("subtitler"))
+        self.model_name = "base"
+        quant = "int8" if WHISPER_QUANTIZE else "fp32"
+        self.cache = ContentCache("subs", f"{self.model_name}-{quant}-{SUBS_MODE}")
+        self._parallel = None
+        self._parallel_lock = threading.Lock()
+
+    def load_model(self):
         print("Chargement Whisper (base)...", flush=True)
-        model_path = "/root/.cache/whisper/base.pt"
-        print(f"Chargement depuis cache local : {model_path}", flush=True)
-        # --- CORRECTION CHARGEMENT MODELE ---
-        print(f"Tentative de chargement du modèle : {model_path}")
-        # Whisper va alors le télécharger automatiquement dans le dossier cache
-        if not os.path.exists(model_path):
-            print(f"⚠️ Fichier cache introuvable ({model_path}). Téléchargement auto...")
-            # On extrait juste "base" ou "tiny" du chemin ou de la config
-            model_name = "base" # Ou self.model_name si tu l'as stocké
-            self.model = whisper.load_model(model_name, download_root="/root/.cache/whisper")
-        else:
-            print("✅ Chargement depuis le fichier cache local.")
-            self.model = whisper.load_model(model_path)
+        # Cache local /root/.cache/whisper (téléchargement de secours sinon) ;
+        # WHISPER_QUANTIZE=1 => variante int8 pré-quantifiée
+        self._local.model = load_whisper(self.model_name)
         print("Subtitler Ready.", flush=True)
+        return self._local.model
+
+    def parallel(self):
+        # Pool de processus créé à la première vidéo longue, partagé par les workers
+        with self._parallel_lock:
+            if self._parallel is None:
+                self._parallel = ParallelTranscriber(self.model_name)
+            return self._parallel
 
-    def on_created(self, event):
-        if event.is_directory: return
-        filename = os.path.basename(event.src_path)
+    @property
+    def model(self):
+        model = getattr(self._local, "model", None)
+        return model if model is not None else self.load_model()
 
+    def accepts(self, filename):
         # 1. On vérifie que c'est bien un fichier vidéo du downscaler
-        if not filename.endswith("_downscaled.mp4"): return
-        filename = os.path.basename(event.src_path)
+        if not filename.endswith("_downscaled.mp4"): return False
         # 2. On ignore les fichiers temporaires en cours d'écriture
-        if filename.startswith("TEMP_"): return
-        # ----------------------------
+        return not (filename.startswith("TEMP_") or filename.startswith("."))
 
+    def on_file_ready(self, path):
+        filename = os.path.basename(path)
         print(f"\n[SUBS] 📝 Détecté : {filename}", flush=True)
-        time.sleep(4)
-        self.process_video(event.src_path, filename)
+        self.jobs.submit(path, path, filename)
 
     def process_video(self, file_path, filename):
+        base_name = base_name_of(filename)
+        manifest = load_manifest(INPUT_FOLDER, base_name)
+        with Span("subtitler", trace_id_of(manifest, base_name), base_name,
+                  queued_at=self.jobs.submitted_at(file_path)) as span:
+            self.subtitle(file_path, filename, manifest, span)
+
+    def subtitle(self, file_path, filename, manifest, span):
         print(f"--> 🎬 Démarrage transcription pour {filename}...", flush=True)
         try:
-            # Transcription
-            result = self.model.transcribe(file_path, fp16=False)
+            # Transcription (audio pré-décodé par le downscaler si disponible)
+            audio = load_audio(INPUT_FOLDER, base_name_of(filename))
             
             base_name = filename.replace("_downscaled.mp4", "")
             srt_filename = f"{base_name}_subs.srt"
             srt_path = os.path.join(OUTPUT_FOLDER, srt_filename)
+
+            # Même source déjà sous-titrée : le SRT est republié sous le nouveau nom
+            source_hash = source_hash_of(manifest, file_path)
+            entry = self.cache.lookup(source_hash)
+            if entry is not None:
+                try:
+                    self.cache.publish(entry, "subs.srt", srt_path)
+                    span.set(cache="hit", bytes_out=file_size(srt_path))
+                    print(f"[SUCCESS] 📝 SRT republié depuis le cache : {srt_filename}", flush=True)
+                    return
+                except OSError as e:
+                    print(f"[CACHE] ⚠️ Entrée inutilisable ({e}), transcription complète", flush=True)
             
-            with open(srt_path, "w", encoding="utf-8") as f:
-                for i, segment in enumerate(result["segments"]):
-                    start = self.format_timestamp(segment["start"])
-                    end = self.format_timestamp(segment["end"])
-                    text = segment["text"].strip()
-                    f.write(f"{i + 1}\n{start} --> {end}\n{text}\n\n")
+            # Décodage avant transcribe (que Whisper ferait sinon lui-même) : durée connue pour le RTF
+            if audio is None: audio = whisper.load_audio(file_path)
+            span.set(bytes_in=int(audio.nbytes))
+            transcribe_start = time.perf_counter()
+            if SUBS_MODE == "streaming":
+                partial_path = os.path.join(OUTPUT_FOLDER, f"{base_name}{PARTIAL_SUFFIX}")
+                transcribe_streaming(self.model, audio, srt_path, partial_path)
+            elif SUBS_MODE == "parallel":
+                if len(audio) / SAMPLE_RATE >= PARALLEL_MIN_DURATION:
+                    segments = self.parallel().transcribe(audio)
+                else:
+                    segments = self.model.transcribe(audio, fp16=False)["segments"]
+                write_srt_atomic(srt_path, segments)
+            else:
+                result = self.model.transcribe(audio, fp16=False)
+                write_srt_atomic(srt_path, result["segments"])
+            if len(audio):
+                WHISPER_RTF.labels("subtitler").observe(
+                    (time.perf_counter() - transcribe_start) / (len(audio) / SAMPLE_RATE))
+            self.cache.store(source_hash, files={"subs.srt": srt_path})
+            span.set(bytes_out=file_size(srt_path))
             
             print(f"[SUCCESS] 📝 SRT écrit : {srt_filename}", flush=True)
 
         except Exception as e:
             print(f"[ERROR] ❌ {e}", flush=True)
+            raise
 
     def format_timestamp(self, seconds):
-        millis = int((seconds - int(seconds)) * 1000)
-        seconds = int(seconds)
-        minutes = seconds // 60
-        hours = minutes // 60
-        minutes %= 60
-        seconds %= 60
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+        return format_timestamp(seconds)
 
 # --- FONCTION DE RATTRAPAGE ---
 def scan_existing_files(handler):
     print("🔍 Scan des fichiers existants au démarrage...", flush=True)
-    # On regarde s'il y a déjà des fichiers dans le dossier
-    if not os.path.exists(INPUT_FOLDER): return
-    
-    files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith("_downscaled.mp4")]
-    
+    # 1. Travaux interrompus ou en attente d'un nouvel essai (registre)
+    handler.jobs.recover()
+
+    # 2. Fichiers arrivés pendant l'arrêt (depuis le watermark du registre)
+    files = handler.ledger.scan(INPUT_FOLDER, handler.accepts)
     if not files:
         print("   Aucun fichier en attente.", flush=True)
     
-    for filename in files:
+    for filename, file_path in files:
+        # SRT déjà présent : rien à refaire
+        srt_path = os.path.join(OUTPUT_FOLDER, filename.replace("_downscaled.mp4", "_subs.srt"))
+        if os.path.exists(srt_path):
+            print(f"   Déjà traité : {filename}", flush=True)
+            handler.ledger.mark_done(file_path, (file_path, filename))
+            continue
         print(f"   Rattrapage du fichier : {filename}", flush=True)
-        file_path = os.path.join(INPUT_FOLDER, filename)
-        # On traite le fichier directement
-        handler.process_video(file_path, filename)
+        # On confie le fichier à la file de travaux
+        handler.jobs.submit(file_path, file_path, filename)
 
 if __name__ == "__main__":
     if not os.path.exists(INPUT_FOLDER): os.makedirs(INPUT_FOLDER, exist_ok=True)
     if not os.path.exists(OUTPUT_FOLDER): os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
     # 1. On initialise le Handler (et donc le modèle Whisper)
+    start_metrics_server()
     handler = SubtitleHandler()
+    handler.jobs.start()
 
     # 2. On traite les fichiers qui sont DÉJÀ là (Rattrapage)
     scan_existing_files(handler)
 
     # 3. On lance la surveillance pour les PROCHAINS fichiers
     print("--- Démarrage de la surveillance ---", flush=True)
-    observer = Observer()
-    observer.schedule(handler, path=INPUT_FOLDER, recursive=False)
-    observer.start()
+    ingestor = FileIngestor(INPUT_FOLDER, handler.on_file_ready, accept=handler.accepts)
+    ingestor.start()
+    # docker stop (SIGTERM) => même arrêt propre que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
         while True: time.sleep(1)
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
\ No newline at end of file
+        ingestor.stop()
+    ingestor.join()
+    handler.jobs.shutdown()
+    if handler._parallel: handler._parallel.shutdown()
\ No newline at end of file
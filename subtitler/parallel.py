@@ -0,0 +1,185 @@
+import os
+import re
+import sys
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from srt import write_srt_atomic, word_error_rate
+
+# --- TRANSCRIPTION PARALLÈLE DES VIDÉOS LONGUES ---
+# L'audio est découpé en tronçons de PARALLEL_CHUNK_S secondes, chacun élargi de
+# PARALLEL_OVERLAP_S de chaque côté, puis transcrit dans un pool de processus
+# (un modèle Whisper par processus). Recollage :
+#   - chaque réplique appartient au tronçon qui contient son milieu (zone "cœur",
+#     élargie d'une demi-zone de recouvrement)
+#   - dans les zones de recouvrement, une réplique produite par les deux tronçons
+#     (même texte, ou horaires qui se chevauchent) n'est gardée qu'une fois
+# La langue est détectée une seule fois, sur les 30 premières secondes comme en série,
+# puis imposée à tous les tronçons : un tronçon qui commence par de la musique ou un
+# silence ne doit pas être décodé dans une autre langue.
+
+SAMPLE_RATE = 16000
+PARALLEL_CHUNK_S = float(os.getenv("PARALLEL_CHUNK_S", "120"))
+PARALLEL_OVERLAP_S = float(os.getenv("PARALLEL_OVERLAP_S", "5"))
+PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# En dessous, le mode parallèle n'apporte rien (chargement des modèles)
+PARALLEL_MIN_DURATION = float(os.getenv("PARALLEL_MIN_DURATION", str(2 * PARALLEL_CHUNK_S)))
+# Fenêtre de détection de la langue (celle de Whisper)
+LANGUAGE_WINDOW_S = 30
+
+_worker_model = None
+
+
+def _init_worker(model_name, threads, loader=None):
+    # Exécuté une fois par processus du pool (même chargeur, donc même variante fp32/int8) ;
+    # loader : autre chargeur picklable (modèle factice de bench/parallel_check.py)
+    global _worker_model
+    if loader is not None:
+        _worker_model = loader(model_name)
+        return
+    import torch
+    from common.whisper_loader import load_whisper
+    torch.set_num_threads(threads)
+    _worker_model = load_whisper(model_name)
+
+
+def _transcribe_chunk(audio, offset, language):
+    result = _worker_model.transcribe(audio, fp16=False, language=language)
+    return [
+        {"start": offset + seg["start"], "end": offset + seg["end"], "text": seg["text"]}
+        for seg in result["segments"]
+    ], result.get("language")
+
+
+def _detect_language(audio):
+    # Même calcul que Whisper en série (et que lang-ident) : mel des 30 premières secondes
+    import whisper
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), _worker_model.dims.n_mels)
+    _, probs = _worker_model.detect_language(mel.to(_worker_model.device))
+    return max(probs, key=probs.get)
+
+
+def chunk_bounds(duration, chunk=PARALLEL_CHUNK_S, overlap=PARALLEL_OVERLAP_S):
+    """[(cœur_début, cœur_fin, début_transcrit, fin_transcrite), ...]"""
+    bounds = []
+    start = 0.0
+    while start < duration:
+        end = min(duration, start + chunk)
+        bounds.append((start, end, max(0.0, start - overlap), min(duration, end + overlap)))
+        start = end
+    return bounds
+
+
+def _normalize(text):
+    return re.sub(r"[^\w]+", " ", text.lower()).strip()
+
+
+def _overlap_ratio(a, b):
+    inter = min(a["end"], b["end"]) - max(a["start"], b["start"])
+    shortest = min(a["end"] - a["start"], b["end"] - b["start"]) or 1e-6
+    return max(0.0, inter) / shortest
+
+
+def stitch(chunks, bounds):
+    """Recolle les répliques des tronçons en un seul SRT ordonné dans le temps."""
+    kept = []
+    tolerance = PARALLEL_OVERLAP_S / 2
+    for index, (segments, (core_start, core_end, t_start, t_end)) in enumerate(zip(chunks, bounds)):
+        # Zone cœur élargie : une réplique à cheval sur la frontière est gardée des
+        # deux côtés, le doublon est éliminé juste après
+        low = core_start - tolerance if index > 0 else float("-inf")
+        high = core_end + tolerance if index < len(bounds) - 1 else float("inf")
+        for seg in segments:
+            middle = (seg["start"] + seg["end"]) / 2
+            if low <= middle < high:
+                # Distance au bord du tronçon : plus elle est grande, plus Whisper avait de contexte
+                margin = min(middle - t_start, t_end - middle)
+                kept.append(dict(seg, chunk=index, margin=margin))
+    kept.sort(key=lambda s: s["start"])
+
+    stitched = []
+    for seg in kept:
+        if not _normalize(seg["text"]):
+            continue
+        if stitched:
+            prev = stitched[-1]
+            if prev["chunk"] != seg["chunk"]:
+                same_text = _normalize(prev["text"]) == _normalize(seg["text"])
+                near = seg["start"] <= prev["end"] + tolerance
+                if (same_text and near) or _overlap_ratio(prev, seg) > 0.5:
+                    # Doublon de la zone de recouvrement : on garde la version la mieux centrée
+                    if seg["margin"] > prev["margin"]:
+                        stitched[-1] = dict(seg)
+                    continue
+            # Pas de chevauchement d'horaires entre répliques consécutives
+            if seg["start"] < prev["end"]:
+                seg = dict(seg, start=prev["end"])
+            if seg["end"] <= seg["start"]:
+                continue
+        stitched.append(dict(seg))
+    return [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in stitched]
+
+
+class ParallelTranscriber:
+    def __init__(self, model_name, workers=PARALLEL_WORKERS, loader=None):
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # "spawn" : on ne forke pas un processus qui a déjà initialisé les threads torch
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads, loader),
+        )
+        self.workers = workers
+
+    def transcribe(self, audio, language=None):
+        duration = len(audio) / SAMPLE_RATE
+        bounds = chunk_bounds(duration)
+        if language is None:
+            head = np.array(audio[:int(LANGUAGE_WINDOW_S * SAMPLE_RATE)], dtype=np.float32)
+            language = self.pool.submit(_detect_language, head).result()
+            print(f"    Langue détectée : {language} (imposée aux {len(bounds)} tronçons)", flush=True)
+        futures = [
+            self.pool.submit(
+                _transcribe_chunk,
+                np.array(audio[int(s * SAMPLE_RATE):int(e * SAMPLE_RATE)], dtype=np.float32),
+                s, language,
+            )
+            for _, _, s, e in bounds
+        ]
+        results = [f.result() for f in futures]
+        print(f"    {len(bounds)} tronçons transcrits sur {self.workers} processus", flush=True)
+        return stitch([segments for segments, _ in results], bounds)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+def main():
+    # Vérification : le mode parallèle doit rester proche de la transcription en série
+    #   python parallel.py video.mp4 --model base --max-wer 0.1
+    import whisper
+    from common.whisper_loader import load_whisper
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--max-wer", type=float, default=0.1)
+    parser.add_argument("--output-dir", default=".")
+    args = parser.parse_args()
+
+    audio = whisper.load_audio(args.video)
+    serial = load_whisper(args.model).transcribe(audio, fp16=False)["segments"]
+    transcriber = ParallelTranscriber(args.model)
+    parallel = transcriber.transcribe(audio)
+    transcriber.shutdown()
+
+    write_srt_atomic(os.path.join(args.output_dir, "serial.srt"), serial)
+    write_srt_atomic(os.path.join(args.output_dir, "parallel.srt"), parallel)
+    wer = word_error_rate(" ".join(s["text"] for s in serial), " ".join(s["text"] for s in parallel))
+    print(f"WER série / parallèle : {wer:.3f} (tolérance {args.max_wer})")
+    sys.exit(0 if wer <= args.max_wer else 1)
+
+
+if __name__ == "__main__":
+    main()
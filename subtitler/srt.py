@@ -0,0 +1,47 @@
+import os
+
+# --- ÉCRITURE SRT (partagée par les modes complet / streaming / parallèle) ---
+
+
+def format_timestamp(seconds):
+    millis = int((seconds - int(seconds)) * 1000)
+    seconds = int(seconds)
+    minutes = seconds // 60
+    hours = minutes // 60
+    minutes %= 60
+    seconds %= 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def render_srt(segments):
+    parts = []
+    for i, segment in enumerate(segments):
+        start = format_timestamp(segment["start"])
+        end = format_timestamp(segment["end"])
+        text = segment["text"].strip()
+        parts.append(f"{i + 1}\n{start} --> {end}\n{text}\n\n")
+    return "".join(parts)
+
+
+def write_srt_atomic(path, segments):
+    # Écriture sous un nom caché puis renommage atomique : animal-detect
+    # réagit à l'apparition du .srt et ne doit jamais lire un fichier partiel
+    tmp_path = os.path.join(os.path.dirname(path), f".tmp_{os.path.basename(path)}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_srt(segments))
+    os.replace(tmp_path, path)
+
+
+def word_error_rate(reference, hypothesis):
+    """WER au niveau des mots (distance d'édition / nombre de mots de référence)."""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
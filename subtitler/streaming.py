@@ -0,0 +1,130 @@
+import os
+import numpy as np
+from srt import write_srt_atomic
+
+# --- TRANSCRIPTION EN FLUX, FILTRÉE PAR DÉTECTION D'ACTIVITÉ VOCALE (VAD) ---
+# 1. VAD énergétique sur l'audio 16 kHz : seules les zones de parole sont gardées
+# 2. Les zones sont découpées en fenêtres de VAD_MAX_WINDOW secondes max (contexte Whisper)
+# 3. Chaque fenêtre est transcrite puis ses répliques sont ajoutées au SRT partiel,
+#    republié atomiquement (<base>_subs.partial.srt) : les sous-titres arrivent tôt
+# 4. A la fin, le SRT complet est publié sous son nom définitif (<base>_subs.srt)
+# Le temps de calcul suit donc la durée de parole, pas la durée de la vidéo.
+# Le seuil suppose qu'une part de l'audio est du silence. Parole sur musique ou bruit
+# continu : tout peut passer sous le seuil. Quand le résultat du VAD n'est pas
+# plausible (aucune zone, couverture trop faible, plancher de bruit élevé), on
+# transcrit le fichier entier comme en mode "full" plutôt que de publier un SRT vide.
+
+SAMPLE_RATE = 16000
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+# Seuil = max(plancher absolu, bruit de fond (percentile) x facteur)
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "0.005"))
+VAD_NOISE_FACTOR = float(os.getenv("VAD_NOISE_FACTOR", "3"))
+VAD_NOISE_PERCENTILE = float(os.getenv("VAD_NOISE_PERCENTILE", "20"))
+# Marge autour de la parole, fusion des trous courts, durée minimale d'une zone
+VAD_PAD_S = float(os.getenv("VAD_PAD_S", "0.3"))
+VAD_MERGE_GAP_S = float(os.getenv("VAD_MERGE_GAP_S", "0.6"))
+VAD_MIN_SPEECH_S = float(os.getenv("VAD_MIN_SPEECH_S", "0.25"))
+VAD_MAX_WINDOW_S = float(os.getenv("VAD_MAX_WINDOW", "30"))
+# Repli sur la transcription complète : part de parole minimale, bruit de fond maximal
+VAD_MIN_COVERAGE = float(os.getenv("VAD_MIN_COVERAGE", "0.05"))
+VAD_MAX_NOISE_RMS = float(os.getenv("VAD_MAX_NOISE_RMS", "0.02"))
+
+PARTIAL_SUFFIX = "_subs.partial.srt"
+
+
+def frame_rms(audio, sample_rate=SAMPLE_RATE):
+    """Énergie (RMS) par trame de VAD_FRAME_MS, et durée d'une trame en échantillons."""
+    frame = int(sample_rate * VAD_FRAME_MS / 1000)
+    n_frames = len(audio) // frame
+    frames = np.asarray(audio[:n_frames * frame], dtype=np.float32).reshape(n_frames, frame)
+    return np.sqrt((frames * frames).mean(axis=1)), frame
+
+
+def noise_floor(rms):
+    return float(np.percentile(rms, VAD_NOISE_PERCENTILE)) if len(rms) else 0.0
+
+
+def speech_regions(audio, sample_rate=SAMPLE_RATE):
+    """Renvoie la liste des zones de parole [(début_s, fin_s), ...]."""
+    rms, frame = frame_rms(audio, sample_rate)
+    if len(rms) == 0:
+        return []
+    threshold = max(VAD_MIN_RMS, noise_floor(rms) * VAD_NOISE_FACTOR)
+    voiced = rms >= threshold
+
+    # Fronts montants / descendants => zones contiguës
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts, ends = np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]
+    frame_s = frame / sample_rate
+    duration = len(audio) / sample_rate
+
+    regions = []
+    for s, e in zip(starts, ends):
+        start = max(0.0, float(s * frame_s - VAD_PAD_S))
+        end = min(duration, float(e * frame_s + VAD_PAD_S))
+        if regions and start - regions[-1][1] <= VAD_MERGE_GAP_S:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return [(s, e) for s, e in regions if e - s >= VAD_MIN_SPEECH_S]
+
+
+def speech_windows(regions, max_window=VAD_MAX_WINDOW_S):
+    """Découpe les zones trop longues en fenêtres de max_window secondes."""
+    for start, end in regions:
+        while end - start > max_window:
+            yield start, start + max_window
+            start += max_window
+        yield start, end
+
+
+def vad_fallback_reason(audio, regions, sample_rate=SAMPLE_RATE):
+    """Raison de ne pas se fier au VAD, ou None si ses zones sont plausibles."""
+    duration = len(audio) / sample_rate
+    if duration == 0:
+        return None
+    if not regions:
+        return "aucune zone de parole"
+    coverage = sum(e - s for s, e in regions) / duration
+    if coverage < VAD_MIN_COVERAGE:
+        return f"couverture {coverage:.1%} < {VAD_MIN_COVERAGE:.0%}"
+    floor = noise_floor(frame_rms(audio, sample_rate)[0])
+    if floor > VAD_MAX_NOISE_RMS:
+        # Pas de silence pour calibrer le seuil (musique, bruit continu)
+        return f"bruit de fond {floor:.3f} > {VAD_MAX_NOISE_RMS}"
+    return None
+
+
+def transcribe_streaming(model, audio, srt_path, partial_path, on_progress=None):
+    segments = []
+    regions = speech_regions(audio)
+    speech_s = sum(e - s for s, e in regions)
+    print(f"    VAD : {len(regions)} zones de parole, {speech_s:.0f}s sur {len(audio) / SAMPLE_RATE:.0f}s", flush=True)
+
+    reason = vad_fallback_reason(audio, regions)
+    if reason:
+        print(f"    VAD non fiable ({reason}) : transcription du fichier entier", flush=True)
+        result = model.transcribe(np.asarray(audio, dtype=np.float32), fp16=False)
+        segments = [seg for seg in result["segments"] if seg["text"].strip()]
+
+    language = None
+    for start, end in ([] if reason else speech_windows(regions)):
+        window = np.asarray(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], dtype=np.float32)
+        # La langue est détectée sur la première fenêtre puis imposée aux suivantes
+        result = model.transcribe(window, fp16=False, language=language, condition_on_previous_text=False)
+        language = language or result.get("language")
+        for seg in result["segments"]:
+            if not seg["text"].strip(): continue
+            segments.append({
+                "start": start + seg["start"],
+                "end": min(end, start + seg["end"]),
+                "text": seg["text"],
+            })
+        # Publication incrémentale (atomique) des répliques déjà disponibles
+        write_srt_atomic(partial_path, segments)
+        if on_progress: on_progress(end, segments)
+
+    write_srt_atomic(srt_path, segments)
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    return segments
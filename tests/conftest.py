@@ -0,0 +1,45 @@
+import os
+import sys
+import importlib
+
+import pytest
+
+# Les services importent "common.x" depuis la racine, le backend ses modules à plat
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+for path in (ROOT, BACKEND):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def make_srt():
+    """SRT minimal : une réplique d'une seconde par texte."""
+    def make(*cues):
+        return "\n".join(
+            f"{i}\n00:00:{i:02d},000 --> 00:00:{i + 1:02d},000\n{text}\n"
+            for i, text in enumerate(cues, start=1)
+        )
+    return make
+
+
+@pytest.fixture(scope="session")
+def backend_app(tmp_path_factory):
+    """backend/main.py importé une seule fois (métriques Prometheus globales),
+    dans un dossier de travail jetable : static/, base SQLite et uploads."""
+    pytest.importorskip("fastapi")
+    work_dir = tmp_path_factory.mktemp("backend")
+    previous = os.getcwd()
+    os.chdir(work_dir)
+    os.environ["RESULTS_DB"] = str(work_dir / "results.db")
+    os.environ["UPLOAD_DIR"] = str(work_dir / "uploads_tmp")
+    try:
+        yield importlib.import_module("main")
+    finally:
+        os.chdir(previous)
+
+
+@pytest.fixture
+def client(backend_app):
+    from fastapi.testclient import TestClient
+    return TestClient(backend_app.app)
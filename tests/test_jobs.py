@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+
+import pytest
+
+from common import claims as claims_module
+from common.claims import LeaseManager
+from common.jobs import DEFERRED, JobQueue
+from common.ledger import JobLedger
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = JobLedger("test", root=str(tmp_path / "ledger"), max_attempts=3, backoff=0.05, backoff_max=0.2)
+    yield ledger
+    ledger.close()
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(handler, **kwargs):
+        queue = JobQueue(f"test-{len(queues)}", handler, **kwargs)
+        queue.start()
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.shutdown(drain=False)
+
+
+def touch(path, stamp):
+    path.write_bytes(b"x")
+    os.utime(path, (stamp, stamp))
+    return str(path)
+
+
+# --- JobQueue ---
+def test_duplicate_keys_are_refused_until_done(make_queue):
+    release, calls = threading.Event(), []
+
+    def handler(name):
+        calls.append(name)
+        release.wait(5)
+
+    queue = make_queue(handler)
+    assert queue.submit("k", "first")
+    assert wait_for(lambda: calls)
+    assert not queue.submit("k", "second")       # en cours
+    release.set()
+    assert wait_for(lambda: queue.submit("k", "third"))
+    assert wait_for(lambda: calls == ["first", "third"])
+
+
+def test_deferred_key_stays_reserved_until_complete(make_queue):
+    queue = make_queue(lambda: DEFERRED)
+    assert queue.submit("k")
+    assert wait_for(lambda: queue.in_flight() == 0 and queue.depth() == 0)
+    # Le handler a rendu la main mais le travail n'est pas fini (ex. batcher)
+    assert not queue.submit("k")
+    queue.complete("k")
+    assert queue.submit("k")
+
+
+def test_lost_claim_forgets_the_job(make_queue):
+    class Taken:
+        ttl = 60
+        def acquire(self, key): return False
+        def release(self, key): pass
+
+    calls = []
+    queue = make_queue(calls.append, claims=Taken())
+    assert queue.submit("k", "k")
+    assert wait_for(lambda: queue.depth() == 0 and queue.submit("k", "k"))
+    assert wait_for(lambda: queue.submitted_at("k") is None)
+    assert calls == []
+
+
+def test_failure_is_retried_with_backoff(make_queue, ledger, tmp_path):
+    path = touch(tmp_path / "video.mp4", time.time())
+    attempts = []
+
+    def handler(path):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RuntimeError("échec transitoire")
+
+    queue = make_queue(handler, ledger=ledger)
+    assert queue.submit(path, path)
+    assert wait_for(lambda: ledger.is_done(path))
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.05
+    # Terminé et fichier inchangé : pas de nouveau passage
+    assert not queue.submit(path, path)
+
+
+def test_retries_stop_after_max_attempts(make_queue, ledger, tmp_path):
+    path = touch(tmp_path / "video.mp4", time.time())
+    attempts = []
+
+    def handler(path):
+        attempts.append(path)
+        raise RuntimeError("échec permanent")
+
+    queue = make_queue(handler, ledger=ledger)
+    queue.submit(path, path)
+    assert wait_for(lambda: ledger.state(path) == "failed" and len(attempts) == 3)
+    time.sleep(0.3)
+    assert len(attempts) == 3
+    assert ledger.unfinished() == []
+
+
+def test_recover_resubmits_unfinished_jobs(make_queue, ledger, tmp_path):
+    done = touch(tmp_path / "done.mp4", time.time())
+    interrupted = touch(tmp_path / "interrupted.mp4", time.time())
+    ledger.mark_done(done, (done,))
+    ledger.queued(interrupted, (interrupted,))
+    ledger.running(interrupted)                   # arrêt en plein traitement
+
+    calls = []
+    queue = make_queue(calls.append, ledger=ledger)
+    assert queue.recover() == 1
+    assert wait_for(lambda: ledger.is_done(interrupted))
+    assert calls == [interrupted]
+
+
+# --- JobLedger ---
+def test_ledger_reprocesses_replaced_files(ledger, tmp_path):
+    path = touch(tmp_path / "video.mp4", time.time() - 100)
+    assert ledger.queued(path, (path, "video.mp4"))
+    ledger.running(path)
+    ledger.done(path)
+    assert not ledger.queued(path, (path, "video.mp4"))
+    assert ledger.args(path) == (path, "video.mp4")
+
+    touch(tmp_path / "video.mp4", time.time())     # fichier remplacé
+    assert ledger.queued(path, (path, "video.mp4"))
+
+
+def test_ledger_backoff_grows_and_is_capped(ledger, tmp_path):
+    path = touch(tmp_path / "video.mp4", time.time())
+    ledger.queued(path, (path,))
+    delays = []
+    for _ in range(3):
+        ledger.running(path)
+        delays.append(ledger.failed(path, "erreur"))
+    assert delays == [0.05, 0.1, None]
+    assert ledger.state(path) == "failed"
+
+
+def test_ledger_scan_uses_watermark(ledger, tmp_path):
+    folder = tmp_path / "input"
+    folder.mkdir()
+    # ctime (non modifiable) compte aussi : l'ordre de création fait l'ancienneté
+    touch(folder / "old.mp4", time.time())
+    time.sleep(0.05)
+    known = touch(folder / "known.mp4", time.time())
+    ledger.mark_done(known, (known,))           # watermark = arrivée de known
+    time.sleep(0.05)
+    new = touch(folder / "new.mp4", time.time())
+    touch(folder / "notes.txt", time.time())
+
+    found = ledger.scan(str(folder), lambda name: name.endswith(".mp4"), slack=0)
+    assert found == [("new.mp4", new)]
+    # Marge sur le watermark : le fichier arrivé juste avant est rattrapé
+    assert [name for name, _ in ledger.scan(str(folder), lambda name: name.endswith(".mp4"), slack=60)] == ["new.mp4", "old.mp4"]
+
+
+def test_ledger_survives_restart(tmp_path):
+    root = str(tmp_path / "ledger")
+    path = touch(tmp_path / "video.mp4", time.time())
+    first = JobLedger("test", root=root)
+    first.queued(path, (path, "video.mp4"))
+    first.close()
+    second = JobLedger("test", root=root)
+    assert second.unfinished() == [(path, (path, "video.mp4"), None)]
+    second.close()
+
+
+# --- Baux (LeaseManager) ---
+@pytest.fixture
+def leases(tmp_path):
+    managers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("ttl", 0.3)
+        kwargs.setdefault("heartbeat", 0.05)
+        manager = LeaseManager("test", root=str(tmp_path / "claims"), **kwargs)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.close()
+
+
+def test_lease_is_exclusive(leases):
+    a, b = leases(), leases()
+    assert a.acquire("video")
+    assert a.acquire("video")                     # déjà détenu
+    assert not b.acquire("video")
+    a.release("video")
+    assert b.acquire("video")
+
+
+def test_heartbeat_keeps_the_lease(leases):
+    a, b = leases(), leases()
+    assert a.acquire("video")
+    time.sleep(0.6)                               # > ttl, bail rafraîchi par a
+    assert not b.acquire("video")
+
+
+def test_expired_lease_is_reclaimed(leases):
+    a, b = leases(), leases()
+    assert a.acquire("video")
+    a._stop.set()                                 # worker mort : plus de heartbeat
+    assert not b.acquire("video")
+    assert wait_for(lambda: b.acquire("video"), timeout=2)
+    assert b.holds("video")
+
+
+def test_restarted_container_reclaims_at_once(leases, monkeypatch):
+    # Même hôte, même pid (1 en conteneur) : seul l'identifiant d'instance change
+    monkeypatch.setattr(claims_module.os, "getpid", lambda: 1)
+    before = leases(ttl=60)
+    assert before.acquire("video")
+    before._stop.set()
+    before._held.clear()                          # l'ancien processus ne relâchera rien
+
+    monkeypatch.setattr(claims_module, "INSTANCE_ID", "redemarre")
+    after = leases(ttl=60)
+    assert after.acquire("video")
+
+
+def test_other_host_lease_waits_for_ttl(leases, monkeypatch):
+    other = leases(ttl=60)
+    other.owner = "autre-hote:1:abc"
+    assert other.acquire("video")
+    assert not leases(ttl=60).acquire("video")
@@ -0,0 +1,142 @@
+import pytest
+
+from search import match_expression, parse_srt
+from store import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+
+def put(store, video_id, subtitles, language="en"):
+    store.put(video_id, {
+        "video_id": video_id,
+        "filename": f"{video_id}_downscaled.mp4",
+        "detected_language": language,
+        "subtitles": subtitles,
+    })
+
+
+def ids(hits):
+    return [hit["video_id"] for hit in hits]
+
+
+# --- SRT ---
+def test_parse_srt(make_srt):
+    assert parse_srt(make_srt("Le lion", "mange")) == [(1.0, 2.0, "Le lion"), (2.0, 3.0, "mange")]
+    # Plusieurs lignes, CRLF, horodatage au point, bloc sans horodatage
+    content = "1\r\n00:01:02.5 --> 00:01:03,250\r\nligne 1\r\nligne 2\r\n\r\nbruit\r\n"
+    assert parse_srt(content) == [(62.5, 63.25, "ligne 1 ligne 2")]
+    assert parse_srt(None) == []
+
+
+# --- EXPRESSION MATCH ---
+def test_match_expression():
+    assert match_expression("lion mange") == '"lion" AND "mange"*'
+    assert match_expression('"le lion" mange') == '"le lion" AND "mange"*'
+    assert match_expression('"le lion"') == '"le lion"'
+    assert match_expression("   ") is None
+    assert match_expression('" ( *') is None
+
+
+@pytest.mark.parametrize("query", [
+    "AND", "OR", "NOT", "lion OR", "NOT lion", "(lion", "lion)", "*", '"', '"lion',
+    "lion AND OR NOT ( * \"", "NEAR(lion mange)", "text:lion", "lion^", "-lion", "{text}: lion",
+])
+def test_operators_are_not_interpreted(store, make_srt, query):
+    put(store, "a", make_srt("and or not lion", "near text"))
+    match = match_expression(query)
+    if match is None:
+        return
+    # Jamais d'erreur de syntaxe FTS5 : les opérateurs sont cherchés comme des mots
+    hits, _ = store.search(match)
+    assert all(hit["video_id"] == "a" for hit in hits)
+
+
+def test_operator_words_match_literally(store, make_srt):
+    put(store, "a", make_srt("lion or tiger"))
+    put(store, "b", make_srt("lion tiger"))
+    assert ids(store.search(match_expression("lion OR tiger"))[0]) == ["a"]
+    assert ids(store.search(match_expression("NOT tiger"))[0]) == []
+
+
+# --- RECHERCHE ---
+def test_prefix_and_diacritics(store, make_srt):
+    put(store, "a", make_srt("Un éléphant traverse"))
+    assert ids(store.search(match_expression("élé"))[0]) == ["a"]
+    assert ids(store.search(match_expression("elephant"))[0]) == ["a"]
+    # Préfixe sur le dernier mot seulement
+    assert ids(store.search(match_expression("ele traverse"))[0]) == []
+    # Le dernier mot en phrase n'est pas un préfixe
+    assert ids(store.search(match_expression('"élé"'))[0]) == []
+
+
+def test_phrase(store, make_srt):
+    put(store, "a", make_srt("le lion mange la gazelle"))
+    put(store, "b", make_srt("la gazelle mange le lion"))
+    assert ids(store.search(match_expression('"lion mange"'))[0]) == ["a"]
+    assert sorted(ids(store.search(match_expression("lion mange"))[0])) == ["a", "b"]
+
+
+def test_hits_carry_cue_timing(store, make_srt):
+    put(store, "a", make_srt("rien", "le lion"))
+    (hit,), more = store.search(match_expression("lion"))
+    assert (hit["start"], hit["end"], hit["text"]) == (2.0, 3.0, "le lion")
+    assert hit["filename"] == "a_downscaled.mp4"
+    assert not more
+
+
+def test_reindex_replaces_old_cues(store, make_srt):
+    put(store, "a", make_srt("le lion"))
+    put(store, "a", make_srt("le tigre"))
+    assert store.search(match_expression("lion"))[0] == []
+    assert ids(store.search(match_expression("tigre"))[0]) == ["a"]
+
+
+def test_all_matches_are_ranked(store, make_srt):
+    # Le meilleur score BM25 est la plus ancienne réplique : elle doit sortir en tête
+    put(store, "fr1", make_srt("lion lion lion"), language="fr")
+    for i in range(3):
+        put(store, f"en{i}", make_srt(f"a lion among many other words number {i}"))
+    hits, more = store.search(match_expression("lion"), limit=2)
+    assert ids(hits)[0] == "fr1"
+    assert more
+    assert ids(store.search(match_expression("lion"), language="fr")[0]) == ["fr1"]
+
+
+def test_filters_and_paging(store, make_srt):
+    put(store, "a", make_srt("lion", "lion encore"), language="fr")
+    put(store, "b", make_srt("lion"), language="en")
+    # Répliques d'une même vidéo non contiguës (réindexation après une autre vidéo)
+    put(store, "a", make_srt("lion", "lion encore", "toujours lion"), language="fr")
+
+    match = match_expression("lion")
+    assert sorted(ids(store.search(match, video_id="a")[0])) == ["a", "a", "a"]
+    assert ids(store.search(match, video_id="b")[0]) == ["b"]
+    assert ids(store.search(match, language="en")[0]) == ["b"]
+    assert ids(store.search(match, video_id="a", language="en")[0]) == []
+
+    first, more = store.search(match, limit=2)
+    second, last = store.search(match, limit=2, offset=2)
+    assert more and not last
+    assert len(first) == len(second) == 2
+    assert {(h["video_id"], h["start"]) for h in first}.isdisjoint((h["video_id"], h["start"]) for h in second)
+
+
+# --- ROUTE /api/search ---
+def test_search_route(client, make_srt):
+    client.post("/upload_result", json={
+        "video_id": "route", "filename": "route.mp4", "detected_language": "fr",
+        "subtitles": make_srt("un guépard", "court vite"),
+    })
+    response = client.get("/api/search", params={"q": "guép"})
+    assert response.status_code == 200
+    (hit,) = response.json()["hits"]
+    assert hit["seek_url"] == "/media/route.mp4#t=1.000"
+
+    again = client.get("/api/search", params={"q": "guép"}, headers={"If-None-Match": response.headers["etag"]})
+    assert again.status_code == 304
+    assert client.get("/api/search", params={"q": " ( "}).status_code == 400
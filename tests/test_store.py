@@ -0,0 +1,171 @@
+import json
+import sqlite3
+
+import pytest
+
+from store import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+
+def result(video_id, language="en", objects=(), timestamp=None, **extra):
+    data = {
+        "video_id": video_id,
+        "filename": f"{video_id}_downscaled.mp4",
+        "detected_language": language,
+        "detected_objects": list(objects),
+        "timestamp": timestamp,
+    }
+    data.update(extra)
+    return data
+
+
+# --- MIGRATION ---
+def test_migrate_legacy_json(tmp_path):
+    legacy = tmp_path / "simulated_dynamodb.json"
+    legacy.write_text(json.dumps({
+        "a": result("a", "fr", ["dog"], 10.0),
+        "b": result("b", "en", ["cat"], 20.0),
+    }))
+    store = ResultStore(str(tmp_path / "results.db"), legacy_json=str(legacy))
+
+    assert store.get("a")["detected_language"] == "fr"
+    assert list(store.all()) == ["a", "b"]
+    # Fichier renommé : pas de second import au redémarrage
+    assert not legacy.exists()
+    assert (tmp_path / "simulated_dynamodb.json.migrated").exists()
+    store.close()
+    assert ResultStore(str(tmp_path / "results.db"), legacy_json=str(legacy)).version() == 2
+
+
+def test_migrate_invalid_json_is_ignored(tmp_path):
+    legacy = tmp_path / "simulated_dynamodb.json"
+    legacy.write_text("{pas du json")
+    store = ResultStore(str(tmp_path / "results.db"), legacy_json=str(legacy))
+    assert store.all() == {}
+    assert legacy.exists()
+
+
+def test_old_schema_is_backfilled(tmp_path):
+    # Base créée avant les colonnes dénormalisées et les index secondaires
+    db_path = tmp_path / "results.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE results (video_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute(
+        "INSERT INTO results VALUES (?, ?, 0)",
+        ("old", json.dumps(result("old", "fr", ["lion"], 5.0))),
+    )
+    conn.commit()
+    conn.close()
+
+    store = ResultStore(str(db_path))
+    items, _ = store.query(language="fr", obj="lion", since=1.0)
+    assert [item["video_id"] for item in items] == ["old"]
+
+
+# --- ÉCRITURE ---
+def test_put_is_an_upsert(store):
+    store.put("a", result("a", "fr", ["dog"]))
+    store.put("b", result("b"))
+    store.put("a", result("a", "en", ["cat"]))
+
+    # Le rowid d'origine est conservé : l'ordre d'insertion ne change pas
+    assert list(store.all()) == ["a", "b"]
+    assert store.get("a")["detected_language"] == "en"
+    assert store.query(obj="dog")[0] == []
+    assert json.loads(store.all_json()) == store.all()
+
+
+def test_version_counts_writes(store):
+    assert store.version() == 0
+    store.put("a", result("a"))
+    store.put("a", result("a"))
+    assert store.version() == 2
+
+
+# --- PAGINATION PAR CURSEUR ---
+def test_cursor_paging_descending(store):
+    for i in range(5):
+        store.put(f"v{i}", result(f"v{i}"))
+
+    pages, cursor = [], None
+    while True:
+        items, cursor = store.query(cursor=cursor, limit=2)
+        pages.append([item["video_id"] for item in items])
+        if cursor is None:
+            break
+    assert pages == [["v4", "v3"], ["v2", "v1"], ["v0"]]
+
+
+def test_cursor_paging_ascending(store):
+    for i in range(3):
+        store.put(f"v{i}", result(f"v{i}"))
+    items, cursor = store.query(limit=2, descending=False)
+    assert [item["video_id"] for item in items] == ["v0", "v1"]
+    items, cursor = store.query(cursor=cursor, limit=2, descending=False)
+    assert [item["video_id"] for item in items] == ["v2"]
+    assert cursor is None
+
+
+def test_cursor_is_stable_across_inserts(store):
+    for i in range(4):
+        store.put(f"v{i}", result(f"v{i}"))
+    items, cursor = store.query(limit=2)
+    store.put("new", result("new"))
+    items, _ = store.query(cursor=cursor, limit=2)
+    assert [item["video_id"] for item in items] == ["v1", "v0"]
+
+
+# --- FILTRES ---
+def test_filters(store):
+    store.put("a", result("a", "fr", ["dog", "cat"], 10.0))
+    store.put("b", result("b", "en", ["dog"], 20.0))
+    store.put("c", result("c", "fr", [], 30.0))
+
+    def ids(**filters):
+        return [item["video_id"] for item in store.query(descending=False, **filters)[0]]
+
+    assert ids(language="fr") == ["a", "c"]
+    assert ids(obj="dog") == ["a", "b"]
+    assert ids(language="fr", obj="dog") == ["a"]
+    assert ids(since=15.0) == ["b", "c"]
+    assert ids(until=20.0) == ["a", "b"]
+    assert ids(since=15.0, until=25.0) == ["b"]
+    assert ids(obj="lion") == []
+
+
+# --- ETAG / 304 (/api/results) ---
+def test_results_etag_304(client, backend_app):
+    backend_app.store.put("etag-video", result("etag-video"))
+    first = client.get("/api/results", params={"limit": 10})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = client.get("/api/results", params={"limit": 10}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    # Autres paramètres => autre ETag
+    other = client.get("/api/results", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+    # Nouvelle écriture => nouvelle version, l'ancien ETag ne vaut plus
+    client.post("/upload_result", json=result("etag-video-2"))
+    changed = client.get("/api/results", params={"limit": 10}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_results_legacy_dict_and_projection(client):
+    client.post("/upload_result", json=result("projection", subtitles="long"))
+    assert "projection" in client.get("/api/results").json()
+
+    page = client.get("/api/results", params={"limit": 1, "exclude": "subtitles"}).json()
+    assert "subtitles" not in page["items"][0]
+    page = client.get("/api/results", params={"limit": 1, "fields": "video_id"}).json()
+    assert page["items"] == [{"video_id": "projection"}]
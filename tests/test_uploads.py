@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+import pytest
+
+from uploads import UploadError, UploadManager, safe_filename
+
+DATA = bytes(range(256)) * 64          # 16 Kio
+HALF = len(DATA) // 2
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    # Le dossier servi existe déjà (créé par backend/main.py)
+    (tmp_path / "static").mkdir()
+    return UploadManager(str(tmp_path / "uploads_tmp"), str(tmp_path / "static"))
+
+
+def write_chunk(manager, upload_id, offset, data, chunk_sha256=None):
+    writer = manager.open_chunk(upload_id, offset)
+    writer.write(data)
+    return writer.close(chunk_sha256)
+
+
+# --- UploadManager ---
+def test_safe_filename():
+    assert safe_filename("../../etc/passwd") == "passwd"
+    assert safe_filename("C:\\videos\\a.mp4") == "a.mp4"
+    for name in ("", ".hidden", None):
+        with pytest.raises(UploadError):
+            safe_filename(name)
+
+
+def test_wrong_offset_is_409_with_current_offset(manager):
+    upload_id, _ = manager.create("a.mp4", len(DATA), sha256(DATA))
+    write_chunk(manager, upload_id, 0, DATA[:HALF])
+    with pytest.raises(UploadError) as e:
+        manager.open_chunk(upload_id, 0)
+    assert (e.value.status_code, e.value.offset) == (409, HALF)
+
+
+def test_bad_chunk_hash_is_422_and_rolled_back(manager):
+    upload_id, _ = manager.create("a.mp4", len(DATA), sha256(DATA))
+    write_chunk(manager, upload_id, 0, DATA[:HALF], sha256(DATA[:HALF]))
+    with pytest.raises(UploadError) as e:
+        write_chunk(manager, upload_id, HALF, DATA[HALF:], sha256(b"autre chose"))
+    assert (e.value.status_code, e.value.offset) == (422, HALF)
+    # Le morceau rejeté est retiré, le verrou libéré
+    assert manager.offset(upload_id)[0] == HALF
+    assert write_chunk(manager, upload_id, HALF, DATA[HALF:]) == len(DATA)
+
+
+def test_resume_after_client_restart(manager, tmp_path):
+    upload_id, offset = manager.create("a.mp4", len(DATA), sha256(DATA))
+    assert offset == 0
+    writer = manager.open_chunk(upload_id, 0)
+    writer.write(DATA[:HALF])
+    writer.abort()                      # connexion coupée
+
+    # Même fichier annoncé => même upload, reprise à l'offset reçu
+    same_id, offset = manager.create("a.mp4", len(DATA), sha256(DATA))
+    assert (same_id, offset) == (upload_id, HALF)
+    write_chunk(manager, upload_id, offset, DATA[HALF:])
+
+    # Redémarrage du serveur : le hash incrémental est perdu, complete relit le fichier
+    restarted = UploadManager(manager.upload_dir, manager.dest_dir)
+    filename, size, digest = restarted.complete(upload_id)
+    assert (filename, size, digest) == ("a.mp4", len(DATA), sha256(DATA))
+    assert (tmp_path / "static" / "a.mp4").read_bytes() == DATA
+
+
+def test_chunk_beyond_announced_size_is_413(manager):
+    upload_id, _ = manager.create("a.mp4", HALF, None)
+    writer = manager.open_chunk(upload_id, 0)
+    with pytest.raises(UploadError) as e:
+        writer.write(DATA)
+    writer.abort()
+    assert e.value.status_code == 413
+
+
+def test_complete_incomplete_is_409(manager):
+    upload_id, _ = manager.create("a.mp4", len(DATA), sha256(DATA))
+    write_chunk(manager, upload_id, 0, DATA[:HALF])
+    with pytest.raises(UploadError) as e:
+        manager.complete(upload_id)
+    assert (e.value.status_code, e.value.offset) == (409, HALF)
+
+
+def test_complete_sha_mismatch_discards_upload(manager, tmp_path):
+    upload_id, _ = manager.create("a.mp4", len(DATA), sha256(b"autre contenu"))
+    write_chunk(manager, upload_id, 0, DATA)
+    with pytest.raises(UploadError) as e:
+        manager.complete(upload_id)
+    assert e.value.status_code == 422
+    assert not (tmp_path / "static" / "a.mp4").exists()
+    with pytest.raises(UploadError) as e:
+        manager.offset(upload_id)
+    assert e.value.status_code == 404
+
+
+def test_unknown_upload_is_404(manager):
+    for upload_id in ("inconnu", "../../etc"):
+        with pytest.raises(UploadError) as e:
+            manager.offset(upload_id)
+        assert e.value.status_code == 404
+
+
+# --- Routes HTTP (backend/main.py) ---
+def test_http_upload_protocol(client):
+    digest = sha256(DATA)
+    created = client.post("/uploads", json={"filename": "http.mp4", "size": len(DATA), "sha256": digest})
+    assert created.status_code == 201
+    upload_id = created.json()["upload_id"]
+
+    ok = client.patch(f"/uploads/{upload_id}", content=DATA[:HALF],
+                      headers={"Upload-Offset": "0", "X-Chunk-SHA256": sha256(DATA[:HALF])})
+    assert ok.status_code == 200
+    assert ok.headers["upload-offset"] == str(HALF)
+
+    conflict = client.patch(f"/uploads/{upload_id}", content=DATA[HALF:], headers={"Upload-Offset": "0"})
+    assert conflict.status_code == 409
+    assert conflict.headers["upload-offset"] == str(HALF)
+
+    corrupt = client.patch(f"/uploads/{upload_id}", content=DATA[HALF:],
+                           headers={"Upload-Offset": str(HALF), "X-Chunk-SHA256": "0" * 64})
+    assert corrupt.status_code == 422
+    assert client.head(f"/uploads/{upload_id}").headers["upload-offset"] == str(HALF)
+
+    invalid = client.patch(f"/uploads/{upload_id}", content=DATA[HALF:], headers={"Upload-Offset": "x"})
+    assert invalid.status_code == 400
+
+    client.patch(f"/uploads/{upload_id}", content=DATA[HALF:], headers={"Upload-Offset": str(HALF)})
+    done = client.post(f"/uploads/{upload_id}/complete")
+    assert done.status_code == 200
+    assert done.json()["sha256"] == digest
+    assert open(os.path.join("static", "http.mp4"), "rb").read() == DATA
+
+
+def test_http_complete_sha_mismatch(client):
+    created = client.post("/uploads", json={"filename": "bad.mp4", "size": len(DATA), "sha256": "0" * 64})
+    upload_id = created.json()["upload_id"]
+    client.patch(f"/uploads/{upload_id}", content=DATA, headers={"Upload-Offset": "0"})
+    rejected = client.post(f"/uploads/{upload_id}/complete")
+    assert rejected.status_code == 422
+    assert client.get(f"/uploads/{upload_id}").status_code == 404